@@ -0,0 +1,142 @@
+import math
+import threading
+import time
+from collections import deque
+
+from prometheus_client import Gauge
+
+# ============================================
+# ADMISSION CONTROL
+# ============================================
+# Caps how many requests run at once so that an overload turns into fast
+# 503s instead of a queue that health probes and scrapes get stuck behind.
+# Routes fall into three classes:
+#
+#   critical  never limited and never counted (/metrics, /api/health)
+#   normal    waits in a bounded FIFO queue for up to `queue_timeout`
+#   low       rejected at once when the limit is reached
+#
+# A released slot is handed straight to the oldest waiter, so queued
+# requests are admitted in arrival order.
+#
+# With `adaptive` the limit follows latency, as in Netflix's gradient2
+# limiter: each window compares the window's mean latency with a slow
+# moving average of it. Latency above the baseline shrinks the limit in
+# proportion, latency at or below it lets the limit grow by about
+# sqrt(limit) per window.
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+LOW = 'low'
+CLASSES = (CRITICAL, NORMAL, LOW)
+
+admission_limit = Gauge(
+    'admission_limit',
+    'Concurrent requests admitted before new ones queue or are shed',
+    multiprocess_mode='livesum'
+)
+
+admission_queue_depth = Gauge(
+    'admission_queue_depth',
+    'Requests waiting for an admission slot',
+    multiprocess_mode='livesum'
+)
+
+
+def parse_route_classes(text, defaults=None):
+    # "/api/data=low,/api/stats=normal" -> {route: class}
+    classes = dict(defaults or {})
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        route, _, cls = item.partition('=')
+        if cls not in CLASSES:
+            raise ValueError(f"unknown admission class {cls!r} for {route!r}, expected one of {CLASSES}")
+        classes[route] = cls
+    return classes
+
+
+class AdmissionController:
+    def __init__(self, limit, queue_size=None, queue_timeout=1.0, adaptive=False,
+                 min_limit=1, max_limit=None, window=1.0, smoothing=0.2, tolerance=1.5):
+        self.limit = limit
+        self.queue_size = limit if queue_size is None else queue_size
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit * 10
+        self.window = window
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._baseline = None
+        self._window_start = time.monotonic()
+        self._window_sum = 0.0
+        self._window_count = 0
+        self._estimate = float(limit)
+        admission_limit.set(limit)
+
+    def acquire(self, cls=NORMAL):
+        # Returns None when admitted, otherwise the reason for shedding
+        if cls == CRITICAL:
+            return None
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return None
+            if cls == LOW or self.queue_timeout <= 0:
+                return 'limit'
+            if len(self._waiters) >= self.queue_size:
+                return 'queue_full'
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+            admission_queue_depth.inc()
+        if waiter.wait(self.queue_timeout):
+            return None
+        with self._lock:
+            # The slot may have been handed over just as the wait timed out
+            if waiter.is_set():
+                return None
+            self._waiters.remove(waiter)
+            admission_queue_depth.dec()
+        return 'deadline'
+
+    def release(self, latency=None):
+        with self._lock:
+            if latency is not None and self.adaptive:
+                self._observe(latency)
+            if self._waiters and self.in_flight <= self.limit:
+                # Hand the slot over; in_flight stays the same
+                self._waiters.popleft().set()
+                admission_queue_depth.dec()
+            else:
+                self.in_flight -= 1
+            self._admit_waiters()
+
+    def _admit_waiters(self):
+        # After the limit grows, queued requests can use the new room
+        while self._waiters and self.in_flight < self.limit:
+            self.in_flight += 1
+            self._waiters.popleft().set()
+            admission_queue_depth.dec()
+
+    def _observe(self, latency):
+        self._window_sum += latency
+        self._window_count += 1
+        now = time.monotonic()
+        if now - self._window_start < self.window or self._window_count < 10:
+            return
+        short = self._window_sum / self._window_count
+        self._window_start, self._window_sum, self._window_count = now, 0.0, 0
+        if self._baseline is None:
+            self._baseline = short
+            return
+        # The baseline follows slowly, so a sustained rise is eventually
+        # accepted as the new normal instead of shrinking the limit forever
+        self._baseline += (short - self._baseline) / 20
+        gradient = max(0.5, min(1.0, self.tolerance * self._baseline / short))
+        target = self._estimate * gradient + math.sqrt(self._estimate)
+        self._estimate += (target - self._estimate) * self.smoothing
+        self._estimate = max(self.min_limit, min(self.max_limit, self._estimate))
+        self.limit = int(self._estimate)
+        admission_limit.set(self.limit)
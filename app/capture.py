@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# REQUEST CAPTURE
+# ============================================
+# Opt-in JSONL log of every request for replay with `load-test.py --replay`.
+# The request path only does a put_nowait() on a bounded queue; a writer
+# thread batches lines to disk and rotates the file by size. When the writer
+# falls behind, records are dropped and counted rather than slowing requests.
+# If the file cannot be opened the capture disables itself, once, and the
+# request path goes back to doing nothing.
+
+capture_records_total = Counter(
+    'capture_records_total',
+    'Requests written to the capture file'
+)
+
+capture_dropped_total = Counter(
+    'capture_dropped_total',
+    'Requests not captured because the capture queue was full or the file could not be opened'
+)
+
+
+class RequestCapture:
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backups=5, queue_size=10000):
+        # "{pid}" in the path gives each pre-fork worker its own file
+        self.path_template = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue_size = queue_size
+        self.disabled = False
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        if self.disabled:
+            return
+        q = self._queue
+        if q is None or self._pid != os.getpid():
+            q = self._start()
+        try:
+            q.put_nowait(entry)
+        except queue.Full:
+            capture_dropped_total.inc()
+
+    def flush(self):
+        # Blocks until everything queued so far is on disk
+        if self._queue is not None and not self.disabled:
+            self._queue.join()
+
+    @property
+    def path(self):
+        return self.path_template.format(pid=os.getpid())
+
+    def _start(self):
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                threading.Thread(target=self._write_loop, args=(self._queue, self.path),
+                                 name='request-capture', daemon=True).start()
+            return self._queue
+
+    def _open(self, q, path):
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            return open(path, 'a', encoding='utf-8')
+        except OSError:
+            logger.exception("Request capture disabled: cannot open %s", path)
+            self.disabled = True
+        # Release anything queued before the flag was seen
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                return None
+            capture_dropped_total.inc()
+            q.task_done()
+
+    def _write_loop(self, q, path):
+        f = self._open(q, path)
+        if f is None:
+            return
+        try:
+            while True:
+                batch = [q.get()]
+                # Drain whatever else is waiting into the same write
+                while len(batch) < 1000:
+                    try:
+                        batch.append(q.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    f.write(''.join(json.dumps(e, separators=(',', ':')) + '\n' for e in batch))
+                    f.flush()
+                    capture_records_total.inc(len(batch))
+                    if f.tell() >= self.max_bytes:
+                        f.close()
+                        self._rotate(path)
+                        f = self._open(q, path)
+                except (OSError, TypeError, ValueError):
+                    logger.exception("Request capture write failed")
+                finally:
+                    for _ in batch:
+                        q.task_done()
+                if f is None:
+                    return
+        finally:
+            if f is not None:
+                f.close()
+
+    def _rotate(self, path):
+        # requests.jsonl -> requests.jsonl.1 -> ... -> requests.jsonl.<backups>
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
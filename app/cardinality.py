@@ -0,0 +1,59 @@
+import os
+import threading
+
+from prometheus_client import Counter
+
+# ============================================
+# LABEL CARDINALITY LIMITS
+# ============================================
+# Every distinct label combination is a new series that lives for the rest
+# of the process and is rendered on every scrape. Each labelled request
+# metric goes through a LabelLimiter that admits the first N combinations and
+# folds the rest into one series whose labels are all OVERFLOW_LABEL.
+
+OVERFLOW_LABEL = 'other'
+DEFAULT_MAX_SERIES = int(os.environ.get('METRICS_MAX_SERIES', '500'))
+
+metric_label_overflow_total = Counter(
+    'metric_label_overflow_total',
+    "Observations folded into the 'other' series because the metric reached its series cap",
+    ['metric']
+)
+
+
+def series_cap(name):
+    # METRICS_MAX_SERIES_HTTP_ERRORS_TOTAL=50 overrides the default for one metric
+    return int(os.environ.get(f'METRICS_MAX_SERIES_{name.upper()}', DEFAULT_MAX_SERIES))
+
+
+class LabelLimiter:
+    def __init__(self, metric, name, max_series=None):
+        self.metric = metric
+        self.name = name
+        self.max_series = series_cap(name) if max_series is None else max_series
+        self._children = {}
+        self._overflow = None
+        self._dropped = metric_label_overflow_total.labels(metric=name)
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        # Lock-free once a combination has been seen; values must be strings
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        with self._lock:
+            child = self._children.get(values)
+            if child is None and len(self._children) < self.max_series:
+                child = self._children[values] = self.metric.labels(*values)
+            if child is not None:
+                return child
+            if self._overflow is None:
+                self._overflow = self.metric.labels(*[OVERFLOW_LABEL] * len(values))
+        self._dropped.inc()
+        return self._overflow
+
+    def __contains__(self, values):
+        return values in self._children
+
+    def __len__(self):
+        return len(self._children)
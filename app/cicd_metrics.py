@@ -1,111 +1,221 @@
-import time
+import argparse
+import os
 import random
-from prometheus_client import CollectorRegistry,Gauge,Counter,Histogram,push_to_gateway
+import shutil
+import sys
+import tempfile
+import time
+from prometheus_client import CollectorRegistry,Gauge,Counter,Histogram
+from prometheus_client.utils import floatToGoString
+
+from pushgateway import CoalescingPusher
+from rolling import RollingWindow
 
 PUSHGATEWAY_URL = 'localhost:9091'
-registry = CollectorRegistry()
+JOB_NAME = 'cicd_metrics'
+DEFAULT_WORKFLOW = "CI Pipeline"
+DEFAULT_ENVIRONMENTS = ('staging','prod')
+
+# Sliding windows for the precomputed rates, as (label, seconds)
+WINDOWS = (('1h',3600),('24h',86400),('7d',7*86400))
+WINDOW_BUCKETS = 60
 
 # ============================================
 # CI/CD METRICS DEFINITIONS
 # ============================================
-ci_build_duration_seconds = Gauge(
-    'ci_build_duration_seconds',
-    'Duration of CI build in seconds',
-    ['workflow','status'],
-    registry=registry
-)
-
-ci_build_total = Counter(
-    'ci_build_total',
-    'Total number of CI builds',
-    ['workflow','status'],
-    registry=registry
-)
-
-ci_build_success_rate = Gauge(
-    'ci_build_success_rate',
-    'CI build success rate percentage',
-    ['workflow'],
-    registry=registry
-)
-
-# Test metrics
-ci_tests_total = Gauge(
-    'ci_tests_total',
-    'Total number of tests run',
-    ['workflow'],
-    registry=registry
-)
-
-ci_tests_passed = Gauge(
-    'ci_tests_passed',
-    'Number of tests passed',
-    ['workflow'],
-    registry=registry
-)
-
-ci_tests_failed = Gauge(
-    'ci_tests_failed',
-    'Number of tests failed',
-    ['workflow'],
-    registry=registry
-)
-
-ci_test_duration_seconds = Gauge(
-    'ci_test_duration_seconds',
-    'Duration of test execution in seconds',
-    ['workflow'],
-    registry=registry
-)
-
-# Pipeline metrics
-ci_pipeline_runs_total = Counter(
-    'ci_pipeline_runs_total',
-    'Total pipeline runs',
-    ['pipeline'],
-    registry=registry
-)
-
-ci_last_build_timestamp = Gauge(
-    'ci_last_build_timestamp',
-    'Timestamp of last build',
-    ['workflow'],
-    registry=registry
-)
-
-ci_deployments_total = Counter(
-    'ci_deployments_total',
-    'Total number of deployments',
-    ['environment','status'],
-    registry=registry
-)
-
-def simulate_ci_run():
-    workflow = "CI Pipeline"
-    build_duration = random.uniform(30,180)
-    is_success = random.random() < 0.90
+# Bound to a registry so the live simulator and the backfill can each keep
+# their own set of the same metrics
+
+class CICDMetrics:
+    def __init__(self, registry):
+        self.registry = registry
+
+        self.ci_build_duration_seconds = Gauge(
+            'ci_build_duration_seconds',
+            'Duration of CI build in seconds',
+            ['workflow','status'],
+            registry=registry
+        )
+
+        self.ci_build_total = Counter(
+            'ci_build_total',
+            'Total number of CI builds',
+            ['workflow','status'],
+            registry=registry
+        )
+
+        self.ci_build_success_rate = Gauge(
+            'ci_build_success_rate',
+            'CI build success rate percentage',
+            ['workflow'],
+            registry=registry
+        )
+
+        # Test metrics
+        self.ci_tests_total = Gauge(
+            'ci_tests_total',
+            'Total number of tests run',
+            ['workflow'],
+            registry=registry
+        )
+
+        self.ci_tests_passed = Gauge(
+            'ci_tests_passed',
+            'Number of tests passed',
+            ['workflow'],
+            registry=registry
+        )
+
+        self.ci_tests_failed = Gauge(
+            'ci_tests_failed',
+            'Number of tests failed',
+            ['workflow'],
+            registry=registry
+        )
+
+        self.ci_test_duration_seconds = Gauge(
+            'ci_test_duration_seconds',
+            'Duration of test execution in seconds',
+            ['workflow'],
+            registry=registry
+        )
+
+        # Pipeline metrics
+        self.ci_pipeline_runs_total = Counter(
+            'ci_pipeline_runs_total',
+            'Total pipeline runs',
+            ['pipeline'],
+            registry=registry
+        )
+
+        self.ci_last_build_timestamp = Gauge(
+            'ci_last_build_timestamp',
+            'Timestamp of last build',
+            ['workflow'],
+            registry=registry
+        )
+
+        self.ci_deployments_total = Counter(
+            'ci_deployments_total',
+            'Total number of deployments',
+            ['environment','status'],
+            registry=registry
+        )
+
+        # Rolling-window aggregates, maintained by record_build and
+        # record_deployment so dashboards read them instead of running
+        # long-range PromQL over the counters above
+        self.ci_build_success_ratio = Gauge(
+            'ci_build_success_ratio',
+            'Share of builds that succeeded over the window',
+            ['workflow','window'],
+            registry=registry
+        )
+
+        self.ci_deployment_frequency_per_day = Gauge(
+            'ci_deployment_frequency_per_day',
+            'Deployments per day over the window',
+            ['workflow','environment','window'],
+            registry=registry
+        )
+
+        self.ci_change_failure_rate = Gauge(
+            'ci_change_failure_rate',
+            'Share of deployments that failed over the window',
+            ['workflow','environment','window'],
+            registry=registry
+        )
+
+        self.ci_mean_time_to_recovery_seconds = Gauge(
+            'ci_mean_time_to_recovery_seconds',
+            'Mean time from a failed deployment to the next successful one, over the window',
+            ['workflow','environment','window'],
+            registry=registry
+        )
+
+        self._builds = {}        # workflow -> [(window, RollingWindow(builds, successes), gauge)]
+        self._deploys = {}       # workflow -> {environment: [(window, seconds, RollingWindow(...), gauges)]}
+        self._failed_since = {}  # (workflow, environment) -> time of the first unrecovered failure
+
+    def record_build(self, workflow, success, now):
+        windows = self._builds.get(workflow)
+        if windows is None:
+            windows = self._builds[workflow] = [
+                (name, RollingWindow(seconds, WINDOW_BUCKETS, fields=2),
+                 self.ci_build_success_ratio.labels(workflow=workflow, window=name))
+                for name, seconds in WINDOWS
+            ]
+        for _, window, _ in windows:
+            window.add(now, 1, success)
+        self._publish(workflow, now)
+
+    def record_deployment(self, workflow, environment, success, now):
+        environments = self._deploys.setdefault(workflow, {})
+        windows = environments.get(environment)
+        if windows is None:
+            windows = environments[environment] = [
+                (name, seconds, RollingWindow(seconds, WINDOW_BUCKETS, fields=4), (
+                    self.ci_deployment_frequency_per_day.labels(workflow=workflow, environment=environment, window=name),
+                    self.ci_change_failure_rate.labels(workflow=workflow, environment=environment, window=name),
+                    self.ci_mean_time_to_recovery_seconds.labels(workflow=workflow, environment=environment, window=name),
+                ))
+                for name, seconds in WINDOWS
+            ]
+
+        # A recovery is the first success after one or more failures
+        key = (workflow, environment)
+        recovered = 0.0
+        if not success:
+            self._failed_since.setdefault(key, now)
+        elif key in self._failed_since:
+            recovered = now - self._failed_since.pop(key)
+        for _, _, window, _ in windows:
+            window.add(now, 1, not success, recovered > 0, recovered)
+        self._publish(workflow, now)
+
+    def _publish(self, workflow, now):
+        # Refreshes every window of the workflow, so rates also decay while
+        # one kind of event stops arriving. Cost is bounded by the number of
+        # environments, not by the number of events in the window.
+        for name, window, gauge in self._builds.get(workflow, ()):
+            builds, successes = window.totals(now)
+            gauge.set(successes / builds if builds else float('nan'))
+            if name == '24h':
+                self.ci_build_success_rate.labels(workflow=workflow).set(
+                    successes / builds * 100 if builds else float('nan'))
+        for windows in self._deploys.get(workflow, {}).values():
+            for _, seconds, window, (frequency, failure_rate, mttr) in windows:
+                deploys, failures, recoveries, recovery_seconds = window.totals(now)
+                frequency.set(deploys * 86400 / seconds)
+                failure_rate.set(failures / deploys if deploys else float('nan'))
+                mttr.set(recovery_seconds / recoveries if recoveries else float('nan'))
+
+
+def simulate_ci_run(m, rng=random, now=None, workflow=DEFAULT_WORKFLOW):
+    build_duration = rng.uniform(30,180)
+    is_success = rng.random() < 0.90
     status = "success" if is_success else "failure"
-    ci_build_duration_seconds.labels(workflow=workflow,status=status).set(build_duration)
-    ci_build_total.labels(workflow=workflow,status=status).inc()
-    ci_last_build_timestamp.labels(workflow=workflow).set(time.time())
-    ci_pipeline_runs_total.labels(pipeline=workflow).inc()
-    
-    total_tests = random.randint(5,10)
+    now = time.time() if now is None else now
+    m.ci_build_duration_seconds.labels(workflow=workflow,status=status).set(build_duration)
+    m.ci_build_total.labels(workflow=workflow,status=status).inc()
+    m.ci_last_build_timestamp.labels(workflow=workflow).set(now)
+    m.ci_pipeline_runs_total.labels(pipeline=workflow).inc()
+
+    total_tests = rng.randint(5,10)
     if is_success:
         passed_tests = total_tests
         failed_tests = 0
     else:
-        failed_tests = random.randint(1,3)
+        failed_tests = rng.randint(1,3)
         passed_tests = total_tests - failed_tests
-    
-    ci_tests_total.labels(workflow=workflow).set(total_tests)
-    ci_tests_passed.labels(workflow=workflow).set(passed_tests)
-    ci_tests_failed.labels(workflow=workflow).set(failed_tests)
-    ci_test_duration_seconds.labels(workflow=workflow).set(random.uniform(5,30))
-    
-    success_rate = 90 + random.uniform(-10,10)  # 80-100%
-    ci_build_success_rate.labels(workflow=workflow).set(success_rate)
-    
+
+    m.ci_tests_total.labels(workflow=workflow).set(total_tests)
+    m.ci_tests_passed.labels(workflow=workflow).set(passed_tests)
+    m.ci_tests_failed.labels(workflow=workflow).set(failed_tests)
+    m.ci_test_duration_seconds.labels(workflow=workflow).set(rng.uniform(5,30))
+
+    m.record_build(workflow, is_success, now)
+
     return {
         'workflow': workflow,
         'status': status,
@@ -114,55 +224,241 @@ def simulate_ci_run():
         'tests_passed': passed_tests,
         'tests_failed': failed_tests
     }
-    
-    
-def simulate_deployment():
-    environment = random.choice(['staging','prod'])
-    is_success = random.random() < 0.95
+
+
+def simulate_deployment(m, rng=random, now=None, environments=DEFAULT_ENVIRONMENTS,
+                        workflow=DEFAULT_WORKFLOW):
+    environment = rng.choice(environments)
+    is_success = rng.random() < 0.95
     status = 'success' if is_success else 'failure'
-    
-    ci_deployments_total.labels(environment=environment,status=status).inc()
-    
+
+    m.ci_deployments_total.labels(environment=environment,status=status).inc()
+    m.record_deployment(workflow, environment, is_success, time.time() if now is None else now)
+
     return {
         'environment': environment,
         'status': status
     }
-    
 
-def push_metrics():
-    try:
-        push_to_gateway(PUSHGATEWAY_URL,job='cicd_metrics',registry=registry)
-        return True
-    except Exception as e:
-        print(f"Error pushing metrics: {e}")
-        return False
-    
-def run_continuous_simulation(interval=30):
+
+# ============================================
+# CONTINUOUS SIMULATION
+# ============================================
+# Every workflow is its own Pushgateway group with its own registry, so a
+# build only re-sends that workflow's metrics. Builds are spread evenly over
+# the interval and handed to a CoalescingPusher; the simulation thread never
+# waits on the network.
+
+def workflow_names(count):
+    if count == 1:
+        return [DEFAULT_WORKFLOW]
+    return [f"pipeline-{i:04d}" for i in range(count)]
+
+
+def grouping_key(workflow):
+    # The single default workflow keeps pushing to the job-wide group it
+    # always used
+    return {} if workflow == DEFAULT_WORKFLOW else {'workflow': workflow}
+
+
+def format_push_report(stats, previous, latencies, elapsed, builds):
+    pushes = stats['pushes'] - previous.get('pushes', 0)
+    latencies = sorted(latencies)
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return (f"📈 {builds / elapsed:.1f} builds/s | {pushes / elapsed:.1f} pushes/s | "
+            f"coalesced {stats['coalesced'] - previous.get('coalesced', 0)} | "
+            f"failed {stats['failures'] - previous.get('failures', 0)} | pending {stats['pending']} | "
+            f"push p50 {pct(0.50):.1f}ms p99 {pct(0.99):.1f}ms")
+
+
+def run_continuous_simulation(interval=30, workflows=1, environments=DEFAULT_ENVIRONMENTS, pushers=4,
+                              report_interval=10, duration=None, gateway=PUSHGATEWAY_URL):
+    names = workflow_names(workflows)
+    fleet = {name: CICDMetrics(CollectorRegistry()) for name in names}
+    pusher = CoalescingPusher(gateway, JOB_NAME, workers=pushers).start()
+    verbose = len(names) == 1
+
     print("=" * 50)
     print("🚀 CI/CD Metrics Simulator")
     print("=" * 50)
-    print(f"📊 Pushgateway: http://{PUSHGATEWAY_URL}")
+    print(f"📊 Pushgateway: http://{gateway}")
+    print(f"🔀 Workflows: {len(names)} | Environments: {', '.join(environments)} | Pushers: {pushers}")
     print(f"⏱️  Simulation interval: {interval} seconds")
     print("=" * 50)
-    
-    build_count = 0
-    while True:
-        build_count += 1
-        print(f"\n🔄 Simulating CI/CD run #{build_count}...")
-        
-        ci_result = simulate_ci_run()
-        print(f" Build: {ci_result['status'].upper()} ({ci_result['duration']}s)")
-        print(f" Tests: {ci_result['tests_passed']}/{ci_result['tests_total']} passed")
-        if random.random() < 0.30:
-            deploy_result = simulate_deployment()
-            print(f" Deploy to {deploy_result['environment']}: {deploy_result['status'].upper()}")
-        if push_metrics():
-            print(f"  Metrics pushed to Pushgateway")
+
+    spacing = interval / len(names)
+    started = report_at = time.monotonic()
+    next_run = started
+    build_count = reported_builds = 0
+    previous = {}
+    try:
+        while duration is None or time.monotonic() - started < duration:
+            name = names[build_count % len(names)]
+            m = fleet[name]
+            build_count += 1
+            ci_result = simulate_ci_run(m, workflow=name)
+            deploy_result = simulate_deployment(m, environments=environments, workflow=name) if random.random() < 0.30 else None
+            pusher.mark(grouping_key(name), m.registry)
+
+            if verbose:
+                print(f"\n🔄 Simulating CI/CD run #{build_count}...")
+                print(f" Build: {ci_result['status'].upper()} ({ci_result['duration']}s)")
+                print(f" Tests: {ci_result['tests_passed']}/{ci_result['tests_total']} passed")
+                if deploy_result:
+                    print(f" Deploy to {deploy_result['environment']}: {deploy_result['status'].upper()}")
+                print(f"  Metrics queued for Pushgateway")
+                print(f"\nNext simulation in {interval} seconds...")
+
+            now = time.monotonic()
+            if not verbose and now - report_at >= report_interval:
+                stats = pusher.stats()
+                print(format_push_report(stats, previous, pusher.take_latencies(), now - report_at,
+                                         build_count - reported_builds))
+                previous, report_at, reported_builds = stats, now, build_count
+
+            next_run += spacing
+            delay = next_run - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running behind; don't try to catch up in a burst
+                next_run = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("\n⏳ Flushing pending pushes...")
+        pusher.stop(timeout=10)
+        stats = pusher.stats()
+        print(f"✅ {build_count} builds, {stats['pushes']} pushes, {stats['coalesced']} coalesced, "
+              f"{stats['failures']} failed attempts, {stats['dropped']} dropped")
+
+
+# ============================================
+# HISTORICAL BACKFILL
+# ============================================
+# Replays the simulator over a past period in simulated time and writes an
+# OpenMetrics file with explicit timestamps, which Prometheus imports with
+#   promtool tsdb create-blocks-from openmetrics cicd-backfill.om ./data
+# OpenMetrics wants each series' samples contiguous, so every series streams
+# into its own spool file and they are stitched together at the end. Memory
+# is bounded by the number of series, not by the length of the period.
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+class SeriesSpool:
+    def __init__(self, extra_labels=None, spool_dir=None):
+        self.extra_labels = extra_labels or {}
+        self.spool_dir = spool_dir
+        self._families = {}
+        self._series = {}
+
+    def spool_for(self, family, sample):
+        key = (sample.name, tuple(sorted(sample.labels.items())))
+        series = self._series.get(key)
+        if series is None:
+            labels = {**sample.labels, **self.extra_labels}
+            label_text = ','.join(f'{k}="{_escape(str(v))}"' for k, v in sorted(labels.items()))
+            prefix = f"{sample.name}{{{label_text}}} " if label_text else f"{sample.name} "
+            spool = tempfile.TemporaryFile('w+', encoding='utf-8', dir=self.spool_dir)
+            series = self._series[key] = (prefix, spool)
+            self._families.setdefault(family.name, (family.type, family.documentation, []))[2].append(series)
+        return series
+
+    def finish(self, out):
+        for name, (kind, documentation, series) in self._families.items():
+            out.write(f"# HELP {name} {_escape(documentation)}\n")
+            out.write(f"# TYPE {name} {kind}\n")
+            for _, spool in series:
+                spool.seek(0)
+                shutil.copyfileobj(spool, out)
+                spool.close()
+        out.write("# EOF\n")
+        self._families.clear()
+        self._series.clear()
+
+
+def backfill(out, days=90, step=60, build_interval=1800, end=None, seed=None):
+    """Writes `days` of simulated history ending at `end`, one sample per
+    series every `step` seconds, as a Pushgateway scrape would have seen it."""
+    rng = random.Random(seed)
+    end = time.time() if end is None else end
+    start = end - days * 86400
+
+    backfill_registry = CollectorRegistry()
+    m = CICDMetrics(backfill_registry)
+    spool = SeriesSpool(extra_labels={'job': JOB_NAME})
+
+    next_build = start + rng.uniform(0, build_interval)
+    runs = 0
+    lines = []
+    t = start
+    while t <= end:
+        if next_build <= t:
+            while next_build <= t:
+                simulate_ci_run(m, rng, now=next_build)
+                if rng.random() < 0.30:
+                    simulate_deployment(m, rng, now=next_build)
+                runs += 1
+                next_build += build_interval * rng.uniform(0.5, 1.5)
+            # Values only change when a run happens, so the registry is read
+            # once per run and each step just re-stamps the same lines
+            lines = []
+            for family in backfill_registry.collect():
+                for sample in family.samples:
+                    if not sample.name.endswith('_created'):
+                        prefix, series_spool = spool.spool_for(family, sample)
+                        lines.append((series_spool.write, f"{prefix}{floatToGoString(sample.value)} "))
+        stamp = f"{t:.3f}\n"
+        for write, line in lines:
+            write(line + stamp)
+        t += step
+    spool.finish(out)
+    return runs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CI/CD metrics simulator")
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help="push simulated runs to Pushgateway continuously (default)")
+    run.add_argument('--interval', type=float, default=30, help="seconds between runs of each workflow")
+    run.add_argument('--workflows', type=int, default=1, help="number of simulated workflows")
+    run.add_argument('--environments', default=','.join(DEFAULT_ENVIRONMENTS), help="comma-separated deploy targets")
+    run.add_argument('--pushers', type=int, default=4, help="concurrent push connections")
+    run.add_argument('--report-interval', type=float, default=10, help="seconds between throughput reports")
+    run.add_argument('--duration', type=float, help="stop after this many seconds")
+    run.add_argument('--gateway', default=PUSHGATEWAY_URL)
+
+    fill = commands.add_parser('backfill', help="write simulated history as timestamped OpenMetrics")
+    fill.add_argument('--days', type=float, default=90)
+    fill.add_argument('--step', type=float, default=60, help="seconds between samples of each series")
+    fill.add_argument('--build-interval', type=float, default=1800, help="mean seconds between builds")
+    fill.add_argument('--seed', type=int)
+    fill.add_argument('--output', '-o', default='cicd-backfill.om', help="file to write, '-' for stdout")
+
+    args = parser.parse_args(argv)
+    if args.command == 'backfill':
+        started = time.time()
+        if args.output == '-':
+            runs = backfill(sys.stdout, args.days, args.step, args.build_interval, seed=args.seed)
         else:
-            print(f"  Failed to push metrics")
-        
-        print(f"\nNext simulation in {interval} seconds...")
-        time.sleep(interval)
-        
-        
-run_continuous_simulation(interval=30)
\ No newline at end of file
+            with open(args.output, 'w', encoding='utf-8') as out:
+                runs = backfill(out, args.days, args.step, args.build_interval, seed=args.seed)
+            size_mb = os.path.getsize(args.output) / 1024 / 1024
+            print(f"✅ {runs} simulated runs over {args.days:g} days -> {args.output} "
+                  f"({size_mb:.1f} MB in {time.time() - started:.1f}s)")
+            print(f"   promtool tsdb create-blocks-from openmetrics {args.output} <prometheus-data-dir>")
+    else:
+        if args.command is None:
+            args = run.parse_args([])
+        run_continuous_simulation(interval=args.interval, workflows=args.workflows,
+                                  environments=tuple(args.environments.split(',')), pushers=args.pushers,
+                                  report_interval=args.report_interval, duration=args.duration,
+                                  gateway=args.gateway)
+
+
+if __name__ == '__main__':
+    main()
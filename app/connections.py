@@ -0,0 +1,81 @@
+import os
+import re
+from collections import Counter
+
+import psutil
+
+# ============================================
+# CONNECTION COUNTING
+# ============================================
+# /proc/net/{tcp,tcp6,udp,udp6} list every socket in the network namespace
+# with its state in the 4th column. Reading them in bulk is a few ms even with
+# 100k sockets, while psutil.net_connections() also walks every process's
+# file descriptors to attach PIDs we never use.
+
+PROC_NET = '/proc/net'
+PROTOCOLS = ('tcp', 'tcp6', 'udp', 'udp6')
+
+TCP_STATES = {
+    b'01': psutil.CONN_ESTABLISHED,
+    b'02': psutil.CONN_SYN_SENT,
+    b'03': psutil.CONN_SYN_RECV,
+    b'04': psutil.CONN_FIN_WAIT1,
+    b'05': psutil.CONN_FIN_WAIT2,
+    b'06': psutil.CONN_TIME_WAIT,
+    b'07': psutil.CONN_CLOSE,
+    b'08': psutil.CONN_CLOSE_WAIT,
+    b'09': psutil.CONN_LAST_ACK,
+    b'0A': psutil.CONN_LISTEN,
+    b'0B': psutil.CONN_CLOSING,
+    b'0C': 'NEW_SYN_RECV',
+}
+
+# "   0: 0100007F:1F90 00000000:0000 0A ..." -> capture st. Anchoring on the
+# hex address columns keeps the scan backtrack-free (~3x faster than \S+).
+_STATE_RE = re.compile(rb': [0-9A-F]+:[0-9A-F]{4} [0-9A-F]+:[0-9A-F]{4} ([0-9A-F]{2}) ')
+
+
+def count_proc_net(proc_root=PROC_NET):
+    counts = {}
+    for proto in PROTOCOLS:
+        try:
+            with open(os.path.join(proc_root, proto), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            # e.g. IPv6 disabled
+            continue
+        states = Counter(_STATE_RE.findall(data))
+        if proto.startswith('udp'):
+            total = sum(states.values())
+            if total:
+                counts[(proto, psutil.CONN_NONE)] = total
+            continue
+        for code, count in states.items():
+            counts[(proto, TCP_STATES.get(code, 'UNKNOWN'))] = count
+    return counts
+
+
+_PSUTIL_PROTOCOLS = {
+    ('AF_INET', 'SOCK_STREAM'): 'tcp',
+    ('AF_INET6', 'SOCK_STREAM'): 'tcp6',
+    ('AF_INET', 'SOCK_DGRAM'): 'udp',
+    ('AF_INET6', 'SOCK_DGRAM'): 'udp6',
+}
+
+
+def count_psutil():
+    counts = Counter()
+    for conn in psutil.net_connections(kind='inet'):
+        proto = _PSUTIL_PROTOCOLS.get((conn.family.name, conn.type.name))
+        if proto:
+            counts[(proto, conn.status)] += 1
+    return dict(counts)
+
+
+def count_connections(proc_root=PROC_NET):
+    if os.path.isdir(proc_root):
+        return count_proc_net(proc_root)
+    try:
+        return count_psutil()
+    except (psutil.AccessDenied, OSError):
+        return {}
@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# ============================================
+# PRE-FORK SERVER SETTINGS
+# ============================================
+# gunicorn -c gunicorn.conf.py wsgi:app
+
+# SERVER_MODE=async runs one gevent event loop per worker. gevent patches
+# time.sleep and socket I/O before the app is imported, so the simulated work
+# in /api/data yields instead of holding a thread and a worker can keep
+# thousands of requests in flight while /metrics is still served promptly.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'threaded')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+if SERVER_MODE == 'async':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '4000'))
+    default_workers = multiprocessing.cpu_count()
+else:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+    default_workers = multiprocessing.cpu_count() * 2 + 1
+workers = int(os.environ.get('GUNICORN_WORKERS') or os.environ.get('WEB_CONCURRENCY') or default_workers)
+backlog = int(os.environ.get('GUNICORN_BACKLOG', '4096'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+accesslog = None
+
+# prometheus_client picks its value storage at import time, so the directory
+# must be in the environment before any worker imports main.py
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'devops-dashboard-metrics'))
+
+
+# ============================================
+# SERVER HOOKS
+# ============================================
+
+def on_starting(server):
+    # Files left by a previous run would be merged into the new counters
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # Take the first system sample before serving rather than on first scrape
+    from main import sampler
+    sampler.start()
+
+
+def child_exit(server, worker):
+    # Drops the dead worker's live* gauge files (active_requests, process_*);
+    # its counters and histograms stay so totals never go backwards
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
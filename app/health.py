@@ -0,0 +1,184 @@
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# ============================================
+# HEALTH CHECKS
+# ============================================
+# Pluggable checks behind /readyz and /api/health. Each check returns
+# (status, detail) with status OK, WARNING or FAIL, or raises (FAIL).
+#
+# A result is reused for `ttl` seconds, so a probe flood runs each check at
+# most once per TTL. Stale checks are submitted to a small thread pool
+# together and each is waited for until its own `timeout`; a check that is
+# still running then reports FAIL but keeps its pool thread. Later calls
+# share that run instead of starting another and fail at once once it is past
+# its deadline, so a hung dependency ties up one thread and a probe never
+# waits longer than the check's timeout. run(wait=False) only starts stale
+# checks and returns the cached results, for callers that must not block.
+#
+# Only `critical` checks decide readiness; the others are reported.
+
+OK = 'ok'
+WARNING = 'warning'
+FAIL = 'fail'
+
+health_check_duration_seconds = Histogram(
+    'health_check_duration_seconds',
+    'Duration of health check runs',
+    ['check'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+health_check_up = Gauge(
+    'health_check_up',
+    'Whether the last run of a health check passed (1) or failed (0)',
+    ['check'],
+    multiprocess_mode='livemin'
+)
+
+health_check_timeouts_total = Counter(
+    'health_check_timeouts_total',
+    'Health check runs that exceeded their timeout',
+    ['check']
+)
+
+
+class CheckResult(NamedTuple):
+    status: str
+    detail: str
+    duration: float
+    checked_at: float     # time.monotonic()
+
+    def as_dict(self, now):
+        return {
+            "status": self.status,
+            "detail": self.detail,
+            "duration_ms": round(self.duration * 1000, 3),
+            "age_seconds": round(now - self.checked_at, 3)
+        }
+
+
+class Check:
+    def __init__(self, name, fn, ttl=5.0, timeout=1.0, critical=True):
+        self.name = name
+        self.fn = fn
+        self.ttl = ttl
+        self.timeout = timeout
+        self.critical = critical
+        self.result = None
+        self.future = None
+        self.started = None
+        self.timed_out = None     # `started` of the last run counted as timed out
+
+
+class HealthChecker:
+    def __init__(self, workers=4):
+        self.checks = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='health-check')
+        self._lock = threading.Lock()
+
+    def register(self, name, fn, ttl=5.0, timeout=1.0, critical=True):
+        self.checks[name] = Check(name, fn, ttl, timeout, critical)
+
+    def run(self, names=None, wait=True):
+        # Returns {name: CheckResult} for the requested checks. With
+        # wait=False stale checks are started in the background and the
+        # cached results returned at once; checks that never finished a run
+        # are left out.
+        now = time.monotonic()
+        checks = [self.checks[n] for n in (names or self.checks)]
+        waiting = []
+        with self._lock:
+            for check in checks:
+                if check.result is not None and now - check.result.checked_at < check.ttl:
+                    continue
+                if check.future is None:
+                    check.started = now
+                    check.future = self._pool.submit(self._execute, check)
+                waiting.append((check, check.future, check.started))
+        results = {check.name: check.result for check in checks}
+        if not wait:
+            for check, future, started in waiting:
+                if now - started > check.timeout:
+                    results[check.name] = self._timed_out(check, started, now)
+            return {name: result for name, result in results.items() if result is not None}
+        for check, future, started in waiting:
+            remaining = started + check.timeout - time.monotonic()
+            try:
+                results[check.name] = future.result(timeout=max(0.0, remaining))
+            except Exception:
+                results[check.name] = self._timed_out(check, started, time.monotonic())
+        return results
+
+    def _timed_out(self, check, started, now):
+        with self._lock:
+            # Counted once per run, however many callers see it time out
+            first = check.timed_out != started
+            check.timed_out = started
+        if first:
+            health_check_timeouts_total.labels(check.name).inc()
+        health_check_up.labels(check.name).set(0)
+        return CheckResult(FAIL, f"timed out after {check.timeout:g}s", now - started, started)
+
+    def ready(self, results):
+        return all(r.status != FAIL for name, r in results.items() if self.checks[name].critical)
+
+    def _execute(self, check):
+        start = time.perf_counter()
+        try:
+            status, detail = check.fn()
+        except Exception as e:
+            status, detail = FAIL, f"{type(e).__name__}: {e}"
+        duration = time.perf_counter() - start
+        result = CheckResult(status, detail, duration, time.monotonic())
+        health_check_duration_seconds.labels(check.name).observe(duration)
+        health_check_up.labels(check.name).set(0 if status == FAIL else 1)
+        with self._lock:
+            check.result = result
+            check.future = None
+        return result
+
+
+# ============================================
+# BUILT-IN CHECKS
+# ============================================
+
+def disk_free_check(sampler, min_free_percent=5.0, warn_free_percent=10.0):
+    # From the latest sample, refreshed by the sampler's disk collector, so
+    # probes never call psutil themselves
+    def check():
+        snap = sampler.snapshot()
+        free = snap.disk_free / snap.disk_total * 100 if snap.disk_total else 0.0
+        detail = f"{free:.1f}% free on {sampler.host.disk_path}"
+        if free < min_free_percent:
+            return FAIL, detail
+        return (WARNING if free < warn_free_percent else OK), detail
+    return check
+
+
+def sampler_freshness_check(sampler, max_age):
+    def check():
+        age = max(0.0, time.time() - sampler.snapshot().timestamp)
+        detail = f"last sample {age:.1f}s ago"
+        return (FAIL if age > max_age else OK), detail
+    return check
+
+
+def usage_check(sampler, field, warn_percent=90.0):
+    # cpu_percent / memory_percent from the latest sample; warns, never fails
+    def check():
+        value = getattr(sampler.snapshot(), field)
+        return (WARNING if value >= warn_percent else OK), f"{value:.1f}%"
+    return check
+
+
+def http_check(url, timeout):
+    def check():
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return OK, f"HTTP {response.status}"
+    return check
@@ -0,0 +1,166 @@
+import math
+import threading
+from array import array
+
+# ============================================
+# IN-PROCESS HISTORY
+# ============================================
+# Recent samples kept in fixed-size, array-backed rings: one array('d') per
+# column, so a sample costs 8 bytes per series instead of a dict. Two tiers:
+#
+#   raw     every sample (1 s by default) for the last 10 minutes
+#   rollup  one mean/min/max row per minute for the last 24 hours
+#
+# With the default 14 series that is 14 * 600 * 8 B raw plus 14 * 1440 * 3 *
+# 8 B rolled up, about 0.55 MB per process, and it never grows. Queries
+# binary-search the time column and only walk the requested slice.
+
+MAX_POINTS = 1500
+
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(text):
+    # "90", "90s", "10m", "24h", "1d" -> seconds
+    text = str(text).strip().lower()
+    if text and text[-1] in _UNITS:
+        value = float(text[:-1]) * _UNITS[text[-1]]
+    else:
+        value = float(text)
+    if not value > 0 or math.isinf(value):
+        raise ValueError(f"invalid duration: {text!r}")
+    return value
+
+
+class Ring:
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.columns = {name: array('d', bytes(8 * capacity)) for name in columns}
+        self.start = 0
+        self.count = 0
+
+    def append(self, ts, values):
+        if self.count < self.capacity:
+            i = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[i] = ts
+        for name, column in self.columns.items():
+            column[i] = values[name]
+
+    def first_at_or_after(self, ts):
+        # Logical position (0 = oldest) of the first sample at or after ts
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[(self.start + mid) % self.capacity] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def segments(self, first):
+        # Physical index ranges holding logical positions first..count-1; at
+        # most two because the ring may wrap
+        begin = (self.start + first) % self.capacity
+        end = begin + self.count - first
+        if end <= self.capacity:
+            return [(begin, end)]
+        return [(begin, self.capacity), (0, end - self.capacity)]
+
+    @property
+    def nbytes(self):
+        return self.timestamps.itemsize * self.capacity * (1 + len(self.columns))
+
+
+class History:
+    def __init__(self, series, raw_seconds=600, interval=1.0, rollup_seconds=60, rollup_span=86400):
+        self.series = tuple(series)
+        self.interval = interval
+        self.rollup_seconds = rollup_seconds
+        self.raw = Ring(math.ceil(raw_seconds / interval), self.series)
+        self.rollup = Ring(math.ceil(rollup_span / rollup_seconds),
+                           [f"{name}.{agg}" for name in self.series for agg in ('mean', 'min', 'max')])
+        self._lock = threading.Lock()
+        self._minute = None
+        self._acc = {}
+
+    @property
+    def nbytes(self):
+        return self.raw.nbytes + self.rollup.nbytes
+
+    def add(self, ts, values):
+        minute = int(ts // self.rollup_seconds)
+        with self._lock:
+            self.raw.append(ts, values)
+            if minute != self._minute:
+                self._close_minute()
+                self._minute = minute
+                self._acc = {name: [0.0, 0, math.inf, -math.inf] for name in self.series}
+            for name in self.series:
+                value = values[name]
+                acc = self._acc[name]
+                acc[0] += value
+                acc[1] += 1
+                if value < acc[2]:
+                    acc[2] = value
+                if value > acc[3]:
+                    acc[3] = value
+
+    def _close_minute(self):
+        if self._minute is None or not self._acc:
+            return
+        row = {}
+        for name, (total, n, low, high) in self._acc.items():
+            row[f"{name}.mean"] = total / n
+            row[f"{name}.min"] = low
+            row[f"{name}.max"] = high
+        self.rollup.append(self._minute * self.rollup_seconds, row)
+
+    def query(self, metric, range_seconds, step=None, now=None):
+        if metric not in self.series:
+            raise KeyError(metric)
+        with self._lock:
+            if now is None:
+                now = self.raw.timestamps[(self.raw.start + self.raw.count - 1) % self.raw.capacity] \
+                    if self.raw.count else 0.0
+            raw_span = self.raw.capacity * self.interval
+            if range_seconds <= raw_span and (step is None or step < self.rollup_seconds):
+                ring, resolution = self.raw, self.interval
+                columns = (ring.columns[metric],) * 3
+            else:
+                ring, resolution = self.rollup, self.rollup_seconds
+                columns = tuple(ring.columns[f"{metric}.{agg}"] for agg in ('mean', 'min', 'max'))
+            step = max(step or resolution, resolution, range_seconds / MAX_POINTS)
+            points = self._bucket(ring, columns, now - range_seconds, step)
+        return {
+            "metric": metric,
+            "range_seconds": range_seconds,
+            "step_seconds": step,
+            "resolution_seconds": resolution,
+            "columns": ["timestamp", "mean", "min", "max"],
+            "points": points
+        }
+
+    def _bucket(self, ring, columns, since, step):
+        mean, low, high = columns
+        timestamps = ring.timestamps
+        points = []
+        bucket = None
+        for begin, end in ring.segments(ring.first_at_or_after(since)):
+            for i in range(begin, end):
+                b = timestamps[i] // step * step
+                if b != bucket:
+                    if bucket is not None:
+                        points.append([bucket, total / n, lo, hi])
+                    bucket, total, n, lo, hi = b, 0.0, 0, math.inf, -math.inf
+                total += mean[i]
+                n += 1
+                lo = min(lo, low[i])
+                hi = max(hi, high[i])
+        if bucket is not None:
+            points.append([bucket, total / n, lo, hi])
+        return points
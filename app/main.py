@@ -1,13 +1,46 @@
-from flask import Flask,jsonify,request
-from prometheus_client import Counter,Gauge,Histogram,Summary,Info,generate_latest,CONTENT_TYPE_LATEST
-from functools import wraps
+from flask import Blueprint,Flask,Response,current_app,jsonify,request
+from prometheus_client import Counter,Gauge,Histogram,Summary,Info
+from prometheus_client import CollectorRegistry,REGISTRY,multiprocess
+from contextvars import ContextVar
+from typing import NamedTuple
+import json
 import time
-import psutil
 import random
-import platform
 import os
-
-app = Flask(__name__)
+from sampler import SystemSampler,parse_collector_settings
+from cardinality import LabelLimiter
+from exposition import MetricsRenderer
+from capture import RequestCapture
+from history import History,parse_duration
+from stream import Broadcaster,encode_event
+from processes import TopProcessCollector
+from devices import DEFAULT_DEVICE_EXCLUDE,DEFAULT_INTERFACE_EXCLUDE,DeviceIOCollector
+from admission import AdmissionController,CRITICAL,NORMAL,parse_route_classes
+from sketch import LatencySketches
+from health import FAIL,HealthChecker,disk_free_check,http_check,sampler_freshness_check,usage_check
+from slowlog import SlowRequest,SlowRequestLog,TimedJSONProvider,new_request_id,serialization_seconds
+from profiler import ProfilerBusy,SamplingProfiler
+from functools import partial
+import hmac
+
+bp = Blueprint('dashboard', __name__)
+
+# Set by gunicorn.conf.py: every worker writes its samples to mmap files in
+# this directory and /metrics aggregates them, see metrics_registry()
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+# Seconds between background system samples; endpoints only read the snapshot.
+# Collectors (see sampler.DEFAULT_COLLECTORS) can be turned off or given their
+# own interval and time budget, e.g. COLLECTORS_DISABLED=connections,
+# COLLECTOR_INTERVALS=disk=60, COLLECTOR_BUDGETS=connections=0.5
+SAMPLER_INTERVAL = float(os.environ.get('SAMPLER_INTERVAL', '1.0'))
+sampler = SystemSampler(
+    interval=SAMPLER_INTERVAL,
+    disabled=set(filter(None, (n.strip() for n in os.environ.get('COLLECTORS_DISABLED', '').split(',')))),
+    intervals=parse_collector_settings(os.environ.get('COLLECTOR_INTERVALS', '')),
+    budgets=parse_collector_settings(os.environ.get('COLLECTOR_BUDGETS', ''))
+)
+host_info = sampler.host
 
 # ============================================
 # PROMETHEUS METRICS DEFINITIONS
@@ -17,8 +50,8 @@ app_info = Info('app','Application information')
 app_info.info({
     'version': '1.0.0',
     'name': 'devops-dashboard',
-    'python_version': platform.python_version(),
-    'platform': platform.system()
+    'python_version': host_info.python_version,
+    'platform': host_info.platform
 })
 
 http_requests_total = Counter(
@@ -27,18 +60,26 @@ http_requests_total = Counter(
     ["method", "endpoint","status"]
 )
 
+# Histogram bucket bounds in seconds, e.g. LATENCY_BUCKETS=0.05,0.1,0.2,0.3,0.5,1
+# to resolve /api/data's 100-500 ms band; /api/latency has finer quantiles
+LATENCY_BUCKETS = sorted(float(b) for b in os.environ.get(
+    'LATENCY_BUCKETS', '0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0').split(','))
+
 http_request_duration_seconds = Histogram(
     'http_request_duration_seconds',
     'HTTP request duration in seconds',
     ['method','endpoint'],
-    buckets=[0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0]
+    buckets=LATENCY_BUCKETS
 )
 
+# Opt-in: a labelled Summary adds two more locked updates to every request
+# and no dashboard reads it
+TRACK_REQUEST_SIZE = os.environ.get('TRACK_REQUEST_SIZE', '0') == '1'
 http_request_size_bytes = Summary(
     'http_request_size_bytes',
     'HTTP request size in bytes',
     ['method','endpoint']
-)
+) if TRACK_REQUEST_SIZE else None
 
 http_errors_total = Counter(
     "http_errors_total",
@@ -46,36 +87,51 @@ http_errors_total = Counter(
     ["endpoint","error_type"]
 )
 
+http_requests_shed_total = Counter(
+    "http_requests_shed_total",
+    "Requests rejected with 503 by admission control",
+    ["endpoint","reason"]
+)
+
+# multiprocess_mode only applies under MULTIPROCESS: host-wide readings take
+# the freshest live worker's value, per-worker readings are summed over live
+# workers so a dead worker's in-flight requests and RSS disappear with it.
 active_requests = Gauge(
     'active_requests',
-    'Number of requests currently being processed'
+    'Number of requests currently being processed',
+    multiprocess_mode='livesum'
 )
 
-cpu_usage_percent = Gauge("cpu_usage_percent","CPU Usage Percentage")
-cpu_count_total = Gauge("cpu_count_total","Total CPU cores")
-cpu_frequency_mhz = Gauge("cpu_frequency_mhz","CPU Frequency in MHz")
+cpu_usage_percent = Gauge("cpu_usage_percent","CPU Usage Percentage",multiprocess_mode="livemostrecent")
+cpu_count_total = Gauge("cpu_count_total","Total CPU cores",multiprocess_mode="livemostrecent")
+cpu_frequency_mhz = Gauge("cpu_frequency_mhz","CPU Frequency in MHz",multiprocess_mode="livemostrecent")
 
 
-memory_usage_bytes = Gauge("memory_usage_bytes","Memory Usage in Bytes")
-memory_total_bytes = Gauge("memory_total_bytes","Total Memory in Bytes")
-memory_usage_percent = Gauge("memory_usage_percent","Memory Usage Percentage")
-memory_available_bytes = Gauge("memory_available_bytes","Available Memory in Bytes")
+memory_usage_bytes = Gauge("memory_usage_bytes","Memory Usage in Bytes",multiprocess_mode="livemostrecent")
+memory_total_bytes = Gauge("memory_total_bytes","Total Memory in Bytes",multiprocess_mode="livemostrecent")
+memory_usage_percent = Gauge("memory_usage_percent","Memory Usage Percentage",multiprocess_mode="livemostrecent")
+memory_available_bytes = Gauge("memory_available_bytes","Available Memory in Bytes",multiprocess_mode="livemostrecent")
 
-disk_usage_percent = Gauge("disk_usage_percent","Disk Usage Percentage")
-disk_total_bytes = Gauge("disk_total_bytes","Total Disk Space in Bytes")
-disk_used_bytes = Gauge("disk_used_bytes","Used Disk Space in Bytes")
-disk_free_bytes = Gauge("disk_free_bytes","Free Disk Space in Bytes")
+disk_usage_percent = Gauge("disk_usage_percent","Disk Usage Percentage",multiprocess_mode="livemostrecent")
+disk_total_bytes = Gauge("disk_total_bytes","Total Disk Space in Bytes",multiprocess_mode="livemostrecent")
+disk_used_bytes = Gauge("disk_used_bytes","Used Disk Space in Bytes",multiprocess_mode="livemostrecent")
+disk_free_bytes = Gauge("disk_free_bytes","Free Disk Space in Bytes",multiprocess_mode="livemostrecent")
 
-network_bytes_sent = Gauge("network_bytes_sent","Total Network Bytes Sent")
-network_bytes_recv = Gauge("network_bytes_recv","Total Network Bytes Received")
-network_connections = Gauge("network_connections","Number of Network Connections")
+network_bytes_sent = Gauge("network_bytes_sent","Total Network Bytes Sent",multiprocess_mode="livemostrecent")
+network_bytes_recv = Gauge("network_bytes_recv","Total Network Bytes Received",multiprocess_mode="livemostrecent")
+network_connections = Gauge(
+    "network_connections",
+    "Number of Network Connections by protocol and state",
+    ["proto","state"],
+    multiprocess_mode="livemostrecent"
+)
 
-process_cpu_percent = Gauge("process_cpu_percent","Process CPU Percentage")
-process_memory_bytes = Gauge("process_memory_bytes","Process Memory Usage in Bytes")
-process_threads = Gauge("process_threads","Number of Process Threads")
+process_cpu_percent = Gauge("process_cpu_percent","Process CPU Percentage",multiprocess_mode="livesum")
+process_memory_bytes = Gauge("process_memory_bytes","Process Memory Usage in Bytes",multiprocess_mode="livesum")
+process_threads = Gauge("process_threads","Number of Process Threads",multiprocess_mode="livesum")
 
 
-app_uptime_seconds = Gauge("app_uptime_seconds", "Application Uptime in Seconds")
+app_uptime_seconds = Gauge("app_uptime_seconds", "Application Uptime in Seconds",multiprocess_mode="livemax")
 app_start_time = time.time()
 
 api_calls_by_endpoint = Counter(
@@ -84,89 +140,421 @@ api_calls_by_endpoint = Counter(
     ['endpoint']
 )
 
+# Request metrics are labelled with the matched route template and capped per
+# metric (METRICS_MAX_SERIES), so scanners and path parameters cannot grow
+# the series count without bound
+UNMATCHED_ROUTE = '<unmatched>'
+requests_series = LabelLimiter(http_requests_total, 'http_requests_total')
+duration_series = LabelLimiter(http_request_duration_seconds, 'http_request_duration_seconds')
+size_series = LabelLimiter(http_request_size_bytes, 'http_request_size_bytes') if TRACK_REQUEST_SIZE else None
+errors_series = LabelLimiter(http_errors_total, 'http_errors_total')
+calls_series = LabelLimiter(api_calls_by_endpoint, 'api_calls_by_endpoint')
+shed_series = LabelLimiter(http_requests_shed_total, 'http_requests_shed_total')
+
 # ============================================
 # MIDDLEWARE - Request Tracking
 # ============================================
 
-def track_metrics(f):
-    @wraps(f)
-    def decorated_function(*args,**kwargs):
-        start_time = time.time()
-        method = request.method
-        endpoint = request.path
-        
-        active_requests.inc()
-        
-        try:
-            response = f(*args,**kwargs)
-            status = response[1] if isinstance(response, tuple) else 200
-            http_requests_total.labels(method=method,endpoint=endpoint,status=status).inc()
-            api_calls_by_endpoint.labels(endpoint=endpoint).inc()
-            content_length = request.content_length or 0
-            http_request_size_bytes.labels(method=method,endpoint=endpoint).observe(content_length)
-            
-            return response
-            
-        except Exception as e:
-            http_errors_total.labels(endpoint=endpoint,error_type=type(e).__name__).inc()
-            http_requests_total.labels(method=method,endpoint=endpoint,status=500).inc()
-            raise
-            
-        finally:
-            duration = time.time() - start_time
-            http_request_duration_seconds.labels(method=method,endpoint=endpoint).observe(duration)
-            active_requests.dec()
-    
-    return decorated_function
+def route_label(req=request):
+    rule = req.url_rule
+    return rule.rule if rule is not None else UNMATCHED_ROUTE
+
+
+# Per (method, route) DDSketches over a sliding window behind /api/latency;
+# per process, like the history
+LATENCY_WINDOW = float(os.environ.get('LATENCY_WINDOW', '60'))
+latency_sketches = LatencySketches(window=LATENCY_WINDOW)
+
+
+class RequestSeries(NamedTuple):
+    requests: object
+    calls: object
+    duration: object
+    size: object
+    sketch: object
+
+
+# (method, route, status) -> label children bound once, so the hot path is a
+# single dict lookup instead of one labels() call per metric
+_request_series = {}
+MAX_CACHED_SERIES = 1024
+
+
+def request_series(method, endpoint, status):
+    key = (method, endpoint, status)
+    series = _request_series.get(key)
+    if series is not None:
+        return series
+    status = str(status)
+    series = RequestSeries(
+        requests=requests_series.labels(method,endpoint,status),
+        calls=calls_series.labels(endpoint),
+        duration=duration_series.labels(method,endpoint),
+        size=size_series.labels(method,endpoint) if size_series else None,
+        sketch=latency_sketches.get(method,endpoint)
+    )
+    # Combinations folded into 'other' are not cached so every hit is counted
+    # in metric_label_overflow_total
+    admitted = ((method,endpoint,status) in requests_series
+                and (endpoint,) in calls_series
+                and (method,endpoint) in duration_series)
+    if admitted and len(_request_series) < MAX_CACHED_SERIES:
+        _request_series[key] = series
+    return series
+
+
+# Opt-in request log for `load-test.py --replay`; use {pid} in the path when
+# running several pre-fork workers
+CAPTURE_PATH = os.environ.get('CAPTURE_PATH', '')
+request_capture = RequestCapture(
+    CAPTURE_PATH,
+    max_bytes=int(os.environ.get('CAPTURE_MAX_BYTES', str(50 * 1024 * 1024))),
+    backups=int(os.environ.get('CAPTURE_BACKUPS', '5'))
+) if CAPTURE_PATH else None
+
+
+# Concurrency limit for non-critical routes, see admission.py; 0 disables it.
+# Under SERVER_MODE=threaded keep it below GUNICORN_THREADS with
+# ADMISSION_QUEUE_TIMEOUT=0, so a thread is always free for probes.
+ADMISSION_LIMIT = int(os.environ.get('ADMISSION_LIMIT', '0'))
+ADMISSION_RETRY_AFTER = os.environ.get('ADMISSION_RETRY_AFTER', '1')
+ADMISSION_CLASSES = parse_route_classes(
+    os.environ.get('ADMISSION_ROUTE_CLASSES', ''),
+    defaults={'/metrics': CRITICAL, '/api/health': CRITICAL}
+)
+admission = AdmissionController(
+    ADMISSION_LIMIT,
+    queue_size=int(os.environ.get('ADMISSION_QUEUE', str(ADMISSION_LIMIT))),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '1.0')),
+    adaptive=os.environ.get('ADMISSION_ADAPTIVE', '0') == '1',
+    max_limit=int(os.environ.get('ADMISSION_MAX_LIMIT', '0')) or None
+) if ADMISSION_LIMIT > 0 else None
+
+
+# Slowest requests of the last SLOW_REQUEST_WINDOW seconds for /debug/slow,
+# per process; SLOW_REQUESTS=0 disables it. Requests under
+# SLOW_REQUEST_MIN_MS are never kept.
+SLOW_REQUESTS = int(os.environ.get('SLOW_REQUESTS', '50'))
+slow_requests = SlowRequestLog(
+    SLOW_REQUESTS,
+    window=float(os.environ.get('SLOW_REQUEST_WINDOW', '300')),
+    min_duration=float(os.environ.get('SLOW_REQUEST_MIN_MS', '0')) / 1000
+) if SLOW_REQUESTS > 0 else None
+
+
+# (start, method, route, ready, holds slot) of the request in flight; ready
+# is when before_request finished, after any admission wait. A ContextVar rather than
+# flask.g: every access through the g/request proxies costs about as much as
+# a counter increment, and Flask runs each request in its own context anyway.
+_request_metrics = ContextVar('request_metrics', default=None)
+
+
+def record_request(status):
+    started = _request_metrics.get()
+    if started is None:
+        # Already recorded by after_request, or before_request never ran
+        return
+    _request_metrics.set(None)
+    start, method, endpoint, ready, holds_slot = started
+    now = time.perf_counter()
+    duration = now - start
+    if holds_slot:
+        # Service time without the queue wait drives the adaptive limit
+        admission.release(now - ready)
+    series = request_series(method, endpoint, status)
+    series.requests.inc()
+    series.calls.inc()
+    slow = None
+    if slow_requests is not None and slow_requests.is_candidate(duration, now):
+        request_id = (request.headers.get('X-Request-ID') or new_request_id())[:64]
+        # Exemplars are dropped in multiprocess mode, so skip building one
+        series.duration.observe(duration, None if MULTIPROCESS else {'request_id': request_id})
+        slow = (request_id, start, ready, now, serialization_seconds.get(),
+                method, endpoint, request.path, status)
+    else:
+        series.duration.observe(duration)
+    series.sketch.observe(duration, now)
+    if series.size is not None:
+        series.size.observe(request.content_length or 0)
+    active_requests.dec()
+    if request_capture is not None:
+        capture_request(method, endpoint, status, duration)
+    return slow
+
+
+def record_slow_request(slow, response):
+    request_id, start, ready, done, serialization, method, endpoint, path, status = slow
+    # Streamed bodies last as long as the client stays, see slowlog.py
+    closed = done if response.is_streamed else time.perf_counter()
+    slow_requests.add(SlowRequest(
+        request_id=request_id,
+        timestamp=time.time() - (time.perf_counter() - start),
+        method=method,
+        route=endpoint,
+        path=path,
+        status=status,
+        response_bytes=response.content_length or 0,
+        duration=closed - start,
+        phases={
+            "admission": ready - start,
+            "handler": max(0.0, done - ready - serialization),
+            "serialization": serialization,
+            "write": closed - done
+        }
+    ), closed)
+
+
+def capture_request(method, endpoint, status, duration):
+    request_capture.record({
+        "ts": round(time.time() - duration, 6),
+        "method": method,
+        "path": request.path,
+        "query": request.query_string.decode('latin-1'),
+        "route": endpoint,
+        "size": request.content_length or 0,
+        "status": status,
+        "latency_ms": round(duration * 1000, 3)
+    })
+
+
+# App-wide hooks rather than a per-view decorator, so every route including
+# /metrics and 404s is measured. Probes are the exception: orchestrators
+# call them every few seconds per replica, and they must never be shed.
+UNTRACKED_PATHS = frozenset(('/livez', '/readyz'))
+
+@bp.before_app_request
+def start_request_metrics():
+    if request.path in UNTRACKED_PATHS:
+        return
+    start = time.perf_counter()
+    serialization_seconds.set(0.0)
+    req = request._get_current_object()
+    endpoint = route_label(req)
+    active_requests.inc()
+    holds_slot = False
+    if admission is not None:
+        cls = ADMISSION_CLASSES.get(endpoint, NORMAL)
+        reason = admission.acquire(cls)
+        if reason is not None:
+            _request_metrics.set((start, req.method, endpoint, time.perf_counter(), False))
+            shed_series.labels(endpoint, reason).inc()
+            return jsonify({"error": "Service overloaded", "reason": reason}),503,{
+                'Retry-After': ADMISSION_RETRY_AFTER
+            }
+        holds_slot = cls != CRITICAL
+    _request_metrics.set((start, req.method, endpoint, time.perf_counter(), holds_slot))
+
+
+@bp.after_app_request
+def record_request_metrics(response):
+    slow = record_request(response.status_code)
+    if slow is not None:
+        response.headers['X-Request-ID'] = slow[0]
+        if response.is_streamed:
+            record_slow_request(slow, response)
+        else:
+            # The body is sent after this hook; finish the entry on close
+            response.call_on_close(partial(record_slow_request, slow, response))
+    return response
+
+
+@bp.teardown_app_request
+def finish_request_metrics(exc):
+    if exc is not None:
+        errors_series.labels(route_label(),type(exc).__name__).inc()
+    # after_request is skipped when the exception propagates (TESTING,
+    # PROPAGATE_EXCEPTIONS), otherwise it already saw the 500 response
+    record_request(500)
 
 
 # ============================================
 # SYSTEM METRICS UPDATE FUNCTION
 # ============================================
 
+_connection_labels = set()
+
 def update_system_metrics():
-    cpu_usage_percent.set(psutil.cpu_percent(interval=0.1))
-    cpu_count_total.set(psutil.cpu_count())
-    try:
-        cpu_freq = psutil.cpu_freq()
-        if cpu_freq:
-            cpu_frequency_mhz.set(cpu_freq.current)
-    except:
-        pass
+    # Gauges are published by the sampler thread on every refresh, see
+    # publish_snapshot; this only makes sure the sampler is running
+    sampler.snapshot()
+    app_uptime_seconds.set(time.time() - app_start_time)
+
+
+def publish_snapshot(snap):
+    # A disabled collector's fields stay at zero; leave its gauges unset
+    # rather than report zero CPU or an empty disk
+    cpu_count_total.set(host_info.cpu_count)
+    if sampler.collects('cpu'):
+        cpu_usage_percent.set(snap.cpu_percent)
+    if snap.cpu_freq_mhz:
+        cpu_frequency_mhz.set(snap.cpu_freq_mhz)
     
-    mem = psutil.virtual_memory()
-    memory_usage_bytes.set(mem.used)
-    memory_total_bytes.set(mem.total)
-    memory_usage_percent.set(mem.percent)
-    memory_available_bytes.set(mem.available)
+    if sampler.collects('memory'):
+        memory_usage_bytes.set(snap.memory_used)
+        memory_total_bytes.set(snap.memory_total)
+        memory_usage_percent.set(snap.memory_percent)
+        memory_available_bytes.set(snap.memory_available)
     
-    try:
-        disk = psutil.disk_usage('/')
-    except:
-        disk = psutil.disk_usage('C:')
-    disk_usage_percent.set(disk.percent)
-    disk_total_bytes.set(disk.total)
-    disk_used_bytes.set(disk.used)
-    disk_free_bytes.set(disk.free)
+    if sampler.collects('disk'):
+        disk_usage_percent.set(snap.disk_percent)
+        disk_total_bytes.set(snap.disk_total)
+        disk_used_bytes.set(snap.disk_used)
+        disk_free_bytes.set(snap.disk_free)
     
-    net = psutil.net_io_counters()
-    network_bytes_sent.set(net.bytes_sent)
-    network_bytes_recv.set(net.bytes_recv)
-    network_connections.set(len(psutil.net_connections()))
+    if sampler.collects('network'):
+        network_bytes_sent.set(snap.network_bytes_sent)
+        network_bytes_recv.set(snap.network_bytes_recv)
+    seen = set()
+    for (proto, state), count in snap.network_connections:
+        network_connections.labels(proto=proto,state=state).set(count)
+        seen.add((proto, state))
+    # States that emptied since the last sample must drop to zero, not go stale
+    for labels in _connection_labels - seen:
+        network_connections.labels(*labels).set(0)
+    _connection_labels.update(seen)
     
-    process = psutil.Process()
-    process_cpu_percent.set(process.cpu_percent())
-    process_memory_bytes.set(process.memory_info().rss)
-    process_threads.set(process.num_threads())
-    app_uptime_seconds.set(time.time() - app_start_time)
+    if sampler.collects('process'):
+        process_cpu_percent.set(snap.process_cpu_percent)
+        process_memory_bytes.set(snap.process_memory_rss)
+        process_threads.set(snap.process_threads)
+
+
+# Publishing from the sampler also means every pre-fork worker reports its
+# own process_* readings, not only the worker that happens to serve a scrape
+sampler.add_listener(publish_snapshot)
+
+
+# ============================================
+# IN-PROCESS HISTORY
+# ============================================
+# Fed by the sampler so /api/stats/history works without Prometheus. Under
+# gunicorn each worker keeps its own copy; request series are per worker.
+
+HISTORY_SERIES = (
+    'cpu_percent','memory_percent','memory_used_bytes','disk_percent',
+    'network_sent_bytes_per_second','network_recv_bytes_per_second','network_connections',
+    'process_cpu_percent','process_memory_bytes','process_threads',
+    'requests_per_second','errors_per_second','request_latency_ms','active_requests'
+)
+history = History(HISTORY_SERIES, interval=SAMPLER_INTERVAL)
+_history_last = None
+
+
+def request_totals():
+    # (requests, 5xx responses, seconds spent, timed requests) of this process
+    requests = errors = seconds = timed = 0.0
+    for family in http_requests_total.collect():
+        for sample in family.samples:
+            if sample.name.endswith('_total'):
+                requests += sample.value
+                if sample.labels['status'].startswith('5'):
+                    errors += sample.value
+    for family in http_request_duration_seconds.collect():
+        for sample in family.samples:
+            if sample.name.endswith('_sum'):
+                seconds += sample.value
+            elif sample.name.endswith('_count'):
+                timed += sample.value
+    return requests, errors, seconds, timed
+
+
+def record_history(snap):
+    global _history_last
+    totals = request_totals()
+    last, _history_last = _history_last, (snap, totals)
+    if last is None:
+        return
+    prev, prev_totals = last
+    elapsed = snap.timestamp - prev.timestamp
+    if elapsed <= 0:
+        return
+    requests, errors, seconds, timed = (now - before for now, before in zip(totals, prev_totals))
+    history.add(snap.timestamp, {
+        'cpu_percent': snap.cpu_percent,
+        'memory_percent': snap.memory_percent,
+        'memory_used_bytes': snap.memory_used,
+        'disk_percent': snap.disk_percent,
+        'network_sent_bytes_per_second': (snap.network_bytes_sent - prev.network_bytes_sent) / elapsed,
+        'network_recv_bytes_per_second': (snap.network_bytes_recv - prev.network_bytes_recv) / elapsed,
+        'network_connections': sum(count for _, count in snap.network_connections),
+        'process_cpu_percent': snap.process_cpu_percent,
+        'process_memory_bytes': snap.process_memory_rss,
+        'process_threads': snap.process_threads,
+        'requests_per_second': requests / elapsed,
+        'errors_per_second': errors / elapsed,
+        'request_latency_ms': seconds / timed * 1000 if timed else 0.0,
+        'active_requests': active_requests.collect()[0].samples[0].value
+    })
+
+
+sampler.add_listener(record_history)
+
+
+# ============================================
+# LIVE STREAM
+# ============================================
+# /api/stream pushes what /api/stats and /api/health return, built and
+# encoded once per sample for all subscribers instead of once per poll
+
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', '16'))
+STREAM_HEARTBEAT = float(os.environ.get('STREAM_HEARTBEAT', '15'))
+broadcaster = Broadcaster(queue_size=STREAM_QUEUE_SIZE, heartbeat=STREAM_HEARTBEAT)
+_stream_sequence = 0
+
+
+def publish_stream(snap):
+    global _stream_sequence
+    if not len(broadcaster):
+        return
+    _stream_sequence += 1
+    broadcaster.publish(
+        encode_event('stats', json.dumps(stats_payload(snap), separators=(',',':')), _stream_sequence)
+        + encode_event('health', json.dumps(health_payload(wait=False), separators=(',',':')))
+    )
+
+
+sampler.add_listener(publish_stream)
+
+
+# ============================================
+# HEALTH CHECKS
+# ============================================
+# Shared by /readyz and /api/health, see health.py. Each result is cached
+# for its TTL; HEALTH_CHECK_TIMEOUT bounds how long any one check can hold
+# up a probe.
+
+HEALTH_CHECK_TIMEOUT = float(os.environ.get('HEALTH_CHECK_TIMEOUT', '1.0'))
+health_checks = HealthChecker(workers=int(os.environ.get('HEALTH_CHECK_WORKERS', '4')))
+health_checks.register(
+    'sampler', sampler_freshness_check(sampler, max_age=max(5.0, SAMPLER_INTERVAL * 5)),
+    ttl=1.0, timeout=HEALTH_CHECK_TIMEOUT
+)
+if sampler.collects('disk'):
+    health_checks.register(
+        'disk', disk_free_check(sampler, min_free_percent=float(os.environ.get('DISK_FREE_MIN_PERCENT', '5'))),
+        ttl=1.0, timeout=HEALTH_CHECK_TIMEOUT
+    )
+health_checks.register('cpu', usage_check(sampler, 'cpu_percent'), ttl=1.0, timeout=HEALTH_CHECK_TIMEOUT,
+                       critical=False)
+health_checks.register('memory', usage_check(sampler, 'memory_percent'), ttl=1.0, timeout=HEALTH_CHECK_TIMEOUT,
+                       critical=False)
+# Where cicd_metrics.py pushes, e.g. http://localhost:9091; reported, but
+# an outage there does not take the API out of rotation
+HEALTH_PUSHGATEWAY_URL = os.environ.get('HEALTH_PUSHGATEWAY_URL', '')
+if HEALTH_PUSHGATEWAY_URL:
+    health_checks.register(
+        'pushgateway', http_check(HEALTH_PUSHGATEWAY_URL.rstrip('/') + '/-/ready', timeout=HEALTH_CHECK_TIMEOUT),
+        ttl=10.0, timeout=HEALTH_CHECK_TIMEOUT, critical=False
+    )
+# cpu and memory only warn, so readiness runs just the checks that can fail it
+READINESS_CHECKS = [name for name, check in health_checks.checks.items() if check.critical]
 
 
 # ============================================
 # API ROUTES
 # ============================================
 
-@app.route("/")
-@track_metrics
+@bp.route("/")
 def home():
     return jsonify({
         "application": "DevOps Dashboard API",
@@ -175,36 +563,73 @@ def home():
         "endpoints": {
             "/": "API information",
             "/api/health": "Health check",
+            "/livez": "Liveness probe",
+            "/readyz": "Readiness probe",
             "/api/data": "Sample data endpoint",
             "/api/stats": "System statistics",
+            "/api/stats/history": "Recent history of one series (?metric=&range=&step=)",
+            "/api/stream": "Live stats and health as Server-Sent Events",
+            "/api/latency": "Latency quantiles per route over a sliding window",
             "/api/error": "Error simulation (for testing)",
+            "/debug/slow": "Slowest recent requests with per-phase timings",
+            "/debug/profile": "Sampling profiler, collapsed stacks (?seconds=&hz=, needs DEBUG_TOKEN)",
             "/metrics": "Prometheus metrics"
         }
     }),200
 
 
-@app.route("/api/health")
-@track_metrics
+@bp.route("/api/health")
 def health():
-    mem = psutil.virtual_memory()
-    return jsonify({
-        "status": "healthy",
+    payload = health_payload()
+    return jsonify(payload),503 if payload["status"] == "unhealthy" else 200
+
+
+def health_payload(wait=True):
+    # wait=False for the stream: runs on the sampler thread, which a hung
+    # check must never hold up, so it publishes the last finished results
+    results = health_checks.run(wait=wait)
+    now = time.monotonic()
+    if not health_checks.ready(results):
+        status = "unhealthy"
+    elif any(r.status == FAIL for r in results.values()):
+        # A non-critical dependency is down; warnings alone stay healthy
+        status = "degraded"
+    else:
+        status = "healthy"
+    return {
+        "status": status,
         "uptime_seconds": round(time.time() - app_start_time, 2),
         "uptime_formatted": format_uptime(time.time() - app_start_time),
-        "checks": {
-            "cpu": "ok" if psutil.cpu_percent() < 90 else "warning",
-            "memory": "ok" if mem.percent < 90 else "warning",
-            "disk": "ok"
-        }
-    }),200
+        "checks": {name: r.status for name, r in results.items()},
+        "details": {name: r.as_dict(now) for name, r in results.items()}
+    }
 
 
-@app.route('/api/data')
-@track_metrics
+@bp.route("/livez")
+def livez():
+    # The process can serve a request; deliberately checks nothing else
+    return 'ok',200,{'Content-Type': 'text/plain'}
+
+
+@bp.route("/readyz")
+def readyz():
+    results = health_checks.run(READINESS_CHECKS)
+    now = time.monotonic()
+    ready = health_checks.ready(results)
+    return jsonify({
+        "status": "ready" if ready else "not ready",
+        "checks": {name: r.as_dict(now) for name, r in results.items()}
+    }),200 if ready else 503
+
+
+@bp.route('/api/data')
 def get_data():
-    # Simulate processing time
-    delay = random.uniform(0.1,0.5)
-    time.sleep(delay)
+    # Simulate processing time. Under SERVER_MODE=async time.sleep is gevent's
+    # and yields to other requests instead of blocking the worker
+    low, high = current_app.config['SIMULATED_LATENCY']
+    delay = random.uniform(low,high)
+    if delay > 0:
+        time.sleep(delay)
     
     return jsonify({
         "data": {
@@ -217,49 +642,141 @@ def get_data():
     }),200
 
 
-@app.route('/api/stats')
-@track_metrics
+@bp.route('/api/stats')
 def get_stats():
-    mem = psutil.virtual_memory()
-    try:
-        disk = psutil.disk_usage('/')
-    except:
-        disk = psutil.disk_usage('C:')
-    
-    return jsonify({
+    return jsonify(stats_payload(sampler.snapshot())), 200
+
+
+def stats_payload(snap):
+    return {
         "system": {
-            "platform": platform.system(),
-            "platform_release": platform.release(),
-            "hostname": platform.node(),
-            "processor": platform.processor()
+            "platform": host_info.platform,
+            "platform_release": host_info.platform_release,
+            "hostname": host_info.hostname,
+            "processor": host_info.processor
         },
         "cpu": {
-            "usage_percent": psutil.cpu_percent(),
-            "cores": psutil.cpu_count(),
-            "physical_cores": psutil.cpu_count(logical=False)
+            "usage_percent": snap.cpu_percent,
+            "cores": host_info.cpu_count,
+            "physical_cores": host_info.physical_cores
         },
         "memory": {
-            "total_gb": round(mem.total/(1024**3),2),
-            "used_gb": round(mem.used /(1024**3),2),
-            "available_gb": round(mem.available/(1024**3),2),
-            "percent": mem.percent
+            "total_gb": round(snap.memory_total/(1024**3),2),
+            "used_gb": round(snap.memory_used/(1024**3),2),
+            "available_gb": round(snap.memory_available/(1024**3),2),
+            "percent": snap.memory_percent
         },
         "disk": {
-            "total_gb": round(disk.total/(1024**3),2),
-            "used_gb": round(disk.used/(1024**3),2),
-            "free_gb": round(disk.free/(1024**3),2),
-            "percent": disk.percent
+            "total_gb": round(snap.disk_total/(1024**3),2),
+            "used_gb": round(snap.disk_used/(1024**3),2),
+            "free_gb": round(snap.disk_free/(1024**3),2),
+            "percent": snap.disk_percent
         },
         "application": {
             "uptime_seconds": round(time.time() - app_start_time, 2),
             "uptime_formatted": format_uptime(time.time() - app_start_time),
-            "process_id": os.getpid()
+            "process_id": os.getpid(),
+            "sampled_at": snap.timestamp
         }
-    }), 200
+    }
+
+
+@bp.route('/api/stats/history')
+def get_stats_history():
+    metric = request.args.get('metric', '')
+    if metric not in history.series:
+        return jsonify({
+            "error": f"unknown metric {metric!r}",
+            "available": list(history.series)
+        }),400
+    try:
+        range_seconds = parse_duration(request.args.get('range', '10m'))
+        step = parse_duration(request.args['step']) if 'step' in request.args else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}),400
+    return jsonify(history.query(metric, range_seconds, step)),200
+
+
+@bp.route('/api/latency')
+def get_latency():
+    now = time.perf_counter()
+    endpoints = []
+    for (method, route), sketch in sorted(latency_sketches.items()):
+        snap = sketch.snapshot(now)
+        if not snap.count:
+            continue
+        p50, p90, p99, p999 = snap.quantiles((0.5, 0.9, 0.99, 0.999))
+        endpoints.append({
+            "method": method,
+            "route": route,
+            "count": snap.count,
+            "p50_ms": round(p50 * 1000, 3),
+            "p90_ms": round(p90 * 1000, 3),
+            "p99_ms": round(p99 * 1000, 3),
+            "p999_ms": round(p999 * 1000, 3)
+        })
+    return jsonify({
+        "window_seconds": LATENCY_WINDOW,
+        "relative_accuracy": 0.01,
+        "endpoints": endpoints
+    }),200
+
 
+@bp.route('/debug/slow')
+def debug_slow():
+    if slow_requests is None:
+        return jsonify({"error": "Slow request log disabled (SLOW_REQUESTS=0)"}),404
+    return jsonify({
+        "window_seconds": slow_requests.window,
+        "capacity": slow_requests.capacity,
+        "threshold_ms": round(slow_requests.threshold * 1000, 3),
+        "requests": [entry.as_dict() for entry in slow_requests.entries()]
+    }),200
 
-@app.route('/api/error')
-@track_metrics
+
+# Bearer token for /debug/profile; the endpoint is off while it is unset
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+PROFILE_MAX_HZ = 1000
+profiler = SamplingProfiler()
+
+
+@bp.route('/debug/profile')
+def debug_profile():
+    if not DEBUG_TOKEN:
+        return jsonify({"error": "Profiling disabled (set DEBUG_TOKEN)"}),404
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode()):
+        return jsonify({"error": "Unauthorized"}),401,{'WWW-Authenticate': 'Bearer'}
+    try:
+        seconds = float(request.args.get('seconds', '10'))
+        hz = float(request.args.get('hz', '100'))
+    except ValueError:
+        return jsonify({"error": "seconds and hz must be numbers"}),400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or not 0 < hz <= PROFILE_MAX_HZ:
+        return jsonify({
+            "error": f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}] and hz in (0, {PROFILE_MAX_HZ}]"
+        }),400
+    try:
+        result = profiler.profile(seconds, hz)
+    except ProfilerBusy:
+        return jsonify({"error": "A profiling session is already running"}),409
+    return result.collapsed(),200,{
+        'Content-Type': 'text/plain; charset=utf-8',
+        'X-Profile-Samples': str(result.samples),
+        'X-Profile-Overhead-Percent': f"{result.overhead * 100:.3f}"
+    }
+
+
+@bp.route('/api/stream')
+def stream():
+    return Response(broadcaster.stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@bp.route('/api/error')
 def trigger_error():
     error_type = request.args.get('type','general')
     
@@ -274,10 +791,73 @@ def trigger_error():
         raise Exception("Sample general error")
 
 
-@app.route('/metrics')
+@bp.route('/metrics')
 def metrics():
     update_system_metrics()
-    return generate_latest(),200,{'Content-Type': CONTENT_TYPE_LATEST}
+    rendered = metrics_renderer.render(
+        request.headers.get('Accept', ''),
+        gzip_ok=request.accept_encodings['gzip'] > 0
+    )
+    headers = {
+        'Content-Type': rendered.content_type,
+        'ETag': f'"{rendered.etag}"',
+        'Vary': 'Accept, Accept-Encoding'
+    }
+    if request.if_none_match.contains(rendered.etag):
+        return '',304,headers
+    if rendered.content_encoding != 'identity':
+        headers['Content-Encoding'] = rendered.content_encoding
+    return rendered.body,200,headers
+
+
+# Optional busiest-processes collector; TOP_PROCESSES is how many to export
+# by CPU and by memory. Host-wide, so whichever worker serves the scrape
+# reports it.
+TOP_PROCESSES = int(os.environ.get('TOP_PROCESSES', '0'))
+top_processes = TopProcessCollector(
+    TOP_PROCESSES,
+    min_interval=float(os.environ.get('TOP_PROCESSES_INTERVAL', '5'))
+) if TOP_PROCESSES > 0 else None
+if top_processes is not None and not MULTIPROCESS:
+    REGISTRY.register(top_processes)
+
+# Optional per-interface and per-disk counters and rates from /proc (Linux
+# only): about 12 series per interface and 10 per disk on every scrape, so
+# off unless DEVICE_IO=1. Also host-wide; the *_INCLUDE/*_EXCLUDE regexes
+# must match the whole name.
+DEVICE_IO = os.environ.get('DEVICE_IO', '0') == '1' and DeviceIOCollector.available()
+device_io = DeviceIOCollector(
+    min_interval=float(os.environ.get('DEVICE_IO_INTERVAL', '1')),
+    interface_include=os.environ.get('NETWORK_INTERFACES_INCLUDE') or None,
+    interface_exclude=os.environ.get('NETWORK_INTERFACES_EXCLUDE', DEFAULT_INTERFACE_EXCLUDE) or None,
+    device_include=os.environ.get('DISK_DEVICES_INCLUDE') or None,
+    device_exclude=os.environ.get('DISK_DEVICES_EXCLUDE', DEFAULT_DEVICE_EXCLUDE) or None
+) if DEVICE_IO else None
+if device_io is not None and not MULTIPROCESS:
+    REGISTRY.register(device_io)
+
+
+def metrics_registry():
+    if not MULTIPROCESS:
+        return REGISTRY
+    # Built per scrape as the prometheus_client docs require; the collector
+    # merges the mmap files of every live and dead worker.
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    # Info values are not shared between workers, this one is identical in all
+    registry.register(app_info)
+    if top_processes is not None:
+        registry.register(top_processes)
+    if device_io is not None:
+        registry.register(device_io)
+    return registry
+
+
+# Seconds a rendered /metrics body is reused; 0 renders on every scrape
+METRICS_CACHE_TTL = float(os.environ.get('METRICS_CACHE_TTL', '1.0'))
+metrics_renderer = MetricsRenderer(metrics_registry, ttl=METRICS_CACHE_TTL)
+# A new sample changes the system gauges, so drop whatever was rendered before
+sampler.add_listener(lambda snap: metrics_renderer.invalidate())
 
 
 
@@ -298,6 +878,41 @@ def format_uptime(seconds):
 
 
 
+# ============================================
+# APP FACTORY
+# ============================================
+
+def parse_latency_range(text):
+    # "0.1,0.5" -> (0.1, 0.5); a single number is a fixed delay
+    try:
+        bounds = tuple(float(part) for part in text.split(','))
+    except ValueError:
+        bounds = ()
+    if len(bounds) == 1:
+        bounds *= 2
+    if len(bounds) != 2 or not 0 <= bounds[0] <= bounds[1]:
+        raise ValueError(f"SIMULATED_LATENCY must be 'seconds' or 'low,high' with 0 <= low <= high, got {text!r}")
+    return bounds
+
+
+# "low,high" seconds of simulated work in /api/data; 0 for tests and
+# benchmarks. create_app({'SIMULATED_LATENCY': (low, high)}) overrides it.
+SIMULATED_LATENCY = parse_latency_range(os.environ.get('SIMULATED_LATENCY', '0.1,0.5'))
+
+
+def create_app(config=None):
+    flask_app = Flask(__name__)
+    flask_app.config['SIMULATED_LATENCY'] = SIMULATED_LATENCY
+    # Times jsonify() for the serialization phase in /debug/slow
+    flask_app.json = TimedJSONProvider(flask_app)
+    if config:
+        flask_app.config.update(config)
+    flask_app.register_blueprint(bp)
+    return flask_app
+
+
+app = create_app()
+
 
 if __name__ == '__main__':
     print("=" * 50)
@@ -307,4 +922,5 @@ if __name__ == '__main__':
     print(f"🏥 Health:  http://localhost:5000/api/health")
     print(f"📈 Stats:   http://localhost:5000/api/stats")
     print("=" * 50)
+    sampler.start()
     app.run(host='0.0.0.0',port=5000,debug=False)
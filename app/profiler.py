@@ -0,0 +1,138 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# ============================================
+# SAMPLING PROFILER
+# ============================================
+# A statistical profiler for /debug/profile: a background thread wakes `hz`
+# times a second, reads every other thread's current frame with
+# sys._current_frames() and counts the stack as a tuple of code objects.
+# Nothing is hooked into the profiled threads, so the cost is paid only by
+# the sampler; it holds the GIL for the few microseconds a walk takes.
+#
+# Stacks are rendered once at the end in collapsed ("folded") format, one
+# "thread;outer;...;inner count" line per distinct stack, which
+# flamegraph.pl, speedscope and inferno read directly.
+#
+# Only OS threads are visible: under SERVER_MODE=async all greenlets share
+# one thread and only whichever one is running shows up, which is still
+# where the worker spends its CPU.
+
+MAX_DEPTH = 128
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileResult:
+    def __init__(self, stacks, thread_names, samples, duration, busy):
+        self.stacks = stacks                # (thread ident, codes root first) -> count
+        self.thread_names = thread_names
+        self.samples = samples
+        self.duration = duration
+        self.busy = busy                    # CPU seconds the sampler spent walking stacks
+
+    @property
+    def overhead(self):
+        # Fraction of one core taken by the sampler
+        return self.busy / self.duration if self.duration else 0.0
+
+    def collapsed(self):
+        labels = {}
+        lines = []
+        for (ident, codes), count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+            frames = [self.thread_names.get(ident, f"thread-{ident}").replace(';', ':').replace(' ', '_')]
+            for code in codes:
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = frame_label(code).replace(';', ':')
+                frames.append(label)
+            lines.append(f"{';'.join(frames)} {count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+class SamplingProfiler:
+    def __init__(self):
+        # One session at a time: two samplers would double the overhead and
+        # each would profile the other
+        self._session = threading.Lock()
+
+    @property
+    def running(self):
+        return self._session.locked()
+
+    def profile(self, seconds, hz=100, exclude=()):
+        if not self._session.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            return self._run(seconds, hz, set(exclude))
+        finally:
+            self._session.release()
+
+    def _run(self, seconds, hz, exclude):
+        start_thread, get_ident, sleep, patched = _os_threads()
+        stacks = Counter()
+        state = {'samples': 0, 'busy': 0.0, 'done': False}
+        if not patched:
+            exclude.add(get_ident())        # the caller just waits for us
+
+        def sample_loop():
+            exclude.add(get_ident())
+            try:
+                interval = 1.0 / hz
+                start = time.perf_counter()
+                deadline = start + seconds
+                tick = start
+                while True:
+                    tick += interval
+                    now = time.perf_counter()
+                    if tick > deadline:
+                        break
+                    if tick > now:
+                        sleep(tick - now)
+                    walk_start = time.thread_time()
+                    for ident, frame in sys._current_frames().items():
+                        if ident in exclude:
+                            continue
+                        codes = []
+                        while frame is not None and len(codes) < MAX_DEPTH:
+                            codes.append(frame.f_code)
+                            frame = frame.f_back
+                        codes.reverse()
+                        stacks[(ident, tuple(codes))] += 1
+                    state['samples'] += 1
+                    state['busy'] += time.thread_time() - walk_start
+            finally:
+                state['done'] = True
+
+        start = time.perf_counter()
+        start_thread(sample_loop, ())
+        # time.sleep is gevent's when patched, so the caller yields
+        while not state['done']:
+            time.sleep(min(0.05, seconds))
+        duration = time.perf_counter() - start
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        return ProfileResult(stacks, names, state['samples'], duration, state['busy'])
+
+
+def _os_threads():
+    # Under gevent's monkey patching threads are greenlets, which would
+    # sample nothing but the hub; the sampler needs a real OS thread
+    try:
+        from gevent import monkey
+    except ImportError:
+        monkey = None
+    if monkey is not None and monkey.is_module_patched('threading'):
+        return (monkey.get_original('_thread', 'start_new_thread'),
+                monkey.get_original('_thread', 'get_ident'),
+                monkey.get_original('time', 'sleep'), True)
+    import _thread
+    return _thread.start_new_thread, _thread.get_ident, time.sleep, False
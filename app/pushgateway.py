@@ -0,0 +1,216 @@
+import heapq
+import http.client
+import logging
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from prometheus_client import push_to_gateway
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# KEEP-ALIVE PUSH HANDLER
+# ============================================
+# push_to_gateway's default handler opens a new connection for every push.
+# This one keeps an HTTP/1.1 connection per thread and host and reuses it.
+
+class KeepAliveHandler:
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, url, method, timeout, headers, data):
+        return lambda: self._send(url, method, timeout, headers, data)
+
+    def close(self):
+        # Closes the calling thread's connections
+        for conn in getattr(self._local, 'connections', {}).values():
+            conn.close()
+        self._local.connections = {}
+
+    def _send(self, url, method, timeout, headers, data):
+        parts = urlsplit(url)
+        target = parts.path + (f"?{parts.query}" if parts.query else '')
+        key = (parts.scheme, parts.netloc)
+        connections = self._local.__dict__.setdefault('connections', {})
+
+        for attempt in range(2):
+            conn = connections.get(key)
+            reused = conn is not None
+            if conn is None:
+                cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+                conn = connections[key] = cls(parts.netloc, timeout=timeout)
+            try:
+                conn.request(method, target, body=data, headers=dict(headers))
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                del connections[key]
+                # The server may have closed an idle connection; that is
+                # worth one immediate retry on a fresh one
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+                del connections[key]
+            if response.status >= 400:
+                raise OSError(f"Pushgateway returned {response.status} {response.reason}: {body[:200]!r}")
+            return
+
+
+# ============================================
+# COALESCING PUSHER
+# ============================================
+# Producers call mark() whenever a group's registry changes; it never blocks
+# on the network. Worker threads push dirty groups, one grouping key at a
+# time, serializing the registry when the push starts. A group marked again
+# while it is queued is coalesced into the pending push, and one marked while
+# its push is in flight is queued again afterwards so the latest state always
+# lands. Failed pushes are retried with capped exponential backoff.
+
+class CoalescingPusher:
+    def __init__(self, gateway, job, workers=4, timeout=10, backoff=0.5, max_backoff=30,
+                 max_retries=10, handler=None):
+        self.gateway = gateway
+        self.job = job
+        self.workers = workers
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self.handler = handler or KeepAliveHandler()
+
+        self._cond = threading.Condition()
+        self._groups = {}       # key -> (grouping_key, registry)
+        self._ready = deque()
+        self._delayed = []      # heap of (not_before, key)
+        self._queued = set()    # keys in _ready or _delayed
+        self._inflight = set()
+        self._redirty = set()
+        self._attempts = {}
+        self._threads = []
+        self._stopping = False
+
+        self._counts = dict.fromkeys(('marked', 'coalesced', 'pushes', 'failures', 'retries', 'dropped'), 0)
+        self._latencies = []
+
+    def start(self):
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'pushgateway-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=10):
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        return flushed
+
+    def mark(self, grouping_key, registry):
+        key = tuple(sorted(grouping_key.items()))
+        with self._cond:
+            self._counts['marked'] += 1
+            self._groups[key] = (grouping_key, registry)
+            if key in self._queued or key in self._redirty:
+                self._counts['coalesced'] += 1
+            elif key in self._inflight:
+                self._redirty.add(key)
+            else:
+                self._queued.add(key)
+                self._ready.append(key)
+                self._cond.notify()
+
+    def flush(self, timeout=None):
+        # Waits until every group marked so far has been pushed or given up
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queued or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {**self._counts, 'pending': len(self._queued) + len(self._inflight)}
+
+    def take_latencies(self):
+        # Push latencies in seconds since the last call
+        with self._cond:
+            latencies, self._latencies = self._latencies, []
+        return latencies
+
+    def _next_key(self):
+        # Called with the lock held; returns None once stopping
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                self._ready.append(heapq.heappop(self._delayed)[1])
+            if self._ready:
+                key = self._ready.popleft()
+                self._queued.discard(key)
+                self._inflight.add(key)
+                return key
+            if self._stopping:
+                return None
+            self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+
+    def _work(self):
+        try:
+            while True:
+                with self._cond:
+                    key = self._next_key()
+                    if key is None:
+                        return
+                    grouping_key, registry = self._groups[key]
+                start = time.perf_counter()
+                try:
+                    push_to_gateway(self.gateway, job=self.job, registry=registry, grouping_key=grouping_key,
+                                    timeout=self.timeout, handler=self.handler)
+                    error = None
+                except Exception as e:
+                    error = e
+                self._finish(key, error, time.perf_counter() - start)
+        finally:
+            self.handler.close()
+
+    def _finish(self, key, error, latency):
+        with self._cond:
+            self._inflight.discard(key)
+            if error is None:
+                self._counts['pushes'] += 1
+                self._latencies.append(latency)
+                self._attempts.pop(key, None)
+                requeue = key in self._redirty
+            else:
+                self._counts['failures'] += 1
+                attempts = self._attempts[key] = self._attempts.get(key, 0) + 1
+                if attempts > self.max_retries:
+                    logger.warning("Giving up pushing %s after %d attempts: %s", dict(key), attempts, error)
+                    self._counts['dropped'] += 1
+                    del self._attempts[key]
+                    requeue = key in self._redirty
+                else:
+                    # The retry serializes the registry again, so it also
+                    # carries anything marked while this push was failing
+                    self._counts['retries'] += 1
+                    delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+                    heapq.heappush(self._delayed, (time.monotonic() + delay * random.uniform(0.5, 1), key))
+                    self._queued.add(key)
+                    requeue = False
+            self._redirty.discard(key)
+            if requeue:
+                self._queued.add(key)
+                self._ready.append(key)
+            self._cond.notify_all()
@@ -0,0 +1,49 @@
+# ============================================
+# ROLLING WINDOWS
+# ============================================
+# A sliding window kept as a ring of fixed-width time buckets, each holding a
+# few running sums (e.g. builds and successes). Adding an event touches one
+# bucket and the window totals; buckets that slide out of the window are
+# subtracted as time moves forward, so reading the totals never scans raw
+# events. Resolution is one bucket: the window covers between
+# `window - window/buckets` and `window` seconds of history.
+
+class RollingWindow:
+    def __init__(self, window, buckets=60, fields=1):
+        self.window = window
+        self.buckets = buckets
+        self.width = window / buckets
+        self._slots = [[0.0] * fields for _ in range(buckets)]
+        self._totals = [0.0] * fields
+        self._head = None
+
+    def add(self, now, *values):
+        epoch = self._advance(now)
+        if epoch <= self._head - self.buckets:
+            return  # older than the whole window
+        slot = self._slots[epoch % self.buckets]
+        for i, value in enumerate(values):
+            slot[i] += value
+            self._totals[i] += value
+
+    def totals(self, now):
+        self._advance(now)
+        return tuple(self._totals)
+
+    def _advance(self, now):
+        epoch = int(now // self.width)
+        head = self._head
+        if head is None or epoch - head >= self.buckets:
+            # First event, or everything has expired
+            for slot in self._slots:
+                slot[:] = [0.0] * len(slot)
+            self._totals = [0.0] * len(self._totals)
+            self._head = epoch
+        elif epoch > head:
+            for expired in range(head + 1, epoch + 1):
+                slot = self._slots[expired % self.buckets]
+                for i, value in enumerate(slot):
+                    self._totals[i] -= value
+                    slot[i] = 0.0
+            self._head = epoch
+        return epoch
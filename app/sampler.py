@@ -0,0 +1,332 @@
+import logging
+import os
+import platform
+import threading
+import time
+from typing import NamedTuple
+
+import psutil
+from prometheus_client import Counter, Gauge, Histogram
+
+from connections import count_connections
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# HOST FACTS - read once at startup
+# ============================================
+
+class HostInfo(NamedTuple):
+    platform: str
+    platform_release: str
+    hostname: str
+    processor: str
+    python_version: str
+    cpu_count: int
+    physical_cores: int
+    disk_path: str
+
+
+def _resolve_disk_path():
+    try:
+        psutil.disk_usage('/')
+        return '/'
+    except Exception:
+        return 'C:'
+
+
+def read_host_info():
+    return HostInfo(
+        platform=platform.system(),
+        platform_release=platform.release(),
+        hostname=platform.node(),
+        processor=platform.processor(),
+        python_version=platform.python_version(),
+        cpu_count=psutil.cpu_count() or 0,
+        physical_cores=psutil.cpu_count(logical=False) or 0,
+        disk_path=_resolve_disk_path(),
+    )
+
+
+# ============================================
+# SNAPSHOT - immutable view shared by all readers
+# ============================================
+
+class SystemSnapshot(NamedTuple):
+    timestamp: float
+    cpu_percent: float
+    cpu_freq_mhz: float
+    memory_total: int
+    memory_used: int
+    memory_available: int
+    memory_percent: float
+    disk_total: int
+    disk_used: int
+    disk_free: int
+    disk_percent: float
+    network_bytes_sent: int
+    network_bytes_recv: int
+    # ((proto, state), count) pairs, see connections.count_connections
+    network_connections: tuple
+    process_cpu_percent: float
+    process_memory_rss: int
+    process_threads: int
+
+
+# ============================================
+# COLLECTORS - independent readings with their own schedule
+# ============================================
+# Each collector fills some SystemSnapshot fields. A sample runs only the
+# collectors that are due and carries every other field over from the
+# previous snapshot, so slow-moving or expensive readings (disk totals, CPU
+# frequency, the connection table) are not repeated every SAMPLER_INTERVAL.
+#
+# A run that takes longer than the collector's budget is kept, but the
+# collector is then skipped for 1, 3, 7 ... (up to 15) of its intervals,
+# until a run fits the budget again. psutil calls cannot be interrupted, so
+# backing off is how one slow collector is stopped from stealing the
+# sampler thread from the others.
+
+MAX_BACKOFF = 16
+
+collector_duration_seconds = Histogram(
+    'collector_duration_seconds',
+    'Duration of system collector runs',
+    ['collector'],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+collector_last_success_timestamp_seconds = Gauge(
+    'collector_last_success_timestamp_seconds',
+    'Unix time of the last successful run of a system collector',
+    ['collector'],
+    multiprocess_mode='livemin'
+)
+
+collector_over_budget = Gauge(
+    'collector_over_budget',
+    'Whether the last run of a system collector exceeded its time budget (1) or not (0)',
+    ['collector'],
+    multiprocess_mode='livemax'
+)
+
+collector_skipped_total = Counter(
+    'collector_skipped_total',
+    'Scheduled collector runs skipped after the collector exceeded its budget',
+    ['collector']
+)
+
+collector_errors_total = Counter(
+    'collector_errors_total',
+    'System collector runs that raised',
+    ['collector']
+)
+
+
+def collect_cpu(sampler):
+    return {'cpu_percent': psutil.cpu_percent(interval=None)}
+
+
+def collect_cpu_freq(sampler):
+    # Unsupported or unreadable on some VMs and containers; report 0
+    try:
+        freq = psutil.cpu_freq()
+    except Exception:
+        freq = None
+    return {'cpu_freq_mhz': freq.current if freq else 0.0}
+
+
+def collect_memory(sampler):
+    mem = psutil.virtual_memory()
+    return {'memory_total': mem.total, 'memory_used': mem.used, 'memory_available': mem.available,
+            'memory_percent': mem.percent}
+
+
+def collect_disk(sampler):
+    disk = psutil.disk_usage(sampler.host.disk_path)
+    return {'disk_total': disk.total, 'disk_used': disk.used, 'disk_free': disk.free,
+            'disk_percent': disk.percent}
+
+
+def collect_network(sampler):
+    net = psutil.net_io_counters()
+    return {'network_bytes_sent': net.bytes_sent, 'network_bytes_recv': net.bytes_recv}
+
+
+def collect_connections(sampler):
+    return {'network_connections': tuple(sorted(count_connections().items()))}
+
+
+def collect_process(sampler):
+    process = sampler._process
+    with process.oneshot():
+        return {'process_cpu_percent': process.cpu_percent(interval=None),
+                'process_memory_rss': process.memory_info().rss,
+                'process_threads': process.num_threads()}
+
+
+# name, function, interval in seconds (0: every sample), budget in seconds.
+# cpu and network feed per-sample rates and history, so they run every time.
+# The cheap reads take well under 1 ms; counting connections takes a few ms
+# and grows with the socket table.
+DEFAULT_COLLECTORS = (
+    ('cpu', collect_cpu, 0.0, 0.025),
+    ('cpu_freq', collect_cpu_freq, 30.0, 0.025),
+    ('memory', collect_memory, 0.0, 0.025),
+    ('disk', collect_disk, 10.0, 0.025),
+    ('network', collect_network, 0.0, 0.025),
+    ('connections', collect_connections, 5.0, 0.25),
+    ('process', collect_process, 0.0, 0.025),
+)
+
+EMPTY_SNAPSHOT = SystemSnapshot(0.0, 0.0, 0.0, 0, 0, 0, 0.0, 0, 0, 0, 0.0, 0, 0, (), 0.0, 0, 0)
+
+
+def parse_collector_settings(text, convert=float):
+    # "disk=30,connections=10" -> {name: value}
+    settings = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, value = item.partition('=')
+        settings[name.strip()] = convert(value)
+    return settings
+
+
+class Collector:
+    def __init__(self, name, collect, interval=0.0, budget=0.025):
+        self.name = name
+        self.collect = collect
+        self.interval = interval
+        self.budget = budget
+        self.next_run = 0.0         # time.monotonic() when the collector is next due
+        self.strikes = 0            # consecutive runs over budget
+        self.skip_until = 0.0
+        self.last_duration = None
+        self.last_success = None
+
+
+# ============================================
+# SAMPLER - one background thread per process
+# ============================================
+
+class SystemSampler:
+    """Refreshes a SystemSnapshot every `interval` seconds on a daemon thread.
+
+    Readers call snapshot(), which never touches psutil once the sampler is
+    running. The thread is (re)started lazily so a forked worker gets its own.
+    `disabled`, `intervals` and `budgets` adjust DEFAULT_COLLECTORS by name.
+    """
+
+    def __init__(self, interval=1.0, host=None, disabled=(), intervals=None, budgets=None):
+        self.interval = interval
+        self.host = host or read_host_info()
+        self._snapshot = None
+        self._process = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.collectors = {}
+        intervals, budgets = intervals or {}, budgets or {}
+        names = {name for name, *_ in DEFAULT_COLLECTORS}
+        unknown = (set(disabled) | set(intervals) | set(budgets)) - names
+        if unknown:
+            raise ValueError(f"unknown collectors {sorted(unknown)}, expected some of {sorted(names)}")
+        for name, collect, default_interval, default_budget in DEFAULT_COLLECTORS:
+            if name not in disabled:
+                self.register(name, collect, intervals.get(name, default_interval), budgets.get(name, default_budget))
+
+    def register(self, name, collect, interval=0.0, budget=0.025):
+        # collect(sampler) returns a dict of SystemSnapshot fields
+        self.collectors[name] = Collector(name, collect, interval, budget)
+
+    def collects(self, name):
+        return name in self.collectors
+
+    def add_listener(self, fn):
+        # fn(snapshot) runs on the sampler thread after every refresh
+        self._listeners.append(fn)
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._process = psutil.Process()
+            # cpu_percent(None) measures since the previous call, so prime both
+            # counters once and let every later sample cover a full interval.
+            psutil.cpu_percent(interval=None)
+            self._process.cpu_percent(interval=None)
+            for collector in self.collectors.values():
+                collector.next_run = collector.skip_until = 0.0
+            self._snapshot = self.sample()
+            self._notify(self._snapshot)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        snap = self._snapshot
+        if snap is None or self._pid != os.getpid():
+            self.start()
+            snap = self._snapshot
+        return snap
+
+    def sample(self, now=None):
+        now = time.monotonic() if now is None else now
+        values = {}
+        for collector in self.collectors.values():
+            if now < collector.next_run:
+                continue
+            collector.next_run = now + collector.interval
+            if now < collector.skip_until:
+                collector_skipped_total.labels(collector.name).inc()
+                continue
+            values.update(self._collect(collector, now))
+        return (self._snapshot or EMPTY_SNAPSHOT)._replace(timestamp=time.time(), **values)
+
+    def _collect(self, collector, now):
+        name = collector.name
+        start = time.perf_counter()
+        try:
+            fields = collector.collect(self)
+        except Exception:
+            logger.exception("Collector %s failed, keeping its previous values", name)
+            collector_errors_total.labels(name).inc()
+            return {}
+        collector.last_duration = duration = time.perf_counter() - start
+        collector.last_success = time.time()
+        collector_duration_seconds.labels(name).observe(duration)
+        collector_last_success_timestamp_seconds.labels(name).set(collector.last_success)
+        if duration > collector.budget:
+            collector.strikes += 1
+            backoff = min(2 ** collector.strikes, MAX_BACKOFF) - 1
+            collector.skip_until = now + max(collector.interval, self.interval) * backoff
+            collector_over_budget.labels(name).set(1)
+            logger.warning("Collector %s took %.1f ms (budget %.1f ms), skipping %d runs",
+                           name, duration * 1000, collector.budget * 1000, backoff)
+        else:
+            collector.strikes = 0
+            collector_over_budget.labels(name).set(0)
+        return fields
+
+    def _run(self):
+        stop = self._stop
+        while not stop.wait(self.interval):
+            try:
+                self._snapshot = snap = self.sample()
+            except Exception:
+                logger.exception("System sampler failed, keeping previous snapshot")
+                continue
+            self._notify(snap)
+
+    def _notify(self, snap):
+        for listener in self._listeners:
+            try:
+                listener(snap)
+            except Exception:
+                logger.exception("Sampler listener %r failed", listener)
@@ -0,0 +1,135 @@
+import math
+import threading
+import time
+
+from cardinality import OVERFLOW_LABEL
+
+# ============================================
+# LATENCY SKETCHES
+# ============================================
+# DDSketch (Masson et al., VLDB 2019): a value v > 0 is counted in bin
+# ceil(log_gamma(v)) with gamma = (1 + a) / (1 - a), and every bin reports
+# the same representative value, so any quantile comes back within relative
+# error `a` of the true one. 1% accuracy covers 1 ms to 100 s in about 580
+# bins; beyond `max_bins` the lowest bins are folded together, so memory is
+# bounded and only the fastest requests lose precision. Sketches merge by
+# adding bin counts.
+#
+# A WindowedSketch is a ring of `slots` sketches, each covering
+# window/slots seconds; a read merges the live slots, so quantiles cover the
+# last `window` seconds to within one slot.
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class DDSketch:
+    def __init__(self, relative_accuracy=0.01, max_bins=2048, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._inv_log_gamma = 1 / math.log(self.gamma)
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        bins = self.bins
+        key = math.ceil(math.log(value) * self._inv_log_gamma)
+        bins[key] = bins.get(key, 0) + 1
+        if len(bins) > self.max_bins:
+            self._collapse()
+
+    def merge(self, other):
+        bins = self.bins
+        for key, count in other.bins.items():
+            bins[key] = bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.max_bins]
+        self.bins[keys[len(excess)]] += sum(self.bins.pop(key) for key in excess)
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        # One sorted pass for all of qs (ascending)
+        if not self.count:
+            return [None] * len(qs)
+        results = []
+        running = self.zero_count
+        items = iter(sorted(self.bins.items()))
+        for q in qs:
+            rank = q * (self.count - 1)
+            if rank < self.zero_count:
+                results.append(0.0)
+                continue
+            while running <= rank:
+                key, count = next(items)
+                running += count
+            results.append(2 * self.gamma ** key / (self.gamma + 1))
+        return results
+
+
+class WindowedSketch:
+    def __init__(self, window=60.0, slots=6, relative_accuracy=0.01, max_bins=2048):
+        self.window = window
+        self.slots = slots
+        self.width = window / slots
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._sketches = [DDSketch(relative_accuracy, max_bins) for _ in range(slots)]
+        self._epochs = [None] * slots
+        self._lock = threading.Lock()
+
+    def observe(self, value, now=None):
+        # `now` is any monotonic clock in seconds (the request hooks pass
+        # their perf_counter reading); snapshot() must use the same one
+        epoch = int((time.perf_counter() if now is None else now) // self.width)
+        i = epoch % self.slots
+        with self._lock:
+            if self._epochs[i] != epoch:
+                self._sketches[i] = DDSketch(self.relative_accuracy, self.max_bins)
+                self._epochs[i] = epoch
+            self._sketches[i].add(value)
+
+    def snapshot(self, now=None):
+        epoch = int((time.perf_counter() if now is None else now) // self.width)
+        merged = DDSketch(self.relative_accuracy, self.max_bins)
+        with self._lock:
+            for sketch, slot_epoch in zip(self._sketches, self._epochs):
+                if slot_epoch is not None and epoch - self.slots < slot_epoch <= epoch:
+                    merged.merge(sketch)
+        return merged
+
+
+class LatencySketches:
+    """One WindowedSketch per (method, route), at most `max_series` of them;
+    later combinations share a single (other, other) sketch."""
+
+    def __init__(self, max_series=500, **sketch_args):
+        self.max_series = max_series
+        self.sketch_args = sketch_args
+        self._sketches = {}
+        self._lock = threading.Lock()
+
+    def get(self, method, route):
+        key = (method, route)
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            with self._lock:
+                if key not in self._sketches and len(self._sketches) >= self.max_series:
+                    key = (OVERFLOW_LABEL, OVERFLOW_LABEL)
+                sketch = self._sketches.get(key)
+                if sketch is None:
+                    sketch = self._sketches[key] = WindowedSketch(**self.sketch_args)
+        return sketch
+
+    def items(self):
+        return list(self._sketches.items())
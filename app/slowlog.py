@@ -0,0 +1,124 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import NamedTuple
+
+from flask.json.provider import DefaultJSONProvider
+
+# ============================================
+# SLOW REQUEST LOG
+# ============================================
+# Keeps the slowest `capacity` requests of the last `window` seconds for
+# /debug/slow. The request hooks ask is_candidate() first: a read of two
+# floats without the lock, so a request faster than every entry already
+# kept costs one comparison. Only candidates pay for a request ID, an
+# exemplar and add(), which takes the lock and keeps a min-heap on total
+# duration so the fastest entry is the one replaced.
+#
+# Phases, in seconds, each ending where the next one starts:
+#
+#   admission      before_request, including any admission queue wait
+#   handler        the view function, without JSON serialization
+#   serialization  time spent in app.json.dumps (jsonify)
+#   write          response ready until the server closes it after sending
+#
+# A request is judged a candidate when its response is ready, so one that is
+# only slow to write is not captured. Streamed responses (/api/stream) are
+# logged without a write phase, which lasts as long as the client listens.
+
+_ids = itertools.count(1)
+
+# Seconds spent in dumps() by the current request; the hooks reset it
+serialization_seconds = ContextVar('serialization_seconds', default=0.0)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            serialization_seconds.set(serialization_seconds.get() + time.perf_counter() - start)
+
+
+def new_request_id():
+    return f"{os.getpid():x}-{next(_ids):x}"
+
+
+class SlowRequest(NamedTuple):
+    request_id: str
+    timestamp: float
+    method: str
+    route: str
+    path: str
+    status: int
+    response_bytes: int
+    duration: float
+    phases: dict
+
+    def as_dict(self):
+        return {
+            "request_id": self.request_id,
+            "timestamp": round(self.timestamp, 3),
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "status": self.status,
+            "response_bytes": self.response_bytes,
+            "duration_ms": round(self.duration * 1000, 3),
+            "phases_ms": {name: round(value * 1000, 3) for name, value in self.phases.items()}
+        }
+
+
+class SlowRequestLog:
+    def __init__(self, capacity=50, window=300.0, min_duration=0.0):
+        self.capacity = capacity
+        self.window = window
+        self.min_duration = min_duration
+        # Read without the lock; add() and _expire() keep them current
+        self.threshold = min_duration
+        self._next_expiry = math.inf
+        self._heap = []           # (duration, seq, recorded at, SlowRequest)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def is_candidate(self, duration, now):
+        # `now` is the perf_counter clock the request hooks use
+        return duration >= self.threshold or now >= self._next_expiry
+
+    def add(self, entry, now):
+        with self._lock:
+            self._expire(now)
+            item = (entry.duration, next(self._seq), now, entry)
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, item)
+            elif entry.duration > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+            else:
+                return False
+            self._update()
+            return True
+
+    def entries(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            self._expire(now)
+            items = sorted(self._heap, reverse=True)
+        return [item[3] for item in items]
+
+    def _expire(self, now):
+        if now < self._next_expiry:
+            return
+        cutoff = now - self.window
+        self._heap = [item for item in self._heap if item[2] > cutoff]
+        heapq.heapify(self._heap)
+        self._update()
+
+    def _update(self):
+        full = len(self._heap) >= self.capacity
+        self.threshold = max(self.min_duration, self._heap[0][0]) if full else self.min_duration
+        self._next_expiry = min(item[2] for item in self._heap) + self.window if self._heap else math.inf
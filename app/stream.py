@@ -0,0 +1,109 @@
+import threading
+from collections import deque
+
+from prometheus_client import Counter, Gauge
+
+# ============================================
+# SERVER-SENT EVENTS FAN-OUT
+# ============================================
+# One producer (the sampler listener in main.py) encodes each update once and
+# publish() hands the same bytes object to every subscriber. Each subscriber
+# has a bounded deque; a client that cannot keep up loses its oldest frames
+# rather than holding memory or slowing the producer. Idle connections get a
+# comment line every `heartbeat` seconds so proxies keep them open.
+#
+# Each subscriber holds a worker thread (or greenlet under SERVER_MODE=async)
+# for as long as it is connected; use async mode for large wallboards.
+
+stream_subscribers = Gauge(
+    'stream_subscribers',
+    'Clients connected to /api/stream',
+    multiprocess_mode='livesum'
+)
+
+stream_frames_published_total = Counter(
+    'stream_frames_published_total',
+    'Frames published to /api/stream subscribers'
+)
+
+stream_frames_dropped_total = Counter(
+    'stream_frames_dropped_total',
+    'Frames discarded because a subscriber queue was full'
+)
+
+HEARTBEAT = b": heartbeat\n\n"
+
+
+def encode_event(event, data, event_id=None):
+    # data is already serialized; SSE needs one "data:" line per line
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Subscription:
+    def __init__(self, queue_size):
+        self.frames = deque(maxlen=queue_size)
+
+
+class Broadcaster:
+    def __init__(self, queue_size=16, heartbeat=15.0, retry_ms=3000):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self.last_frame = None
+        self._subscribers = set()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def publish(self, frame):
+        dropped = 0
+        with self._cond:
+            self.last_frame = frame
+            for sub in self._subscribers:
+                if len(sub.frames) == self.queue_size:
+                    dropped += 1
+                sub.frames.append(frame)
+            self._cond.notify_all()
+        stream_frames_published_total.inc()
+        if dropped:
+            stream_frames_dropped_total.inc(dropped)
+
+    def subscribe(self):
+        sub = Subscription(self.queue_size)
+        with self._cond:
+            # New clients start from the latest update instead of waiting a tick
+            if self.last_frame is not None:
+                sub.frames.append(self.last_frame)
+            self._subscribers.add(sub)
+        stream_subscribers.inc()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._cond:
+            self._subscribers.discard(sub)
+            if not self._subscribers:
+                # Nothing is published while nobody listens, so this would
+                # only get staler
+                self.last_frame = None
+        stream_subscribers.dec()
+
+    def stream(self):
+        # Subscribes on the first next(), so a response that is never
+        # iterated leaves nothing behind
+        sub = self.subscribe()
+        try:
+            yield f"retry: {self.retry_ms}\n\n".encode()
+            while True:
+                with self._cond:
+                    if not sub.frames:
+                        self._cond.wait(self.heartbeat)
+                    frames = list(sub.frames)
+                    sub.frames.clear()
+                yield b"".join(frames) if frames else HEARTBEAT
+        finally:
+            self.unsubscribe(sub)
@@ -0,0 +1,187 @@
+import io
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from prometheus_client import CollectorRegistry
+
+from cicd_metrics import (DEFAULT_WORKFLOW, CICDMetrics, backfill, grouping_key, simulate_ci_run,
+                          workflow_names)
+from pushgateway import CoalescingPusher
+from rolling import RollingWindow
+
+
+def test_import_has_no_side_effects():
+    # The simulator loop used to run at import time and never return
+    result = subprocess.run([sys.executable, '-c', 'import cicd_metrics'], timeout=30,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0
+
+
+def test_backfill_writes_timestamped_openmetrics():
+    out = io.StringIO()
+    runs = backfill(out, days=2, step=300, build_interval=1800, end=1_700_000_000, seed=7)
+    lines = out.getvalue().splitlines()
+
+    assert runs > 0
+    assert lines[-1] == '# EOF'
+    assert '# TYPE ci_build counter' in lines
+    assert any(line.startswith('ci_build_total{job="cicd_metrics",status="success",workflow="CI Pipeline"}')
+               for line in lines)
+    assert not any('_created' in line for line in lines)
+
+
+def test_backfill_series_are_contiguous_and_ordered():
+    out = io.StringIO()
+    backfill(out, days=1, step=600, end=1_700_000_000, seed=3)
+
+    finished = set()
+    current, last_ts = None, 0
+    for line in out.getvalue().splitlines():
+        if line.startswith('#'):
+            continue
+        series, _, rest = line.rpartition('} ')
+        ts = float(rest.split()[1])
+        if series != current:
+            assert series not in finished
+            if current is not None:
+                finished.add(current)
+            current, last_ts = series, 0
+        assert ts > last_ts
+        last_ts = ts
+
+
+class FakePushgateway:
+    """ThreadingHTTPServer standing in for Pushgateway; records every PUT."""
+
+    def __init__(self, fail_first=0, delay=0.0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        gateway = self
+        self.pushes = []
+        self.failures_left = fail_first
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_PUT(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                time.sleep(delay)
+                if gateway.failures_left > 0:
+                    gateway.failures_left -= 1
+                    status = 503
+                else:
+                    gateway.pushes.append((self.path, self.client_address, body))
+                    status = 200
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_pusher_splits_groups_and_reuses_connections():
+    gateway = FakePushgateway()
+    pusher = CoalescingPusher(gateway.url, 'cicd_metrics', workers=1).start()
+    fleet = {name: CICDMetrics(CollectorRegistry()) for name in workflow_names(3)}
+    try:
+        for _ in range(5):
+            for name, m in fleet.items():
+                simulate_ci_run(m, workflow=name)
+                pusher.mark(grouping_key(name), m.registry)
+                assert pusher.flush(timeout=10)
+    finally:
+        pusher.stop()
+        gateway.close()
+
+    paths = {path for path, _, _ in gateway.pushes}
+    assert paths == {f'/metrics/job/cicd_metrics/workflow/pipeline-000{i}' for i in range(3)}
+    assert b'workflow="pipeline-0001"' in next(body for path, _, body in gateway.pushes if path.endswith('0001'))
+    # One worker, one keep-alive connection for all 15 pushes
+    assert len({client for _, client, _ in gateway.pushes}) == 1
+    assert pusher.stats()['pushes'] == 15
+
+
+def test_pusher_coalesces_marks_and_sends_latest_state():
+    gateway = FakePushgateway(delay=0.05)
+    pusher = CoalescingPusher(gateway.url, 'cicd_metrics', workers=2).start()
+    m = CICDMetrics(CollectorRegistry())
+    try:
+        for _ in range(200):
+            simulate_ci_run(m, workflow='pipeline-0000')
+            pusher.mark(grouping_key('pipeline-0000'), m.registry)
+        assert pusher.flush(timeout=10)
+    finally:
+        pusher.stop()
+        gateway.close()
+
+    stats = pusher.stats()
+    assert stats['pushes'] < 10
+    assert stats['coalesced'] + stats['pushes'] == 200
+    assert b'ci_pipeline_runs_total{pipeline="pipeline-0000"} 200.0' in gateway.pushes[-1][2]
+
+
+def test_pusher_retries_with_backoff():
+    gateway = FakePushgateway(fail_first=2)
+    pusher = CoalescingPusher(gateway.url, 'cicd_metrics', workers=1, backoff=0.01).start()
+    m = CICDMetrics(CollectorRegistry())
+    try:
+        simulate_ci_run(m)
+        pusher.mark(grouping_key(DEFAULT_WORKFLOW), m.registry)
+        assert pusher.flush(timeout=10)
+    finally:
+        pusher.stop()
+        gateway.close()
+
+    stats = pusher.stats()
+    assert (stats['failures'], stats['retries'], stats['pushes'], stats['dropped']) == (2, 2, 1, 0)
+    assert gateway.pushes[0][0] == '/metrics/job/cicd_metrics'
+
+
+def test_rolling_window_expires_old_buckets():
+    window = RollingWindow(3600, buckets=60, fields=2)
+    window.add(0, 1, 1)
+    window.add(1800, 1, 0)
+    assert window.totals(1800) == (2, 1)
+    assert window.totals(3600) == (1, 0)     # the first event slid out
+    window.add(3000, 1, 1)                   # late event, still inside the window
+    assert window.totals(3600) == (2, 1)
+    assert window.totals(100_000) == (0, 0)
+
+
+def test_windowed_success_rate_and_dora_metrics():
+    registry = CollectorRegistry()
+    m = CICDMetrics(registry)
+    for i, success in enumerate([True, True, False, True]):
+        m.record_build('api', success, now=i * 600)
+    # prod fails at 1000s and 1500s, recovers at 2200s
+    for t, success in [(0, True), (1000, False), (1500, False), (2200, True)]:
+        m.record_deployment('api', 'prod', success, now=t)
+
+    def value(name, **labels):
+        return registry.get_sample_value(name, {'workflow': 'api', **labels})
+
+    assert value('ci_build_success_ratio', window='1h') == 0.75
+    assert value('ci_build_success_rate') == 75.0
+    assert value('ci_deployment_frequency_per_day', environment='prod', window='24h') == 4.0
+    assert value('ci_deployment_frequency_per_day', environment='prod', window='1h') == 96.0
+    assert value('ci_change_failure_rate', environment='prod', window='7d') == 0.5
+    assert value('ci_mean_time_to_recovery_seconds', environment='prod', window='7d') == 1200.0
+
+    # Two hours later the 1h window is empty while 24h still remembers
+    m.record_build('api', True, now=9000)
+    assert value('ci_build_success_ratio', window='1h') == 1.0
+    assert value('ci_build_success_ratio', window='24h') == 0.8
+    assert value('ci_deployment_frequency_per_day', environment='prod', window='1h') == 0.0
+    assert math.isnan(value('ci_change_failure_rate', environment='prod', window='1h'))
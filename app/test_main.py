@@ -4,6 +4,7 @@ from main import app
 @pytest.fixture
 def client():
     app.config['TESTING'] = True
+    app.config['SIMULATED_LATENCY'] = (0.0, 0.0)
     with app.test_client() as client:
         yield client
 
@@ -34,6 +35,17 @@ def test_data_endpoint(client):
     assert len(data['data']['values']) == 10
 
 
+def test_simulated_latency_accepts_a_single_value():
+    from main import create_app, parse_latency_range
+    assert parse_latency_range('0') == (0.0, 0.0)
+    assert parse_latency_range('0.1,0.5') == (0.1, 0.5)
+    for bad in ('', 'fast', '0.5,0.1', '-1', '0,1,2'):
+        with pytest.raises(ValueError):
+            parse_latency_range(bad)
+    with create_app({'SIMULATED_LATENCY': parse_latency_range('0')}).test_client() as c:
+        assert c.get('/api/data').status_code == 200
+
+
 def test_stats_endpoint(client):
     response = client.get('/api/stats')
     assert response.status_code == 200
@@ -59,3 +71,660 @@ def test_metrics_contain_system_info(client):
     assert b'cpu_count_total' in response.data
     assert b'memory_total_bytes' in response.data
     assert b'disk_usage_percent' in response.data
+
+
+def test_sampler_snapshot_is_immutable():
+    from main import sampler
+    snap = sampler.snapshot()
+    with pytest.raises(AttributeError):
+        snap.cpu_percent = 0
+
+
+def test_endpoints_read_snapshot_without_psutil(client, monkeypatch):
+    import psutil
+    from main import sampler
+    sampler.snapshot()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("psutil called on the request path")
+
+    for name in ('cpu_percent', 'virtual_memory', 'disk_usage', 'net_io_counters', 'net_connections'):
+        monkeypatch.setattr(psutil, name, fail)
+
+    for path in ('/metrics', '/api/health', '/api/stats'):
+        assert client.get(path).status_code == 200
+
+
+def test_count_proc_net_groups_by_proto_and_state(tmp_path):
+    from connections import count_proc_net
+    header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+    row = "   {i}: 0100007F:1F90 00000000:0000 {st} 00000000:00000000 00:00000000 00000000     0        0 {i} 1\n"
+    (tmp_path / 'tcp').write_text(header + ''.join(row.format(i=i, st='0A' if i < 3 else '01') for i in range(10)))
+    (tmp_path / 'udp').write_text(header + ''.join(row.format(i=i, st='07') for i in range(4)))
+
+    counts = count_proc_net(str(tmp_path))
+    assert counts == {('tcp', 'LISTEN'): 3, ('tcp', 'ESTABLISHED'): 7, ('udp', 'NONE'): 4}
+
+
+def test_network_connections_labelled_by_state(client):
+    response = client.get('/metrics')
+    assert b'network_connections{proto=' in response.data
+
+
+def test_multiprocess_metrics_aggregate_across_workers(tmp_path):
+    import os
+    import subprocess
+    import sys
+    from prometheus_client import multiprocess
+
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    worker = "import os\nfrom main import app\napp.test_client().get('/')\nprint(os.getpid())"
+    pids = [
+        int(subprocess.run([sys.executable, '-c', worker], env=env, cwd=cwd,
+                           check=True, capture_output=True, text=True).stdout)
+        for _ in range(2)
+    ]
+    for pid in pids:
+        multiprocess.mark_process_dead(pid, str(tmp_path))
+    assert not [f for f in os.listdir(tmp_path) if f.startswith('gauge_live')]
+
+    scrape = "import sys\nfrom main import app\nsys.stdout.write(app.test_client().get('/metrics').get_data(as_text=True))"
+    output = subprocess.run([sys.executable, '-c', scrape], env=env, cwd=cwd,
+                            check=True, capture_output=True, text=True).stdout
+    assert 'http_requests_total{endpoint="/",method="GET",status="200"} 2.0' in output
+    # Only the scrape itself is in flight; the exited workers were dropped
+    assert 'active_requests 1.0' in output
+    assert 'app_info{' in output
+
+
+def test_request_metrics_use_route_template():
+    from flask import jsonify
+    from main import create_app, http_requests_total
+
+    def item(item_id):
+        return jsonify({"id": item_id}), 200
+
+    item_app = create_app({'TESTING': True})
+    item_app.add_url_rule('/api/items/<item_id>', view_func=item)
+    with item_app.test_client() as c:
+        for i in range(1000):
+            c.get(f'/api/items/{i}')
+
+    endpoints = {s.labels['endpoint'] for m in http_requests_total.collect() for s in m.samples}
+    assert '/api/items/<item_id>' in endpoints
+    assert not any(e.startswith('/api/items/') and e != '/api/items/<item_id>' for e in endpoints)
+
+
+def test_series_cap_keeps_memory_and_scrape_flat():
+    import tracemalloc
+    from prometheus_client import CollectorRegistry, Counter, generate_latest
+    from cardinality import LabelLimiter, metric_label_overflow_total
+
+    registry = CollectorRegistry()
+    paths = LabelLimiter(Counter('flat_paths_total', 'Paths', ['endpoint'], registry=registry),
+                         'flat_paths_total', max_series=100)
+    for i in range(10_000):
+        paths.labels(f'/scan/{i}').inc()
+    scrape = generate_latest(registry)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(10_000, 100_000):
+        paths.labels(f'/scan/{i}').inc()
+    growth = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+    tracemalloc.stop()
+
+    assert len(paths) == 100
+    assert generate_latest(registry).count(b'\n') == scrape.count(b'\n')
+    assert len(generate_latest(registry)) - len(scrape) < 16  # only the 'other' value gains digits
+    assert growth < 64 * 1024
+    assert 'flat_paths_total{endpoint="other"} 99900.0' in generate_latest(registry).decode()
+    assert metric_label_overflow_total.labels(metric='flat_paths_total')._value.get() == 99_900
+
+
+def test_metrics_gzip_and_etag(client):
+    import gzip
+
+    response = client.get('/metrics', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'http_requests_total' in gzip.decompress(response.data)
+
+    etag = response.headers['ETag']
+    cached = client.get('/metrics', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+
+def test_metrics_openmetrics_negotiation(client):
+    response = client.get('/metrics', headers={'Accept': 'application/openmetrics-text; version=1.0.0'})
+    assert response.headers['Content-Type'].startswith('application/openmetrics-text')
+    assert response.data.endswith(b'# EOF\n')
+
+
+def test_metrics_render_cache_invalidation():
+    from prometheus_client import CollectorRegistry, Counter
+    from exposition import MetricsRenderer, metrics_cache_hits_total
+
+    registry = CollectorRegistry()
+    hits = Counter('render_cache_probe_total', 'Probe', registry=registry)
+    renderer = MetricsRenderer(lambda: registry, ttl=60)
+    first = renderer.render()
+    hits_before = metrics_cache_hits_total._value.get()
+    hits.inc()
+    assert renderer.render() is first
+    assert metrics_cache_hits_total._value.get() == hits_before + 1
+
+    renderer.invalidate()
+    assert b'render_cache_probe_total 1.0' in renderer.render().body
+
+
+def test_hooks_cover_unmatched_routes_and_errors():
+    from prometheus_client import REGISTRY
+    from main import app
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    app.config['TESTING'] = True
+    c = app.test_client()
+    missing = sample('http_requests_total', method='GET', endpoint='<unmatched>', status='404')
+    errors = sample('http_errors_total', endpoint='/api/error', error_type='ZeroDivisionError')
+
+    assert c.get('/no/such/path').status_code == 404
+    with pytest.raises(ZeroDivisionError):
+        c.get('/api/error?type=divide')
+
+    assert sample('http_requests_total', method='GET', endpoint='<unmatched>', status='404') == missing + 1
+    assert sample('http_errors_total', endpoint='/api/error', error_type='ZeroDivisionError') == errors + 1
+    assert sample('http_requests_total', method='GET', endpoint='/api/error', status='500') >= 1
+
+
+def test_request_capture_writes_jsonl(tmp_path, monkeypatch):
+    import json
+    import main
+    from capture import RequestCapture
+
+    capture = RequestCapture(str(tmp_path / 'requests.jsonl'))
+    monkeypatch.setattr(main, 'request_capture', capture)
+    c = main.app.test_client()
+    c.get('/api/health?probe=1')
+    c.get('/no/such/path')
+    capture.flush()
+
+    records = [json.loads(line) for line in (tmp_path / 'requests.jsonl').read_text().splitlines()]
+    assert [(r['method'], r['path'], r['status']) for r in records] == [
+        ('GET', '/api/health', 200), ('GET', '/no/such/path', 404)]
+    assert records[0]['query'] == 'probe=1'
+    assert records[0]['latency_ms'] > 0
+
+
+def test_request_capture_rotates_by_size(tmp_path):
+    from capture import RequestCapture
+
+    path = tmp_path / 'requests.jsonl'
+    capture = RequestCapture(str(path), max_bytes=200, backups=2)
+    for i in range(50):
+        capture.record({"path": f"/api/data/{i}", "status": 200})
+        capture.flush()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'requests.jsonl', 'requests.jsonl.1', 'requests.jsonl.2']
+    assert all(p.stat().st_size < 400 for p in tmp_path.iterdir())
+
+
+def test_request_capture_disables_itself_when_the_file_cannot_be_opened(tmp_path, caplog):
+    from capture import RequestCapture
+
+    (tmp_path / 'not-a-dir').write_text('')
+    capture = RequestCapture(str(tmp_path / 'not-a-dir' / 'requests.jsonl'))
+    capture.record({"path": "/a", "status": 200})
+    capture.flush()
+    for _ in range(3):
+        capture.record({"path": "/b", "status": 200})
+        capture.flush()
+
+    assert capture.disabled
+    assert capture._queue.empty()
+    assert len([r for r in caplog.records if 'capture disabled' in r.getMessage()]) == 1
+
+
+def test_replay_merges_per_worker_captures_by_timestamp(tmp_path):
+    import importlib.util
+    import json
+    import os
+    spec = importlib.util.spec_from_file_location(
+        'load_test', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'load-test.py'))
+    load_test = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(load_test)
+
+    def write(name, records):
+        (tmp_path / name).write_text(''.join(json.dumps(
+            {"ts": ts, "method": "GET", "path": path, "query": "", "latency_ms": 1.0}) + "\n"
+            for ts, path in records))
+
+    write('requests-101.jsonl', [(100.0, '/a'), (102.0, '/c'), (104.0, '/e')])
+    write('requests-102.jsonl', [(101.0, '/b'), (103.0, '/d')])
+    captured = {}
+    arrivals = list(load_test.replay_arrivals(
+        [str(tmp_path / 'requests-101.jsonl'), str(tmp_path / 'requests-102.jsonl')], speed=2, captured=captured))
+    assert [(offset, target) for offset, _, target, _ in arrivals] == [
+        (0.0, '/a'), (0.5, '/b'), (1.0, '/c'), (1.5, '/d'), (2.0, '/e')]
+    assert set(captured) == {'/a', '/b', '/c', '/d', '/e'}
+
+
+def test_history_ring_wraps_and_rolls_up():
+    from history import History
+    history = History(('cpu',), raw_seconds=10, interval=1.0, rollup_seconds=60, rollup_span=300)
+    for t in range(600):
+        history.add(1_000_020 + t, {'cpu': t % 60})
+
+    raw = history.query('cpu', 5, now=1_000_619)
+    assert raw['resolution_seconds'] == 1.0
+    assert [p[1] for p in raw['points']] == [54, 55, 56, 57, 58, 59]
+
+    rolled = history.query('cpu', 3600)
+    # Only the last 5 closed minutes survive the 300 s rollup span
+    assert len(rolled['points']) == 5
+    assert rolled['points'][-1][1:] == [29.5, 0, 59]
+    assert history.nbytes == 8 * (10 * 2 + 5 * 4)
+
+
+def test_stats_history_endpoint(client, monkeypatch):
+    import time
+    import main
+    from history import History
+    history = History(main.HISTORY_SERIES)
+    for t in range(5):
+        history.add(time.time() - 5 + t, dict.fromkeys(main.HISTORY_SERIES, float(t)))
+    monkeypatch.setattr(main, 'history', history)
+    response = client.get('/api/stats/history?metric=cpu_percent&range=1m')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['columns'] == ['timestamp', 'mean', 'min', 'max']
+    assert [p[1] for p in data['points']] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+    assert client.get('/api/stats/history?metric=nope').status_code == 400
+    assert client.get('/api/stats/history?metric=cpu_percent&range=-1').status_code == 400
+
+
+def test_stream_fans_out_one_encoded_frame():
+    from stream import Broadcaster, stream_frames_dropped_total
+    broadcaster = Broadcaster(queue_size=4, heartbeat=0.01)
+    streams = [broadcaster.stream() for _ in range(1000)]
+    for s in streams:
+        assert next(s).startswith(b'retry:')
+    assert len(broadcaster) == 1000
+
+    frame = b'event: stats\ndata: {}\n\n'
+    broadcaster.publish(frame)
+    received = [next(s) for s in streams]
+    assert all(r is frame for r in received)
+    # Idle subscribers get a heartbeat instead of blocking forever
+    assert next(streams[0]) == b': heartbeat\n\n'
+
+    # A subscriber that stops reading keeps only the newest queue_size frames
+    dropped = stream_frames_dropped_total._value.get()
+    for i in range(10):
+        broadcaster.publish(f'data: {i}\n\n'.encode())
+    assert stream_frames_dropped_total._value.get() - dropped == 6 * 1000
+    assert next(streams[1]) == b'data: 6\n\ndata: 7\n\ndata: 8\n\ndata: 9\n\n'
+
+    for s in streams:
+        s.close()
+    assert len(broadcaster) == 0
+
+
+def test_stream_endpoint_sends_stats_events(client):
+    import main
+    response = client.get('/api/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+    main.publish_stream(main.sampler.snapshot())
+    frame = next(chunks).decode()
+    assert frame.startswith('event: stats\nid: ')
+    assert '"cpu":' in frame and 'event: health\n' in frame
+    response.close()
+    assert len(main.broadcaster) == 0
+
+
+def test_top_processes_uses_cpu_time_deltas():
+    import subprocess
+    import sys
+    import time
+    from processes import TopProcessCollector
+    busy = subprocess.Popen([sys.executable, '-c', 'while True: pass'])
+    try:
+        collector = TopProcessCollector(top_n=3, min_interval=0)
+        collector.refresh()
+        assert collector.top_cpu == []          # no delta on the first pass
+        time.sleep(0.5)
+        collector.refresh()
+        assert busy.pid in [p.pid for p in collector.top_cpu]
+        assert collector.process_count > 1
+    finally:
+        busy.kill()
+        busy.wait()
+
+    families = {f.name: f for f in collector.collect()}
+    assert len(families['top_process_cpu_percent'].samples) <= 3
+    assert len(families['top_process_memory_bytes'].samples) == 3
+    assert str(busy.pid) not in [s.labels['pid'] for s in families['top_process_cpu_percent'].samples]
+
+
+def test_scan_proc_parses_stat_and_detects_pid_reuse(tmp_path):
+    import os
+    from processes import TopProcessCollector, scan_proc
+
+    def write_stat(pid, name, start, utime, rss_pages):
+        (tmp_path / str(pid)).mkdir(exist_ok=True)
+        fields = ['S'] + ['0'] * 10 + [str(utime), '0'] + ['0'] * 6 + [str(start), '0', str(rss_pages)]
+        (tmp_path / str(pid) / 'stat').write_text(f"{pid} ({name}) {' '.join(fields)}\n")
+
+    ticks = os.sysconf('SC_CLK_TCK')
+    write_stat(10, 'web (worker) 1', 500, 0, 3)
+    (tmp_path / 'self').mkdir()
+    rows = list(scan_proc(str(tmp_path)))
+    assert rows == [(10, 'web (worker) 1', 500, 0.0, 3 * os.sysconf('SC_PAGE_SIZE'))]
+
+    collector = TopProcessCollector(top_n=5, min_interval=0, scan=lambda: scan_proc(str(tmp_path)))
+    collector.refresh(now=0)
+    write_stat(10, 'web (worker) 1', 500, ticks, 3)      # 1 cpu second in 2 s
+    collector.refresh(now=2)
+    assert collector.top_cpu[0].cpu_percent == 50.0
+    write_stat(10, 'reused', 900, 100 * ticks, 3)        # same PID, new process
+    collector.refresh(now=4)
+    assert collector.top_cpu[0].cpu_percent == 0.0
+
+
+def test_admission_queue_deadline_and_fifo_handoff():
+    import threading
+    from admission import AdmissionController, CRITICAL, LOW
+    admission = AdmissionController(1, queue_size=1, queue_timeout=0.05)
+    assert admission.acquire() is None
+    assert admission.acquire(CRITICAL) is None      # never limited
+    assert admission.acquire(LOW) == 'limit'        # low priority never queues
+    assert admission.acquire() == 'deadline'        # queued, nobody released
+
+    results = []
+    admission.queue_timeout = 5
+    waiter = threading.Thread(target=lambda: results.append(admission.acquire()))
+    waiter.start()
+    while not admission._waiters:
+        pass
+    assert admission.acquire() == 'queue_full'
+    admission.release()                             # slot goes to the waiter
+    waiter.join()
+    assert results == [None] and admission.in_flight == 1
+    admission.release()
+    assert admission.in_flight == 0
+
+
+def test_admission_adaptive_limit_follows_latency():
+    from admission import AdmissionController
+    admission = AdmissionController(20, adaptive=True, window=0, max_limit=100)
+    for latency in [0.01] * 50:
+        admission.acquire()
+        admission.release(latency)
+    grown = admission.limit
+    assert grown > 20
+    # Latency jumps 20x: the limit backs off while the baseline catches up
+    for latency in [0.2] * 80:
+        admission.acquire()
+        admission.release(latency)
+    assert admission.limit < grown * 0.75
+
+
+def test_overload_sheds_normal_routes_but_not_health(client, monkeypatch):
+    import main
+    from admission import AdmissionController
+    admission = AdmissionController(1, queue_timeout=0.01)
+    monkeypatch.setattr(main, 'admission', admission)
+    admission.acquire()                              # the only slot is busy
+
+    response = client.get('/api/stats')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == main.ADMISSION_RETRY_AFTER
+    assert main.http_requests_shed_total.labels('/api/stats', 'deadline')._value.get() >= 1
+    assert client.get('/api/health').status_code == 200
+    assert client.get('/metrics').status_code == 200
+
+    admission.release()
+    assert client.get('/api/stats').status_code == 200
+    assert admission.in_flight == 0
+
+
+def test_ddsketch_quantiles_within_relative_error():
+    import random
+    from sketch import DDSketch
+    rng = random.Random(5)
+    values = [rng.lognormvariate(-1.5, 0.8) for _ in range(20000)]
+    sketch = DDSketch(relative_accuracy=0.01)
+    half = DDSketch(relative_accuracy=0.01)
+    for i, v in enumerate(values):
+        (sketch if i % 2 else half).add(v)
+    sketch.merge(half)
+
+    exact = sorted(values)
+    for q, estimate in zip((0.5, 0.9, 0.99, 0.999), sketch.quantiles()):
+        true = exact[int(q * (len(exact) - 1))]
+        assert abs(estimate - true) / true <= 0.01
+
+
+def test_windowed_sketch_forgets_old_slots():
+    from sketch import WindowedSketch
+    sketch = WindowedSketch(window=60, slots=6)
+    for _ in range(100):
+        sketch.observe(1.0, now=5)
+    sketch.observe(0.2, now=50)
+    assert sketch.snapshot(now=55).count == 101
+    snap = sketch.snapshot(now=65)             # the 0-10 s slot has expired
+    assert snap.count == 1
+    assert abs(snap.quantiles((0.5,))[0] - 0.2) <= 0.002
+
+
+def test_latency_endpoint_reports_route_quantiles(client):
+    for _ in range(3):
+        client.get('/api/stats')
+    data = client.get('/api/latency').get_json()
+    stats = next(e for e in data['endpoints'] if e['route'] == '/api/stats' and e['method'] == 'GET')
+    assert stats['count'] >= 3
+    assert 0 < stats['p50_ms'] <= stats['p99_ms'] <= stats['p999_ms']
+
+
+def test_slow_request_log_keeps_slowest_in_window():
+    from slowlog import SlowRequest, SlowRequestLog
+    log = SlowRequestLog(capacity=3, window=60)
+
+    def entry(duration):
+        return SlowRequest(str(duration), 0.0, 'GET', '/', '/', 200, 0, duration, {})
+
+    for i, duration in enumerate([0.1, 0.5, 0.2, 0.05, 0.3]):
+        if log.is_candidate(duration, i):
+            log.add(entry(duration), i)
+    assert [e.duration for e in log.entries(now=10)] == [0.5, 0.3, 0.2]
+    assert log.threshold == 0.2
+    assert not log.is_candidate(0.15, 10)
+    # Once the oldest entries age out, faster requests qualify again
+    assert log.is_candidate(0.15, 61)
+    assert [e.duration for e in log.entries(now=63)] == [0.3]
+
+
+def test_debug_slow_reports_phases_and_exemplar(client, monkeypatch):
+    import main
+    from slowlog import SlowRequestLog
+    monkeypatch.setattr(main, 'slow_requests', SlowRequestLog(capacity=5))
+    response = client.get('/api/stats', headers={'X-Request-ID': 'trace-abc'})
+    assert response.headers['X-Request-ID'] == 'trace-abc'
+    response.close()
+
+    data = client.get('/debug/slow').get_json()
+    entry = next(e for e in data['requests'] if e['request_id'] == 'trace-abc')
+    assert entry['route'] == '/api/stats' and entry['status'] == 200
+    assert entry['response_bytes'] == len(response.data)
+    assert set(entry['phases_ms']) == {'admission', 'handler', 'serialization', 'write'}
+    assert entry['phases_ms']['serialization'] > 0
+    assert abs(sum(entry['phases_ms'].values()) - entry['duration_ms']) < 0.01
+
+    main.metrics_renderer.invalidate()     # a body cached by an earlier test predates the exemplar
+    metrics = client.get('/metrics', headers={'Accept': 'application/openmetrics-text'}).data
+    assert b'request_id="trace-abc"' in metrics
+
+
+def test_debug_profile_requires_token(client, monkeypatch):
+    import main
+    monkeypatch.setattr(main, 'DEBUG_TOKEN', '')
+    assert client.get('/debug/profile?seconds=0.1').status_code == 404
+    monkeypatch.setattr(main, 'DEBUG_TOKEN', 's3cret')
+    assert client.get('/debug/profile?seconds=0.1').status_code == 401
+    headers = {'Authorization': 'Bearer s3cret'}
+    assert client.get('/debug/profile?seconds=600', headers=headers).status_code == 400
+    # Only one session at a time
+    with main.profiler._session:
+        assert client.get('/debug/profile?seconds=0.1', headers=headers).status_code == 409
+
+
+def test_debug_profile_returns_collapsed_stacks(client, monkeypatch):
+    import threading
+    import main
+    monkeypatch.setattr(main, 'DEBUG_TOKEN', 's3cret')
+    stop = threading.Event()
+
+    def spin_for_profiler():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=spin_for_profiler, name='busy worker')
+    worker.start()
+    try:
+        response = client.get('/debug/profile?seconds=0.3&hz=200', headers={'Authorization': 'Bearer s3cret'})
+    finally:
+        stop.set()
+        worker.join()
+    assert response.status_code == 200
+    assert int(response.headers['X-Profile-Samples']) >= 20
+    lines = response.data.decode().splitlines()
+    busy = [line for line in lines if line.startswith('busy_worker;')]
+    assert busy and all('spin_for_profiler (test_main.py:' in line for line in busy)
+    stack, count = busy[0].rsplit(' ', 1)
+    assert int(count) > 0
+
+
+def test_health_checker_caches_results_and_times_out():
+    import threading
+    import time
+    from health import FAIL, OK, HealthChecker, health_check_timeouts_total
+    calls = []
+    release = threading.Event()
+    checker = HealthChecker(workers=2)
+    checker.register('fast', lambda: calls.append(1) or (OK, 'fine'), ttl=60)
+    checker.register('hung', lambda: release.wait(5) and (OK, 'late'), timeout=0.05, critical=False)
+    try:
+        results = checker.run()
+        assert results['fast'].status == OK
+        assert results['hung'].status == FAIL and 'timed out' in results['hung'].detail
+        # Within its TTL the fast check is not run again; the hung one still fails fast
+        start = time.monotonic()
+        results = checker.run()
+        assert time.monotonic() - start < 0.5
+        assert len(calls) == 1
+        assert checker.ready(results)
+        assert health_check_timeouts_total.labels('hung')._value.get() == 1
+
+        # The stream's sampler-thread call never waits for a check
+        checker.register('slow', lambda: release.wait(5) and (OK, 'late'), timeout=0.05)
+        start = time.monotonic()
+        assert 'slow' not in checker.run(wait=False)
+        time.sleep(0.1)
+        assert checker.run(wait=False)['slow'].status == FAIL
+        assert time.monotonic() - start < 0.5
+    finally:
+        release.set()
+
+
+def test_livez_and_readyz(client, monkeypatch):
+    import main
+    from health import FAIL, HealthChecker
+    response = client.get('/livez')
+    assert response.status_code == 200 and response.data == b'ok'
+    assert client.get('/readyz').status_code == 200
+
+    checker = HealthChecker(workers=1)
+    checker.register('disk', lambda: (FAIL, '1.0% free on /'))
+    monkeypatch.setattr(main, 'health_checks', checker)
+    monkeypatch.setattr(main, 'READINESS_CHECKS', ['disk'])
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.get_json()['checks']['disk']['detail'] == '1.0% free on /'
+    assert client.get('/api/health').get_json()['status'] == 'unhealthy'
+    assert client.get('/livez').status_code == 200
+
+
+def test_sampler_schedules_collectors_by_interval_and_budget():
+    import time
+    from main import host_info
+    from sampler import DEFAULT_COLLECTORS, SystemSampler, collector_skipped_total
+    sampler = SystemSampler(host=host_info, disabled={name for name, *_ in DEFAULT_COLLECTORS})
+    runs = {'fast': 0, 'slow': 0, 'hourly': 0}
+
+    def collect(name, seconds=0.0, **fields):
+        def fn(_):
+            runs[name] += 1
+            time.sleep(seconds)
+            return fields
+        return fn
+
+    sampler.register('fast', collect('fast', cpu_percent=12.5))
+    sampler.register('slow', collect('slow', 0.02, memory_percent=40.0), budget=0.005)
+    sampler.register('hourly', collect('hourly', disk_percent=70.0), interval=3600)
+    skipped = collector_skipped_total.labels('slow')._value.get()
+    for tick in range(4):
+        sampler._snapshot = snap = sampler.sample(now=1000.0 + tick)
+    assert runs == {'fast': 4, 'slow': 2, 'hourly': 1}
+    # Over budget: the value is kept, the next run is skipped and counted
+    assert collector_skipped_total.labels('slow')._value.get() - skipped == 2
+    assert (snap.cpu_percent, snap.memory_percent, snap.disk_percent) == (12.5, 40.0, 70.0)
+    assert sampler.collects('fast') and not sampler.collects('cpu')
+    with pytest.raises(ValueError):
+        SystemSampler(host=host_info, disabled={'cpus'})
+
+
+def test_device_io_rates_filters_and_counter_resets(tmp_path):
+    from devices import DeviceIOCollector
+    (tmp_path / 'net').mkdir()
+
+    def write(rx, tx, reads, sectors, io_ms):
+        (tmp_path / 'net' / 'dev').write_text(
+            "Inter-|   Receive |  Transmit\n face |bytes packets|bytes packets\n"
+            f"    lo: 99 1 0 0 0 0 0 0 99 1 0 0 0 0 0 0\n"
+            f"  eth0: {rx} 10 0 0 0 0 0 0 {tx} 20 0 0 0 0 0 0\n"
+            f"veth1a2b: 5 1 0 0 0 0 0 0 5 1 0 0 0 0 0 0\n")
+        (tmp_path / 'diskstats').write_text(
+            f"   8       0 sda {reads} 0 {sectors} 0 0 0 0 0 0 {io_ms} 0\n"
+            f"   8       1 sda1 {reads} 0 {sectors} 0 0 0 0 0 0 {io_ms} 0\n")
+
+    collector = DeviceIOCollector(min_interval=0, proc_root=str(tmp_path))
+    write(1000, 0, 10, 0, 0)
+    collector.refresh(now=0)
+    write(3000, 0, 30, 8, 3000)
+    collector.refresh(now=2)
+    # collect() would run another pass at the real clock
+    families = {f.name: f for f in collector._families([(t.names, t.values, t.rates) for t in collector.tables])}
+    samples = {(f, s.labels.get('interface') or s.labels.get('device')): s.value
+               for f in families for s in families[f].samples}
+    assert samples[('network_interface_receive_bytes_per_second', 'eth0')] == 1000.0
+    assert samples[('network_interface_receive_bytes', 'eth0')] == 3000
+    assert samples[('disk_reads_per_second', 'sda')] == 10.0
+    assert samples[('disk_read_bytes_per_second', 'sda')] == 2048.0
+    assert samples[('disk_io_utilization_ratio', 'sda')] == 1.0        # clamped
+    assert not {name for _, name in samples} & {'lo', 'veth1a2b', 'sda1'}
+
+    write(50, 0, 40, 8, 3000)                       # eth0 re-created: no bogus rate
+    collector.refresh(now=4)
+    assert 'eth0' not in collector.tables[0].rates and 'sda' in collector.tables[1].rates
+
+    collector = DeviceIOCollector(min_interval=0, proc_root=str(tmp_path), interface_include='veth.*',
+                                  interface_exclude=None)
+    collector.refresh()
+    assert collector.tables[0].names == ['veth1a2b']
@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+
+MONITORING = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'monitoring')
+sys.path.insert(0, MONITORING)
+
+import recording_rules as rr  # noqa: E402
+
+
+def test_normalize_and_rule_names():
+    assert rr.normalize('sum  by(endpoint)(x{b="1",a="2"})') == 'sum by (endpoint) (x{a="2",b="1"})'
+    assert rr.rule_name('sum(rate(http_requests_total[1m]))') == ':http_requests:sum_rate1m'
+    assert rr.rule_name('sum by (endpoint) (http_requests_total)') == 'endpoint:http_requests:sum'
+    assert (rr.rule_name('histogram_quantile(0.95, sum by (le, endpoint) (rate(h_bucket[5m])))')
+            == 'endpoint:h:p95_sum_rate5m')
+    assert not rr.recordable('up{job="app"}')
+    # Per-series functions keep every series; a rule would save nothing
+    assert not rr.recordable('rate(http_requests_total[1m])')
+    assert not rr.recordable('histogram_quantile(0.95, rate(h_bucket[5m]))')
+    assert not rr.recordable('rate(x[$__rate_interval])')
+
+
+def test_generate_rewrite_and_check(tmp_path):
+    dashboards = tmp_path / 'dashboards'
+    dashboards.mkdir()
+    (tmp_path / 'prometheus.yml').write_text('global:\n  scrape_interval: 15s\n\nrule_files:\n\nscrape_configs: []\n')
+    panel = lambda title, expr: {"title": title, "targets": [{"expr": expr, "refId": "A"}]}  # noqa: E731
+    for name, exprs in (('a.json', ['sum(rate(x_total[1m]))', 'up', 'rate(x_total[1m])']),
+                        ('b.json', ['sum( rate(x_total[1m]) )'])):
+        (dashboards / name).write_text(json.dumps({"panels": [panel(f"{name} {i}", e) for i, e in enumerate(exprs)]}))
+
+    config = str(tmp_path / 'prometheus.yml')
+    rules_path = str(tmp_path / rr.RULES_FILE)
+    paths = sorted(str(p) for p in dashboards.glob('*.json'))
+    missing, raw = rr.check(paths, {})
+    assert len(missing) == 2
+    assert raw == ['a.json: a.json 2: rate(x_total[1m])']
+
+    rules, users, mapping, problems = rr.plan(paths, {})
+    assert rules == {':x:sum_rate1m': 'sum(rate(x_total[1m]))'}
+    assert len(users[':x:sum_rate1m']) == 2
+    rr.write_rules(rules_path, rules, users)
+    assert rr.wire_rule_files(config, rr.RULES_FILE)
+    assert not rr.wire_rule_files(config, rr.RULES_FILE)
+    for path in paths:
+        rr.rewrite_dashboard(path, mapping)
+
+    existing = rr.read_rules(rules_path)
+    assert existing == rules
+    assert rr.check(paths, existing) == ([], raw)
+    # A re-run keeps the rules of the rewritten queries
+    assert rr.plan(paths, dict(existing))[0] == rules
+    assert 'recording_rules.yml' in open(config).read()
+
+
+def test_renamed_and_per_series_rules_are_undone(tmp_path):
+    old = {':x_total:sum_rate1m': 'sum(rate(x_total[1m]))', 'instance:x_total:rate1m': 'rate(x_total[1m])'}
+    path = tmp_path / 'old.json'
+    path.write_text(json.dumps({"panels": [{"title": name, "targets": [{"expr": name}]} for name in old]}))
+    rules, users, mapping, problems = rr.plan([str(path)], old)
+    assert rules == {':x:sum_rate1m': 'sum(rate(x_total[1m]))'}
+    assert mapping == {':x_total:sum_rate1m': ':x:sum_rate1m', 'instance:x_total:rate1m': 'rate(x_total[1m])'}
+
+
+def test_bundled_dashboards_are_recorded():
+    paths = sorted(rr.glob.glob(rr.DASHBOARDS))
+    existing = rr.read_rules(os.path.join(MONITORING, rr.RULES_FILE))
+    missing, raw = rr.check(paths, existing)
+    assert missing == []
+    # Non-aggregating panels are listed, not silently passed
+    assert any('histogram_quantile' in line for line in raw)
@@ -0,0 +1,92 @@
+"""Compare /proc/net parsing with psutil.net_connections() at 1k/10k/100k sockets.
+
+Real sockets are opened as listeners spread over 127.0.0.0/8 (one port space
+per address) up to the file-descriptor limit. Sizes the host cannot reach are
+measured against synthetic /proc/net files, where the psutil path has no
+equivalent and is reported as skipped.
+
+    python benchmarks/bench_connections.py [--sizes 1000,10000,100000]
+"""
+import argparse
+import os
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from connections import count_proc_net, count_psutil  # noqa: E402
+
+HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+ROW = "{i:4d}: 0100007F:{port:04X} 0200007F:01BB {st} 00000000:00000000 00:00000000 00000000  1000        0 {inode} 1 0000000000000000 20 4 30 10 -1\n"
+STATES = ('01', '01', '01', '06', '0A', '08')
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs)
+
+
+def open_listeners(count):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+    sockets = []
+    try:
+        for i in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sockets.append(sock)
+            sock.bind((f"127.0.{(i // 20000) % 256}.{1 + i // 20000 // 256}", 0))
+            sock.listen(1)
+    except OSError:
+        sockets.pop().close()
+    return sockets
+
+
+def write_synthetic(directory, count):
+    with open(os.path.join(directory, 'tcp'), 'w') as f:
+        f.write(HEADER)
+        for i in range(count):
+            f.write(ROW.format(i=i, port=1024 + i % 60000, st=STATES[i % len(STATES)], inode=100000 + i))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'sockets':>8} {'source':>9} {'/proc ms':>10} {'psutil ms':>10} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        sockets = open_listeners(size)
+        try:
+            if len(sockets) >= size:
+                proc = timed(count_proc_net, args.repeat)
+                try:
+                    ps = timed(count_psutil, args.repeat)
+                    ps_col, speedup = f"{ps * 1000:10.2f}", f"{ps / proc:7.1f}x"
+                except Exception as e:
+                    ps_col, speedup = f"{type(e).__name__:>10}", f"{'-':>8}"
+                print(f"{size:>8} {'real':>9} {proc * 1000:10.2f} {ps_col} {speedup}")
+                continue
+        finally:
+            for sock in sockets:
+                sock.close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            write_synthetic(tmp, size)
+            proc = timed(lambda: count_proc_net(tmp), args.repeat)
+        print(f"{size:>8} {'synthetic':>9} {proc * 1000:10.2f} {'skipped':>10} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
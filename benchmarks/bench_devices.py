@@ -0,0 +1,95 @@
+"""Cost of one per-interface and per-disk I/O pass on a container host.
+
+Writes a synthetic /proc with --veth veth interfaces (plus eth0 and lo) and
+--disks disks with --partitions partitions each, then times:
+
+  pass      DeviceIOCollector.refresh(): both bulk reads, filters and rates
+  collect   a full collect(), including building the metric families
+  psutil    psutil.net_io_counters(pernic=True) + disk_io_counters(perdisk=True)
+            on the same files, which parse every line and apply no filter
+
+once with the default filters (veth and partitions excluded) and once with
+every interface and device exported.
+
+    python benchmarks/bench_devices.py --veth 500 --passes 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import psutil  # noqa: E402
+
+from devices import DeviceIOCollector  # noqa: E402
+
+
+def write_proc(root, veth, disks, partitions):
+    os.makedirs(os.path.join(root, 'net'), exist_ok=True)
+    lines = ["Inter-|   Receive                                                |  Transmit",
+             " face |bytes    packets errs drop fifo frame compressed multicast|"
+             "bytes    packets errs drop fifo colls carrier compressed",
+             "    lo: 148399445  396883    0    0    0     0          0         0 148399445  396883    0    0    0     0"
+             "       0          0",
+             "  eth0: 98123456789 81234567 0 12 0 0 0 0 45123456789 61234567 0 0 0 0 0 0"]
+    for i in range(veth):
+        lines.append(f"veth{i:07x}: {i * 1000} {i * 10} 0 0 0 0 0 0 {i * 2000} {i * 20} 0 0 0 0 0 0")
+    with open(os.path.join(root, 'net', 'dev'), 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    stats = "0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0"
+    lines = []
+    for d in range(disks):
+        name = f"nvme{d}n1"
+        lines.append(f" 259 {d * 16} {name} 912345 1234 81234567 123456 712345 2345 91234567 234567 0 345678 456789 "
+                     f"0 0 0 0 12345 6789")
+        lines.extend(f" 259 {d * 16 + p} {name}p{p} {stats}" for p in range(1, partitions + 1))
+    lines.extend(f"   7 {i} loop{i} {stats}" for i in range(8))
+    with open(os.path.join(root, 'diskstats'), 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def timed(fn, passes):
+    samples = []
+    for _ in range(passes):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--veth', type=int, default=500)
+    parser.add_argument('--disks', type=int, default=4)
+    parser.add_argument('--partitions', type=int, default=3)
+    parser.add_argument('--passes', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_proc(root, args.veth, args.disks, args.partitions)
+        results = {}
+        for label, options in (('filtered', {}),
+                               ('all', {'interface_exclude': None, 'device_exclude': None})):
+            collector = DeviceIOCollector(min_interval=0, proc_root=root, **options)
+            collector.refresh()
+            results[f"pass ({label})"] = timed(collector.refresh, args.passes)
+            results[f"collect ({label})"] = timed(collector.collect, args.passes)
+            series = sum(len(f.samples) for f in collector.collect())
+            print(f"{label}: {sum(len(t.names) for t in collector.tables)} devices, {series} series")
+
+        psutil.PROCFS_PATH = root
+        results["psutil"] = timed(lambda: (psutil.net_io_counters(pernic=True),
+                                           psutil.disk_io_counters(perdisk=True)), args.passes)
+
+    print(f"\n{args.veth + 2} interfaces, {args.disks * (args.partitions + 1) + 8} block devices, "
+          f"{args.passes} passes")
+    print(f"{'variant':>18} {'min us':>9} {'median us':>10} {'max us':>9}")
+    for name, samples in results.items():
+        print(f"{name:>18} {min(samples):9.0f} {statistics.median(samples):10.0f} {max(samples):9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Render cost and payload size of /metrics as the series count grows.
+
+For each size a private registry is filled with one labelled counter and one
+labelled histogram, then rendered through the same MetricsRenderer the app
+uses: a cold render (text, OpenMetrics, gzip) and a cached hit.
+
+    python benchmarks/bench_exposition.py [--series 100,1000,10000,100000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from prometheus_client import CollectorRegistry, Counter, Histogram  # noqa: E402
+
+from exposition import MetricsRenderer  # noqa: E402
+
+OPENMETRICS = 'application/openmetrics-text; version=1.0.0'
+
+
+def build_registry(series):
+    registry = CollectorRegistry()
+    counter = Counter('bench_requests_total', 'Requests', ['endpoint'], registry=registry)
+    histogram = Histogram('bench_duration_seconds', 'Duration', ['endpoint'], registry=registry)
+    # A histogram child renders buckets + sum + count + created, so split the
+    # budget so that `series` is roughly the number of exposed samples
+    histograms = max(1, series // 16)
+    for i in range(series - histograms):
+        counter.labels(f'/route/{i}').inc(i)
+    for i in range(histograms):
+        histogram.labels(f'/route/{i}').observe(i / 1000)
+    return registry
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--series', default='100,1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'series':>8} {'text ms':>9} {'om ms':>9} {'gzip ms':>9} {'hit us':>8} {'text KB':>9} {'gzip KB':>9}")
+    for series in (int(s) for s in args.series.split(',')):
+        registry = build_registry(series)
+        renderer = MetricsRenderer(lambda: registry, ttl=0)
+        text_s, text = timed(lambda: renderer.render(), args.repeat)
+        om_s, _ = timed(lambda: renderer.render(OPENMETRICS), args.repeat)
+        gzip_s, gzipped = timed(lambda: renderer.render(gzip_ok=True), args.repeat)
+
+        cached = MetricsRenderer(lambda: registry, ttl=3600)
+        cached.render()
+        hit_s, _ = timed(lambda: cached.render(), max(args.repeat, 1000))
+
+        print(f"{series:>8} {text_s * 1000:9.2f} {om_s * 1000:9.2f} {gzip_s * 1000:9.2f} {hit_s * 1e6:8.2f}"
+              f" {len(text.body) / 1024:9.1f} {len(gzipped.body) / 1024:9.1f}")
+
+
+if __name__ == '__main__':
+    main()
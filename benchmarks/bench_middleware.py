@@ -0,0 +1,128 @@
+"""Per-request cost of the request-metrics middleware, in ns/request.
+
+Three apps serve the same trivial JSON view through the raw WSGI callable:
+
+  bare    - plain Flask, no instrumentation
+  legacy  - the old track_metrics decorator (time.time(), five labels()
+            lookups per request, request-size Summary), on a private registry
+  hooks   - the app's before/after/teardown hooks from main.create_app()
+
+Overhead is reported relative to `bare`.
+
+    python benchmarks/bench_middleware.py [--requests 5000] [--rounds 10]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from functools import wraps
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from flask import Flask, jsonify, request  # noqa: E402
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, Summary  # noqa: E402
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+from main import create_app  # noqa: E402
+
+
+def view():
+    return jsonify({"status": "ok"}), 200
+
+
+def legacy_app():
+    registry = CollectorRegistry()
+    requests_total = Counter('http_requests_total', 'Requests', ['method', 'endpoint', 'status'], registry=registry)
+    duration = Histogram('http_request_duration_seconds', 'Duration', ['method', 'endpoint'], registry=registry,
+                         buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0])
+    size = Summary('http_request_size_bytes', 'Size', ['method', 'endpoint'], registry=registry)
+    errors = Counter('http_errors_total', 'Errors', ['endpoint', 'error_type'], registry=registry)
+    active = Gauge('active_requests', 'Active', registry=registry)
+    calls = Counter('api_calls_by_endpoint', 'Calls', ['endpoint'], registry=registry)
+
+    def track_metrics(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            start_time = time.time()
+            method = request.method
+            endpoint = request.path
+            active.inc()
+            try:
+                response = f(*args, **kwargs)
+                status = response[1] if isinstance(response, tuple) else 200
+                requests_total.labels(method=method, endpoint=endpoint, status=status).inc()
+                calls.labels(endpoint=endpoint).inc()
+                size.labels(method=method, endpoint=endpoint).observe(request.content_length or 0)
+                return response
+            except Exception as e:
+                errors.labels(endpoint=endpoint, error_type=type(e).__name__).inc()
+                requests_total.labels(method=method, endpoint=endpoint, status=500).inc()
+                raise
+            finally:
+                duration.labels(method=method, endpoint=endpoint).observe(time.time() - start_time)
+                active.dec()
+        return decorated_function
+
+    flask_app = Flask('legacy')
+    flask_app.add_url_rule('/bench', view_func=track_metrics(view))
+    return flask_app
+
+
+def bare_app():
+    flask_app = Flask('bare')
+    flask_app.add_url_rule('/bench', view_func=view)
+    return flask_app
+
+
+def hooks_app():
+    flask_app = create_app()
+    flask_app.add_url_rule('/bench', view_func=view)
+    return flask_app
+
+
+def run(wsgi_app, count):
+    base = EnvironBuilder(path='/bench').get_environ()
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def once():
+        environ = dict(base)
+        environ['wsgi.input'] = io.BytesIO()
+        body = wsgi_app(environ, start_response)
+        for _ in body:
+            pass
+        # As a WSGI server would; response close callbacks run here
+        if hasattr(body, 'close'):
+            body.close()
+
+    for _ in range(min(count, 2000)):
+        once()
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        once()
+    return (time.perf_counter_ns() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000, help='requests per round')
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    apps = {'bare': bare_app(), 'legacy': legacy_app(), 'hooks': hooks_app()}
+    # Rounds are interleaved and the best one kept, so CPU frequency changes
+    # and noisy neighbours hit every variant alike
+    results = dict.fromkeys(apps, float('inf'))
+    for _ in range(args.rounds):
+        for name, wsgi_app in apps.items():
+            results[name] = min(results[name], run(wsgi_app, args.requests))
+    bare = results['bare']
+    print(f"{'variant':>8} {'ns/request':>12} {'overhead ns':>12}")
+    for name, ns in results.items():
+        print(f"{name:>8} {ns:12.0f} {ns - bare:12.0f}")
+
+
+if __name__ == '__main__':
+    main()
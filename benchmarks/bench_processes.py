@@ -0,0 +1,76 @@
+"""Cost of one top-N process collection pass.
+
+Optionally spawns `--spawn` idle processes so the host looks like a busy
+server, then times full TopProcessCollector passes with each row source:
+
+  proc    one read of /proc/<pid>/stat per process (the Linux default)
+  psutil  process_iter(attrs=...) under oneshot() (the portable fallback)
+  naive   a psutil.Process per PID with every attribute read separately
+
+    python benchmarks/bench_processes.py --spawn 5000 --passes 10
+"""
+import argparse
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import psutil  # noqa: E402
+
+from processes import TopProcessCollector, scan_proc, scan_psutil  # noqa: E402
+
+
+def scan_naive():
+    for pid in psutil.pids():
+        try:
+            p = psutil.Process(pid)
+            yield pid, p.name(), p.create_time(), sum(p.cpu_times()[:2]), p.memory_info().rss
+        except psutil.Error:
+            pass
+
+
+def timed(fn, passes):
+    samples = []
+    for _ in range(passes):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spawn', type=int, default=0, help='idle processes to start first')
+    parser.add_argument('--passes', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NPROC)
+    if soft != resource.RLIM_INFINITY and soft < args.spawn + 256:
+        resource.setrlimit(resource.RLIMIT_NPROC, (min(hard, args.spawn + 1024), hard))
+    children = [subprocess.Popen(['sleep', '600'], stdin=subprocess.DEVNULL) for _ in range(args.spawn)]
+    try:
+        results = {}
+        for name, scan in (('proc', scan_proc), ('psutil', scan_psutil), ('naive', scan_naive)):
+            collector = TopProcessCollector(top_n=args.top, min_interval=0, scan=scan)
+            collector.refresh()
+            results[name] = timed(collector.refresh, args.passes)
+        print(f"{collector.process_count} processes, {args.passes} passes")
+        print(f"{'source':>8} {'min ms':>9} {'median ms':>10} {'max ms':>9} {'us/process':>11}")
+        for name, samples in results.items():
+            median = statistics.median(samples)
+            print(f"{name:>8} {min(samples):9.1f} {median:10.1f} {max(samples):9.1f} "
+                  f"{median * 1000 / collector.process_count:11.1f}")
+    finally:
+        for child in children:
+            child.kill()
+        for child in children:
+            child.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Overhead of the /debug/profile sampling profiler on request throughput.
+
+Worker threads drive the app's WSGI callable with /api/stats requests for a
+fixed time, once without the profiler and once with it sampling at --hz.
+Rounds alternate and the best of each is kept. The report shows throughput
+with and without sampling, the slowdown, and the sampler's own cost per
+sample as measured by SamplingProfiler.
+
+    python benchmarks/bench_profiler.py [--hz 100] [--threads 4] [--seconds 3] [--rounds 5]
+"""
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+from main import create_app  # noqa: E402
+from profiler import SamplingProfiler  # noqa: E402
+
+
+def drive(wsgi_app, threads, seconds):
+    base = EnvironBuilder(path='/api/stats').get_environ()
+    stop = threading.Event()
+    counts = [0] * threads
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def worker(i):
+        while not stop.is_set():
+            environ = dict(base)
+            environ['wsgi.input'] = io.BytesIO()
+            body = wsgi_app(environ, start_response)
+            for _ in body:
+                pass
+            body.close()
+            counts[i] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in pool:
+        t.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hz', type=float, default=100)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    profiler = SamplingProfiler()
+    drive(app, args.threads, 0.5)   # warm up
+
+    baseline, profiled, per_sample = 0.0, 0.0, []
+    for _ in range(args.rounds):
+        baseline = max(baseline, drive(app, args.threads, args.seconds))
+        result = {}
+        session = threading.Thread(target=lambda: result.update(r=profiler.profile(args.seconds, args.hz)))
+        session.start()
+        profiled = max(profiled, drive(app, args.threads, args.seconds))
+        session.join()
+        r = result['r']
+        per_sample.append(r.busy / r.samples * 1e6 if r.samples else 0.0)
+
+    print(f"{'variant':>10} {'req/s':>10}")
+    print(f"{'off':>10} {baseline:10.0f}")
+    print(f"{f'{args.hz:g} Hz':>10} {profiled:10.0f}")
+    print(f"slowdown: {(1 - profiled / baseline) * 100:.2f}%   "
+          f"sampler: {min(per_sample):.1f} us per sample")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Per-observation cost and accuracy of the latency sketches.
+
+Times one observation (ns) into:
+
+  histogram   a labelled prometheus Histogram child (the existing path)
+  ddsketch    a bare DDSketch.add()
+  windowed    WindowedSketch.observe() with a caller-supplied clock, as the
+              request hooks call it
+
+then compares the windowed sketch's p50..p99.9 with exact quantiles of the
+same lognormal latencies (centred on ~200 ms, like /api/data).
+
+    python benchmarks/bench_sketch.py [--observations 200000] [--rounds 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from prometheus_client import CollectorRegistry, Histogram  # noqa: E402
+
+from sketch import DDSketch, WindowedSketch  # noqa: E402
+
+
+def per_observation(fn, values):
+    start = time.perf_counter_ns()
+    for v in values:
+        fn(v)
+    return (time.perf_counter_ns() - start) / len(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--observations', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    values = [rng.lognormvariate(-1.6, 0.5) for _ in range(args.observations)]
+
+    histogram = Histogram('bench_seconds', 'Bench', ['method', 'endpoint'], registry=CollectorRegistry(),
+                          buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]).labels('GET', '/bench')
+    windowed = WindowedSketch(window=3600)
+    now = time.perf_counter()
+    variants = {
+        'histogram': histogram.observe,
+        'ddsketch': DDSketch().add,
+        'windowed': lambda v: windowed.observe(v, now),
+    }
+    # Interleaved rounds, best kept, as in bench_middleware.py
+    results = dict.fromkeys(variants, float('inf'))
+    for _ in range(args.rounds):
+        for name, fn in variants.items():
+            results[name] = min(results[name], per_observation(fn, values))
+    print(f"{'variant':>10} {'ns/observation':>15}")
+    for name, ns in results.items():
+        print(f"{name:>10} {ns:15.0f}")
+
+    exact = sorted(values)
+    snap = windowed.snapshot(now)
+    print(f"\n{'quantile':>10} {'exact ms':>10} {'sketch ms':>10} {'rel error':>10}")
+    for q, estimate in zip((0.5, 0.9, 0.99, 0.999), snap.quantiles()):
+        true = exact[int(q * (len(exact) - 1))]
+        print(f"{q:>10} {true * 1000:10.2f} {estimate * 1000:10.2f} {abs(estimate - true) / true:10.4%}")
+    print(f"\n{len(snap.bins)} bins for {snap.count} observations")
+
+
+if __name__ == '__main__':
+    main()
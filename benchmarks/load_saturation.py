@@ -0,0 +1,159 @@
+"""Saturate /api/data and watch /metrics latency.
+
+Keeps `--concurrency` /api/data requests in flight at all times over
+keep-alive connections, while a separate probe scrapes /metrics every
+`--probe-interval` seconds. The probe also runs alone first, so the report
+compares /metrics latency idle versus saturated.
+
+    cd app && SERVER_MODE=async GUNICORN_WORKERS=1 gunicorn -c gunicorn.conf.py wsgi:app
+    python benchmarks/load_saturation.py --concurrency 2000 --duration 20
+
+Admission control: with ADMISSION_LIMIT set, 503 responses are reported as
+`shed`. Probing /api/health at 5x a threaded worker's capacity:
+
+    cd app && GUNICORN_WORKERS=1 GUNICORN_THREADS=4 ADMISSION_LIMIT=3 \
+        ADMISSION_QUEUE_TIMEOUT=0 gunicorn -c gunicorn.conf.py wsgi:app
+    python benchmarks/load_saturation.py --concurrency 20 --probe-path /api/health
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+from urllib.parse import urlsplit
+
+
+class Connection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode())
+        await self.writer.drain()
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        await self.reader.readexactly(length)
+        if b"connection: close" in head.lower():
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(latencies):
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+async def probe(host, port, path, interval, stop):
+    conn = Connection(host, port)
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await conn.get(path)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, asyncio.IncompleteReadError):
+            conn.close()
+        await asyncio.sleep(interval)
+    conn.close()
+    return latencies
+
+
+async def saturate(host, port, path, stop, stats):
+    conn = Connection(host, port)
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            status = await conn.get(path)
+            stats['latencies'].append(time.perf_counter() - start)
+            stats['ok' if status == 200 else 'shed' if status == 503 else 'failed'] += 1
+        except (OSError, asyncio.IncompleteReadError):
+            stats['failed'] += 1
+            conn.close()
+            await asyncio.sleep(0.05)
+    conn.close()
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+
+    stop = asyncio.Event()
+    idle_probe = asyncio.create_task(probe(host, port, args.probe_path, args.probe_interval, stop))
+    await asyncio.sleep(args.baseline)
+    stop.set()
+    idle = await idle_probe
+
+    stop = asyncio.Event()
+    stats = {'ok': 0, 'shed': 0, 'failed': 0, 'latencies': []}
+    workers = [asyncio.create_task(saturate(host, port, args.path, stop, stats)) for _ in range(args.concurrency)]
+    # Give every connection time to open before measuring
+    await asyncio.sleep(args.warmup)
+    stats.update(ok=0, shed=0, failed=0, latencies=[])
+    busy_probe = asyncio.create_task(probe(host, port, args.probe_path, args.probe_interval, stop))
+    await asyncio.sleep(args.duration)
+    stop.set()
+    busy = await busy_probe
+    await asyncio.gather(*workers)
+
+    return {
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'load': {
+            'path': args.path,
+            'ok': stats['ok'],
+            'shed': stats['shed'],
+            'failed': stats['failed'],
+            'throughput_rps': round(stats['ok'] / args.duration, 1),
+            **summarize(stats['latencies']),
+        },
+        'probe_idle': summarize(idle),
+        'probe_saturated': summarize(busy),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--path', default='/api/data')
+    parser.add_argument('--probe-path', default='/metrics')
+    parser.add_argument('--concurrency', type=int, default=2000)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--baseline', type=float, default=5, help='seconds of idle probing first')
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--probe-interval', type=float, default=0.1)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < args.concurrency + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, args.concurrency + 1024), hard))
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Hold many /api/stream subscribers open and count the frames each receives.
+
+Every subscriber should see one frame per sampler tick no matter how many are
+connected, since the server encodes each update once. The report shows the
+spread of frames per client, how long the first frame took, and the server's
+own stream_subscribers / stream_frames_dropped_total counters.
+
+    cd app && SERVER_MODE=async GUNICORN_WORKERS=1 gunicorn -c gunicorn.conf.py wsgi:app
+    python benchmarks/stream_fanout.py --subscribers 1000 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+MARKER = b"event: stats\n"
+
+
+async def subscribe(host, port, path, stop, results):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        await reader.readuntil(b"\r\n\r\n")
+    except (OSError, asyncio.IncompleteReadError):
+        results['failed'] += 1
+        return
+    frames = 0
+    first = None
+    buffer = b""
+    try:
+        while not stop.is_set():
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            if not chunk:
+                results['disconnected'] += 1
+                break
+            buffer += chunk
+            events = buffer.count(MARKER)
+            if events:
+                if first is None:
+                    first = time.perf_counter() - start
+                frames += events
+                buffer = buffer[buffer.rfind(MARKER) + len(MARKER):]
+            # Keep just enough to match a marker split across reads
+            buffer = buffer[-len(MARKER):]
+    finally:
+        writer.close()
+    results['frames'].append(frames)
+    if first is not None:
+        results['first_frame'].append(first)
+
+
+async def scrape(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /metrics HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    body = (await reader.read()).decode(errors='replace')
+    writer.close()
+    values = {}
+    for line in body.splitlines():
+        if line.startswith(('stream_subscribers ', 'stream_frames_dropped_total ', 'stream_frames_published_total ')):
+            name, value = line.split()
+            values[name] = float(value)
+    return values
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    stop = asyncio.Event()
+    results = {'frames': [], 'first_frame': [], 'failed': 0, 'disconnected': 0}
+    tasks = []
+    for _ in range(args.subscribers):
+        tasks.append(asyncio.create_task(subscribe(host, port, args.path, stop, results)))
+        await asyncio.sleep(args.ramp / args.subscribers)
+    await asyncio.sleep(args.duration)
+    server = await scrape(host, port)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    frames = results['frames']
+    return {
+        'subscribers': args.subscribers,
+        'duration_s': args.duration,
+        'failed': results['failed'],
+        'disconnected': results['disconnected'],
+        'frames_per_client': {
+            'min': min(frames) if frames else None,
+            'median': statistics.median(frames) if frames else None,
+            'max': max(frames) if frames else None,
+        },
+        'first_frame_ms_median': round(statistics.median(results['first_frame']) * 1000, 1)
+        if results['first_frame'] else None,
+        'server': server,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--path', default='/api/stream')
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20, help='seconds to stay connected after the ramp')
+    parser.add_argument('--ramp', type=float, default=5, help='seconds over which to open connections')
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < args.subscribers + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, args.subscribers + 1024), hard))
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
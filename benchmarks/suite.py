@@ -0,0 +1,242 @@
+"""Benchmark suite for the app's hot paths, with a regression gate.
+
+`run` measures, in-process and without a server:
+
+  middleware  per-request cost of the request hooks, against plain Flask
+  sampler     each enabled system collector, a full sample, the sampler
+              listeners and update_system_metrics()
+  exposition  generate_latest() render time and payload size by series count
+  endpoints   throughput and p50/p99 latency of each route via the test client,
+              with /api/data's simulated latency set to zero
+
+and writes one flat JSON document of metrics. `compare` fails (exit 1) when
+any metric is worse than the baseline by more than --threshold percent.
+The gate is run by hand, with both sides measured on the same machine; CI
+does not run it and no baseline is committed.
+
+    python benchmarks/suite.py run --output baseline.json          # on main
+    python benchmarks/suite.py run --output current.json           # on the branch
+    python benchmarks/suite.py compare baseline.json current.json --threshold 25
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'app'))
+sys.path.insert(0, HERE)
+
+from prometheus_client import generate_latest  # noqa: E402
+
+import bench_middleware  # noqa: E402
+from bench_exposition import build_registry  # noqa: E402
+import main  # noqa: E402
+
+ENDPOINTS = [
+    '/',
+    '/api/health',
+    '/livez',
+    '/readyz',
+    '/api/data',
+    '/api/stats',
+    '/api/stats/history?metric=cpu_percent&range=5m',
+    '/api/latency',
+    '/debug/slow',
+    '/metrics',
+]
+
+
+UNIT_SECONDS = {'ns': 1e-9, 'us': 1e-6, 'ms': 1e-3}
+
+
+def metric(value, unit, better='lower', gate=True):
+    # gate=False: reported by compare but never fails it (differences of
+    # two timings, tail percentiles)
+    return {"value": value, "unit": unit, "better": better, "gate": gate}
+
+
+def best_seconds(fn, repeat):
+    # The fastest run is the one least disturbed by the rest of the machine
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_middleware_overhead(rounds, requests):
+    apps = {'bare': bench_middleware.bare_app(), 'legacy': bench_middleware.legacy_app(),
+            'hooks': bench_middleware.hooks_app()}
+    # Interleaved rounds, best kept, as in bench_middleware.py
+    best = dict.fromkeys(apps, float('inf'))
+    for _ in range(rounds):
+        for name, wsgi_app in apps.items():
+            best[name] = min(best[name], bench_middleware.run(wsgi_app, requests))
+    return {
+        "middleware.bare_request_ns": metric(round(best['bare']), 'ns'),
+        "middleware.hooks_request_ns": metric(round(best['hooks']), 'ns'),
+        "middleware.hooks_overhead_ns": metric(round(best['hooks'] - best['bare']), 'ns', gate=False),
+        "middleware.legacy_overhead_ns": metric(round(best['legacy'] - best['bare']), 'ns', gate=False),
+    }
+
+
+def bench_sampler(repeat):
+    sampler = main.sampler
+    snap = sampler.snapshot()
+    results = {}
+    # Each enabled collector on its own, as the scheduler calls it
+    for name, collector in sampler.collectors.items():
+        seconds = best_seconds(lambda: collector.collect(sampler), repeat)
+        results[f"sampler.collector.{name}_us"] = metric(round(seconds * 1e6, 1), 'us')
+    results["sampler.sample_us"] = metric(round(best_seconds(sampler.sample, repeat) * 1e6, 1), 'us')
+    for listener in sampler._listeners:
+        name = getattr(listener, '__name__', 'listener')
+        if name == '<lambda>':
+            name = 'invalidate_metrics_cache'
+        results[f"sampler.listener.{name}_us"] = metric(
+            round(best_seconds(lambda: listener(snap), repeat) * 1e6, 1), 'us')
+    results["sampler.update_system_metrics_us"] = metric(
+        round(best_seconds(main.update_system_metrics, repeat) * 1e6, 2), 'us')
+    return results
+
+
+def bench_exposition(sizes, repeat):
+    results = {}
+    for series in sizes:
+        registry = build_registry(series)
+        body = generate_latest(registry)
+        seconds = best_seconds(lambda: generate_latest(registry), repeat)
+        results[f"exposition.{series}.render_ms"] = metric(round(seconds * 1000, 3), 'ms')
+        results[f"exposition.{series}.bytes"] = metric(len(body), 'bytes')
+    return results
+
+
+def bench_endpoints(rounds, requests):
+    app = main.create_app({'SIMULATED_LATENCY': (0.0, 0.0)})
+    best = {}
+    with app.test_client() as client:
+        for path in ENDPOINTS:
+            for _ in range(20):
+                client.get(path).close()
+        # Interleaved rounds, best kept per route
+        for _ in range(rounds):
+            for path in ENDPOINTS:
+                latencies = []
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    client.get(path).close()
+                    latencies.append(time.perf_counter() - start)
+                latencies.sort()
+                rps = len(latencies) / sum(latencies)
+                p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+                previous = best.get(path, (0, float('inf'), float('inf')))
+                best[path] = (max(previous[0], rps), min(previous[1], p50), min(previous[2], p99))
+    results = {}
+    for path, (rps, p50, p99) in best.items():
+        name = path.split('?')[0]
+        results[f"endpoint.{name}.rps"] = metric(round(rps), 'req/s', 'higher')
+        results[f"endpoint.{name}.p50_us"] = metric(round(p50 * 1e6), 'us')
+        results[f"endpoint.{name}.p99_us"] = metric(round(p99 * 1e6), 'us', gate=False)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    sizes = [100, 10000] if args.quick else [100, 10000, 100000]
+    scale = 0.2 if args.quick else 1.0
+    metrics = {}
+    # Sampled explicitly below; the background thread would only add noise
+    main.sampler.snapshot()
+    main.sampler.stop()
+    metrics.update(bench_middleware_overhead(max(2, int(8 * scale)), max(500, int(5000 * scale))))
+    metrics.update(bench_sampler(max(20, int(200 * scale))))
+    metrics.update(bench_exposition(sizes, 3 if args.quick else 5))
+    metrics.update(bench_endpoints(3, max(100, int(500 * scale))))
+    document = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+        },
+        "metrics": metrics,
+    }
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        print(f"📝 {len(metrics)} metrics -> {args.output}")
+    else:
+        print(text)
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)['metrics']
+    with open(args.current) as f:
+        current = json.load(f)['metrics']
+
+    regressions = 0
+    print(f"{'metric':<52} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[name]['value'], current[name]['value']
+        if not before:
+            continue
+        change = (after - before) / before * 100
+        # Positive `worse` means the metric moved in its bad direction
+        worse = -change if current[name].get('better') == 'higher' else change
+        # Timings that moved by less than --min-delta-us are noise, whatever the percentage
+        scale = UNIT_SECONDS.get(current[name]['unit'])
+        negligible = scale is not None and abs(after - before) * scale < args.min_delta_us * 1e-6
+        flag = ''
+        if not current[name].get('gate', True):
+            flag = ' (info)'
+        elif negligible:
+            pass
+        elif worse > args.threshold:
+            regressions += 1
+            flag = ' ❌'
+        elif worse < -args.threshold:
+            flag = ' ✅'
+        print(f"{name:<52} {before:>12} {after:>12} {change:>+8.1f}%{flag}")
+    for name in sorted(baseline.keys() - current.keys()):
+        print(f"{name:<52} {'':>12} {'missing':>12}")
+    print(f"\n{regressions} regression(s) beyond {args.threshold:g}%")
+    sys.exit(1 if regressions else 0)
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the suite and write JSON results')
+    run_parser.add_argument('--output', help='file to write (stdout if omitted)')
+    run_parser.add_argument('--quick', action='store_true', help='fewer iterations, no 100k-series render')
+    compare_parser = commands.add_parser('compare', help='exit 1 if current regressed against baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=25.0, help='allowed change in percent')
+    compare_parser.add_argument('--min-delta-us', type=float, default=2.0,
+                                help='ignore timings that changed by less than this many microseconds')
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == '__main__':
+    cli()
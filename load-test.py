@@ -1,35 +1,337 @@
-import requests
-import time
+import argparse
+import heapq
+import json
+import queue
 import random
+import threading
+import time
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
 
+import requests
+
 BASE_URL = "http://localhost:5000"
 
-def make_request(endpoint):
+DEFAULT_MIX = {
+    "/": 1,
+    "/api/health": 1,
+    "/api/data": 1,
+    "/metrics": 1
+}
+
+_local = threading.local()
+
+
+def get_session():
+    # One pooled keep-alive connection per worker thread
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        _local.session = session
+    return session
+
+
+def make_request(endpoint, method='GET', timeout=5):
     try:
-        response = requests.get(f"{BASE_URL}{endpoint}", timeout=5)
+        response = get_session().request(method, f"{BASE_URL}{endpoint}", timeout=timeout)
         return response.status_code
     except Exception as e:
         print(f"Error: {e}")
         return None
 
+
+# ============================================
+# LATENCY HISTOGRAM (HdrHistogram-style)
+# ============================================
+
+class LatencyHistogram:
+    """Log-linear histogram of latencies in microseconds.
+
+    Every value keeps its top `precision_bits` bits, so buckets are ~1/2**bits
+    wide relative to their value (0.8% at 7 bits) from 1 us to hours, in a
+    few hundred sparse buckets regardless of the number of samples.
+    """
+
+    def __init__(self, precision_bits=7):
+        self.bits = precision_bits
+        self.counts = Counter()
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def record(self, seconds):
+        value = max(1, int(seconds * 1_000_000))
+        shift = max(0, value.bit_length() - self.bits)
+        self.counts[(shift << self.bits) | (value >> shift)] += 1
+        self.total += 1
+        self.sum_us += value
+        self.max_us = max(self.max_us, value)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def _bucket_value(self, key):
+        shift = key >> self.bits
+        mantissa = key & ((1 << self.bits) - 1)
+        # Midpoint of the bucket
+        return (mantissa << shift) + ((1 << shift) >> 1)
+
+    def percentile(self, q):
+        if not self.total:
+            return None
+        target = max(1, round(q / 100 * self.total))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= target:
+                return min(self._bucket_value(key), self.max_us)
+        return self.max_us
+
+    def summary_ms(self):
+        if not self.total:
+            return {}
+        result = {f"p{q:g}": round(self.percentile(q) / 1000, 3) for q in (50, 90, 99, 99.9)}
+        result["mean"] = round(self.sum_us / self.total / 1000, 3)
+        result["max"] = round(self.max_us / 1000, 3)
+        return result
+
+
+class EndpointStats:
+    def __init__(self):
+        # `latency` is measured from the intended send time, so time spent
+        # waiting for a free worker counts (coordinated-omission corrected);
+        # `service` is measured from the actual send like a closed-loop tool
+        self.latency = LatencyHistogram()
+        self.service = LatencyHistogram()
+        self.status = Counter()
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.service.merge(other.service)
+        self.status.update(other.status)
+
+    def summary(self):
+        errors = sum(n for status, n in self.status.items() if status != 200)
+        return {
+            "count": self.latency.total,
+            "errors": errors,
+            "status": {str(k): v for k, v in sorted(self.status.items(), key=lambda kv: str(kv[0]))},
+            "latency_ms": self.latency.summary_ms(),
+            "service_time_ms": self.service.summary_ms()
+        }
+
+
+# ============================================
+# OPEN-LOOP SCHEDULER
+# ============================================
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(','):
+        endpoint, _, weight = item.partition('=')
+        mix[endpoint.strip()] = float(weight or 1)
+    return mix
+
+
+def parse_profile(spec):
+    # "30:50,60:50,30:0" -> ramp to 50 req/s over 30s, hold 60s, ramp down
+    stages = []
+    for item in spec.split(','):
+        seconds, _, rate = item.partition(':')
+        stages.append((float(seconds), float(rate)))
+    return stages
+
+
+def rate_at(t, stages, start_rate):
+    previous = start_rate
+    for seconds, target in stages:
+        if t < seconds:
+            return previous + (target - previous) * (t / seconds)
+        t -= seconds
+        previous = target
+    return None
+
+
+def constant_arrivals(stages, start_rate, mix, seed=None):
+    """Yields (offset_seconds, method, endpoint, body_size) at the profile's rate."""
+    rng = random.Random(seed)
+    endpoints = list(mix)
+    weights = [mix[e] for e in endpoints]
+    t = 0.0
+    while True:
+        rate = rate_at(t, stages, start_rate)
+        if rate is None:
+            return
+        if rate <= 0:
+            t += 0.01
+            continue
+        yield t, 'GET', rng.choices(endpoints, weights)[0], 0
+        t += 1.0 / rate
+
+
+def read_capture(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def replay_arrivals(paths, speed=1.0, captured=None):
+    """Streams capture files as arrivals at their original spacing.
+
+    Files are merged by timestamp, so per-worker captures (and their rotated
+    parts) interleave as the requests originally did. Each file is read line
+    by line, so a capture of any size replays in constant memory. Captured
+    latencies are recorded into `captured` per path as they are read, for
+    comparison with the replayed ones.
+    """
+    first = None
+    records = heapq.merge(*(read_capture(path) for path in paths), key=lambda record: record['ts'])
+    for record in records:
+        if first is None:
+            first = record['ts']
+        if captured is not None:
+            entry = captured.get(record['path'])
+            if entry is None:
+                entry = captured[record['path']] = LatencyHistogram()
+            entry.record(record['latency_ms'] / 1000)
+        target = record['path'] + ('?' + record['query'] if record.get('query') else '')
+        # Records are written when a request ends, so a file is only nearly
+        # ordered by start time; a straggler is sent at once
+        yield max(0.0, record['ts'] - first) / speed, record['method'], target, record.get('size', 0)
+
+
+def run_schedule(arrivals, workers=50, timeout=5, progress=True):
+    """Sends every arrival at its offset from start, whatever the server does.
+
+    A dispatcher thread releases requests on schedule into an unbounded queue
+    and `workers` threads send them. When the server slows down the queue
+    grows instead of the offered rate dropping, and that queueing delay is
+    part of each request's corrected latency.
+    """
+    pending = queue.Queue()
+    start = time.perf_counter()
+    sent = [0]
+    per_worker = []
+
+    def worker():
+        stats = {}
+        per_worker.append(stats)
+        session = get_session()
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            intended, method, target, size = item
+            sent_at = time.perf_counter()
+            try:
+                status = session.request(method, f"{BASE_URL}{target}", timeout=timeout,
+                                         data=b'\0' * size if size else None).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            done = time.perf_counter()
+            endpoint = target.partition('?')[0]
+            entry = stats.get(endpoint)
+            if entry is None:
+                entry = stats[endpoint] = EndpointStats()
+            entry.latency.record(done - intended)
+            entry.service.record(done - sent_at)
+            entry.status[status] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    last_report = start
+    for offset, method, target, size in arrivals:
+        intended = start + offset
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((intended, method, target, size))
+        sent[0] += 1
+        now = time.perf_counter()
+        if progress and now - last_report >= 1:
+            last_report = now
+            print(f"⏱️  {now - start:6.1f}s | Sent: {sent[0]} | Backlog: {pending.qsize()}", end="\r")
+
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for stats in per_worker:
+        for endpoint, entry in stats.items():
+            endpoints.setdefault(endpoint, EndpointStats()).merge(entry)
+    overall = EndpointStats()
+    for entry in endpoints.values():
+        overall.merge(entry)
+
+    return {
+        "target": BASE_URL,
+        "elapsed_s": round(elapsed, 3),
+        "requests": overall.latency.total,
+        "achieved_rps": round(overall.latency.total / elapsed, 2) if elapsed > 0 else 0.0,
+        "overall": overall.summary(),
+        "endpoints": {endpoint: entry.summary() for endpoint, entry in sorted(endpoints.items())}
+    }
+
+
+def print_summary(summary):
+    print("\n" + "-" * 50)
+    print(f"✅ Load test completed!")
+    print(f"📈 Total requests: {summary['requests']} ({summary['achieved_rps']} req/s)")
+    print(f"❌ Errors: {summary['overall']['errors']}")
+    print(f"{'endpoint':<16} {'count':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'p99.9':>9}  (ms, CO-corrected)")
+    for endpoint, entry in summary['endpoints'].items():
+        lat = entry['latency_ms']
+        print(f"{endpoint:<16} {entry['count']:>7} {lat['p50']:>9} {lat['p90']:>9} {lat['p99']:>9} {lat['p99.9']:>9}")
+
+
+def compare_with_capture(summary, captured):
+    comparison = {}
+    for endpoint, histogram in sorted(captured.items()):
+        replayed = summary['endpoints'].get(endpoint)
+        before = histogram.summary_ms()
+        after = replayed['latency_ms'] if replayed else {}
+        comparison[endpoint] = {
+            "captured_ms": before,
+            "replayed_ms": after,
+            "p50_ratio": round(after['p50'] / before['p50'], 3) if after and before['p50'] else None,
+            "p99_ratio": round(after['p99'] / before['p99'], 3) if after and before['p99'] else None
+        }
+    return comparison
+
+
+def print_comparison(comparison):
+    print(f"{'endpoint':<16} {'cap p50':>9} {'rep p50':>9} {'cap p99':>9} {'rep p99':>9} {'p99 x':>7}  (ms)")
+    for endpoint, row in comparison.items():
+        cap, rep = row['captured_ms'], row['replayed_ms']
+        print(f"{endpoint:<16} {cap['p50']:>9} {rep.get('p50', '-'):>9} {cap['p99']:>9} {rep.get('p99', '-'):>9} {str(row['p99_ratio']):>7}")
+
+
+# ============================================
+# CLOSED-LOOP MODE (original behaviour)
+# ============================================
+
 def generate_traffic(duration=60, requests_per_second=5):
     print(f"🚀 Starting load test for {duration} seconds...")
     print(f"📊 Generating ~{requests_per_second} requests/second")
     print(f"🎯 Target: {BASE_URL}")
     print("-" * 50)
-    
-    endpoints = [
-        "/",
-        "/api/health",
-        "/api/data",
-        "/metrics"
-    ]
-    
+
+    endpoints = list(DEFAULT_MIX)
+
     start_time = time.time()
     total_requests = 0
     successful_requests = 0
-    
+
     with ThreadPoolExecutor(max_workers=10) as executor:
         while time.time() - start_time < duration:
             futures = []
@@ -37,32 +339,91 @@ def generate_traffic(duration=60, requests_per_second=5):
                 endpoint = random.choice(endpoints)
                 future = executor.submit(make_request, endpoint)
                 futures.append(future)
-            
+
             for future in futures:
                 status = future.result()
                 total_requests += 1
                 if status == 200:
                     successful_requests += 1
-            
-            elapsed = int(time.time() - start_time)
-            print(f"⏱️  {elapsed}s | Total: {total_requests} | Success: {successful_requests} | Rate: {total_requests/elapsed:.1f} req/s", end="\r")
-            
+
+            elapsed = time.time() - start_time
+            print(f"⏱️  {int(elapsed)}s | Total: {total_requests} | Success: {successful_requests} | Rate: {total_requests/max(elapsed, 1e-9):.1f} req/s", end="\r")
+
             # Sleep to maintain rate
             time.sleep(1)
-    
+
     print("\n" + "-" * 50)
     print(f"✅ Load test completed!")
     print(f"📈 Total requests: {total_requests}")
     print(f"✅ Successful: {successful_requests}")
     print(f"❌ Failed: {total_requests - successful_requests}")
-    print(f"📊 Success rate: {(successful_requests/total_requests)*100:.1f}%")
+    if total_requests:
+        print(f"📊 Success rate: {(successful_requests/total_requests)*100:.1f}%")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="DevOps Dashboard load tester")
+    parser.add_argument('--url', default=BASE_URL)
+    parser.add_argument('--mode', choices=['open', 'closed'], default='open',
+                        help="open: constant arrival rate (default); closed: original batch-and-wait loop")
+    parser.add_argument('--replay', nargs='+', metavar='CAPTURE',
+                        help="replay capture files written with CAPTURE_PATH, merged by timestamp")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed multiplier, e.g. 10 for 10x")
+    parser.add_argument('--rate', type=float, default=10, help="requests/second for a constant profile")
+    parser.add_argument('--duration', type=float, default=120)
+    parser.add_argument('--profile', help="stages 'seconds:rate,...' ramped linearly, e.g. 30:50,60:50,30:0")
+    parser.add_argument('--start-rate', type=float, default=0, help="rate at t=0 when --profile is used")
+    parser.add_argument('--mix', help="endpoint weights, e.g. '/api/data=5,/api/health=1'")
+    parser.add_argument('--workers', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=5)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', metavar='PATH', help="write the summary as JSON ('-' for stdout)")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
+    args = parse_args()
+    BASE_URL = args.url.rstrip('/')
     print("=" * 50)
     print("🎯 DevOps Dashboard Load Tester")
     print("=" * 50)
-    generate_traffic(duration=120, requests_per_second=10)
-    
+
+    if args.replay:
+        print(f"🔁 Replaying {', '.join(args.replay)} at {args.speed:g}x")
+        print(f"🎯 Target: {BASE_URL} | Workers: {args.workers}")
+        print("-" * 50)
+        captured = {}
+        summary = run_schedule(replay_arrivals(args.replay, args.speed, captured),
+                               workers=args.workers, timeout=args.timeout)
+        summary["mode"] = "replay"
+        summary["speed"] = args.speed
+        summary["comparison"] = compare_with_capture(summary, captured)
+        print_summary(summary)
+        print_comparison(summary["comparison"])
+    elif args.mode == 'closed':
+        generate_traffic(duration=int(args.duration), requests_per_second=int(args.rate))
+    else:
+        if args.profile:
+            stages, start_rate = parse_profile(args.profile), args.start_rate
+        else:
+            stages, start_rate = [(args.duration, args.rate)], args.rate
+        mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+        print(f"🚀 Open-loop load: {' → '.join(f'{r:g} req/s/{s:g}s' for s, r in stages)}")
+        print(f"🎯 Target: {BASE_URL} | Workers: {args.workers}")
+        print("-" * 50)
+        summary = run_schedule(constant_arrivals(stages, start_rate, mix, args.seed),
+                               workers=args.workers, timeout=args.timeout)
+        summary["mode"] = "open-loop"
+        summary["profile"] = [{"seconds": s, "rate": r} for s, r in stages]
+        print_summary(summary)
+
+    if args.mode == 'open' or args.replay:
+        if args.json == '-':
+            print(json.dumps(summary, indent=2))
+        elif args.json:
+            with open(args.json, 'w') as f:
+                json.dump(summary, f, indent=2)
+            print(f"💾 Summary written to {args.json}")
+
     print("\n🎨 Now check your Grafana dashboards!")
     print("   They should be showing live data!")
-
@@ -0,0 +1,350 @@
+"""Generate Prometheus recording rules from the Grafana dashboards' PromQL.
+
+Every panel query that aggregates (sum, avg, ... with or without "by") is
+normalized, deduplicated across dashboards and recorded under a
+level:metric:operations name. The dashboards are then rewritten to query the
+recorded series, so a refresh reads a handful of precomputed samples instead
+of re-running the expression over every raw series at the 5 s scrape
+resolution. Queries that keep every series (a bare rate() or
+histogram_quantile() per instance) stay raw: a rule for them would store as
+many series as it reads and make nothing cheaper.
+
+    python monitoring/recording_rules.py            # write rules, wire prometheus.yml, rewrite dashboards
+    python monitoring/recording_rules.py --check    # list queries left raw, exit 1 if a recordable one has no rule
+
+The rules file is generated; edit the dashboards and re-run instead. Queries
+that were already rewritten are planned again from the expression read back
+from the existing rules file, so a renamed or no longer recordable rule is
+undone in the dashboards too, and rules no dashboard uses any more are dropped.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DASHBOARDS = os.path.join(HERE, 'grafana', 'dashboards', '*.json')
+PROMETHEUS_CONFIG = os.path.join(HERE, 'prometheus.yml')
+RULES_FILE = 'recording_rules.yml'          # relative to prometheus.yml
+GROUP = 'dashboard_queries'
+
+TOKEN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<range>\[[^\]]*\])
+  | (?P<var>\$\w+|\$\{[^}]*\})
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ident>[a-zA-Z_:][a-zA-Z0-9_:]*)
+  | (?P<op>=~|!~|!=|==|>=|<=|[-+*/%^=<>(),{}])
+''', re.VERBOSE)
+
+KEYWORDS = {'by', 'without', 'on', 'ignoring', 'group_left', 'group_right', 'bool', 'offset'}
+SET_OPERATORS = {'and', 'or', 'unless'}
+AGGREGATIONS = {'sum', 'avg', 'min', 'max', 'count', 'group', 'stddev', 'stdvar', 'topk', 'bottomk',
+                'quantile', 'count_values'}
+RANGE_FUNCTIONS = {'rate', 'irate', 'increase', 'delta', 'idelta', 'deriv', 'changes', 'resets'}
+SPACED = KEYWORDS | SET_OPERATORS | {'+', '-', '*', '/', '%', '^', '==', '!=', '>', '<', '>=', '<='}
+
+
+class QueryError(ValueError):
+    pass
+
+
+def tokenize(expr):
+    tokens = []
+    pos = 0
+    while pos < len(expr):
+        match = TOKEN.match(expr, pos)
+        if match is None:
+            raise QueryError(f"cannot parse {expr!r} at {expr[pos:pos + 10]!r}")
+        if match.lastgroup != 'space':
+            tokens.append((match.lastgroup, match.group()))
+        pos = match.end()
+    return tokens
+
+
+def _sorted_matchers(tokens, start):
+    # tokens[start] is "{"; returns the sorted matcher strings and the index after "}"
+    matchers = []
+    i = start + 1
+    while tokens[i][1] != '}':
+        if tokens[i][1] == ',':
+            i += 1
+            continue
+        label, op, value = tokens[i:i + 3]
+        matchers.append((label[1], op[1], value[1]))
+        i += 3
+    return sorted(matchers), i + 1
+
+
+def normalize(expr):
+    """Canonical spacing and label matcher order, so equivalent queries
+    written differently share one rule."""
+    tokens = tokenize(expr)
+    out = []
+    grouping = False
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if grouping and text == ')':
+            # sum by (a)(x) -> sum by (a) (x)
+            out.append(') ')
+            grouping = False
+            i += 1
+            continue
+        grouping = grouping or text in ('by', 'without', 'on', 'ignoring')
+        if text == '{':
+            matchers, i = _sorted_matchers(tokens, i)
+            out.append('{' + ','.join(f"{label}{op}{value}" for label, op, value in matchers) + '}')
+            continue
+        if text in SPACED and out:
+            out.append(f" {text} ")
+        elif text == ',':
+            out.append(', ')
+        else:
+            out.append(text)
+        i += 1
+    return ''.join(out).replace('  ', ' ').strip()
+
+
+def recordable(expr):
+    # Only aggregations shrink what a panel reads; template variables can't be recorded
+    if '$' in expr:
+        return False
+    tokens = tokenize(expr)
+    return any(kind == 'ident' and text in AGGREGATIONS and i + 1 < len(tokens)
+               and tokens[i + 1][1] in ('(', 'by', 'without')
+               for i, (kind, text) in enumerate(tokens))
+
+
+def rule_name(expr):
+    # level:metric:operations, as in the Prometheus naming best practices.
+    # The level is the "by" labels, empty for a full aggregation and
+    # "instance" when the result keeps every label.
+    tokens = tokenize(expr)
+    metric, level, ops, values = None, None, [], []
+    aggregated = False
+    quantile = 'histogram_quantile' in expr
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        following = tokens[i + 1][1] if i + 1 < len(tokens) else None
+        if kind == 'ident' and text in ('by', 'without', 'on', 'ignoring', 'group_left', 'group_right') \
+                and following == '(':
+            end = next(j for j in range(i, len(tokens)) if tokens[j][1] == ')')
+            # histogram_quantile consumes "le"
+            labels = [t for k, t in tokens[i + 2:end] if k == 'ident' and not (t == 'le' and quantile)]
+            if text == 'by' and level is None:
+                level = '_'.join(labels)
+            i = end + 1
+            continue
+        if kind == 'ident' and text in AGGREGATIONS and following in ('(', 'by', 'without'):
+            ops.append(text)
+            aggregated = True
+        elif kind == 'ident' and following == '(':
+            if text == 'histogram_quantile':
+                q = next(t for k, t in tokens[i:] if k == 'number')
+                ops.append('p' + q.split('.', 1)[-1].ljust(2, '0') if '.' in q else 'p' + q)
+            elif text in RANGE_FUNCTIONS or text.endswith('_over_time'):
+                window = next(t for k, t in tokens[i:] if k == 'range')
+                ops.append(text + window.strip('[]'))
+            else:
+                ops.append(text)
+        elif kind == 'ident' and text in SET_OPERATORS:
+            ops.append(text)
+        elif kind == 'ident' and text not in KEYWORDS and metric is None:
+            metric = text
+            if following == '{':
+                matchers, _ = _sorted_matchers(tokens, i + 1)
+                values = [re.sub(r'\W+', '_', value.strip('"\'')) for _, op, value in matchers if op == '=']
+        i += 1
+    if metric is None:
+        raise QueryError(f"no metric in {expr!r}")
+    if quantile and metric.endswith('_bucket'):
+        metric = metric[:-len('_bucket')]
+    # Counters are named without _total once recorded, as in the Prometheus docs
+    if metric.endswith('_total'):
+        metric = metric[:-len('_total')]
+    if not level:
+        level = '' if aggregated else 'instance'
+    return f"{level}:{metric}:{'_'.join(ops + values)}"
+
+
+def dashboard_queries(path):
+    with open(path, encoding='utf-8') as f:
+        dashboard = json.load(f)
+    dashboard = dashboard.get('dashboard', dashboard)
+
+    def walk(panels):
+        for panel in panels:
+            yield panel
+            yield from walk(panel.get('panels', []))
+
+    for panel in walk(dashboard.get('panels', [])):
+        for target in panel.get('targets', []):
+            if target.get('expr'):
+                yield panel.get('title') or f"panel {panel.get('id')}", target['expr']
+
+
+def read_rules(path):
+    # Reads back the file write_rules() produces: record name -> expr
+    rules = {}
+    if not os.path.exists(path):
+        return rules
+    record = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('- record: '):
+                record = json.loads(line[len('- record: '):])
+            elif line.startswith('expr: ') and record is not None:
+                rules[record] = json.loads(line[len('expr: '):])
+                record = None
+    return rules
+
+
+def write_rules(path, rules, users):
+    lines = [
+        '# Generated by monitoring/recording_rules.py from the Grafana dashboards.',
+        '# Edit the dashboards and re-run it instead of editing this file.',
+        'groups:',
+        f'  - name: {GROUP}',
+        '    rules:',
+    ]
+    for record in sorted(rules):
+        lines.append(f"      # {', '.join(sorted(users.get(record, ())))}")
+        # A JSON string is a valid double-quoted YAML scalar; names of full
+        # aggregations start with ":" and must be quoted anyway
+        lines.append(f'      - record: {json.dumps(record)}')
+        lines.append(f'        expr: {json.dumps(rules[record])}')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def wire_rule_files(config_path, rules_file):
+    with open(config_path, encoding='utf-8') as f:
+        text = f.read()
+    if re.search(rf'^\s*-\s*["\']?{re.escape(rules_file)}["\']?\s*$', text, re.M):
+        return False
+    text, count = re.subn(r'^rule_files:[^\n]*\n', f'rule_files:\n  - "{rules_file}"\n', text, count=1, flags=re.M)
+    if not count:
+        text += f'\nrule_files:\n  - "{rules_file}"\n'
+    with open(config_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return True
+
+
+def rewrite_dashboard(path, mapping):
+    # Textual so the hand-formatted JSON keeps its layout
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+
+    def replace(match):
+        expr = json.loads(match.group(2))
+        return match.group(1) + json.dumps(mapping.get(expr, expr), ensure_ascii=False)
+
+    new_text = re.sub(r'("expr":\s*)("(?:[^"\\]|\\.)*")', replace, text)
+    if new_text != text:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(new_text)
+        return True
+    return False
+
+
+def plan(dashboard_paths, existing):
+    """Returns (rules, users, mapping, problems): the rules to write, the
+    panels using each, raw expr -> recorded name, and unparsable queries."""
+    by_expr = {}
+    rules, users, mapping, problems = {}, {}, {}, []
+    for path in dashboard_paths:
+        name = os.path.basename(path)
+        for title, expr in dashboard_queries(path):
+            # Rewritten by an earlier run: plan from the recorded expression
+            source = existing.get(expr, expr)
+            try:
+                if not recordable(source):
+                    if source != expr:
+                        mapping[expr] = source
+                    continue
+                normalized = normalize(source)
+                record = by_expr.get(normalized)
+                if record is None:
+                    record = base = rule_name(normalized)
+                    n = 2
+                    while record in rules:
+                        record, n = f"{base}_{n}", n + 1
+                    by_expr[normalized] = record
+                rules[record] = normalized
+                if record != expr:
+                    mapping[expr] = record
+            except QueryError as e:
+                problems.append(f"{name}: {title}: {e}")
+                continue
+            users.setdefault(record, set()).add(f"{name}: {title}")
+    return rules, users, mapping, problems
+
+
+def check(dashboard_paths, existing):
+    """Returns (missing, raw): queries still running raw PromQL with no rule
+    or naming a rule the rules file does not define, and queries left raw
+    because a rule for them would not be cheaper."""
+    missing, raw = [], []
+    for path in dashboard_paths:
+        name = os.path.basename(path)
+        for title, expr in dashboard_queries(path):
+            try:
+                tokens = tokenize(expr)
+            except QueryError as e:
+                missing.append(f"{name}: {title}: {e}")
+                continue
+            if recordable(expr):
+                record = next((r for r, e in existing.items() if normalize(e) == normalize(expr)), None)
+                hint = f" (rule {record} exists, dashboard not rewritten)" if record else ''
+                missing.append(f"{name}: {title}: {expr}{hint}")
+            elif len(tokens) == 1 and ':' in expr and expr not in existing:
+                missing.append(f"{name}: {title}: {expr} (no such recording rule)")
+            elif any(text == '(' for _, text in tokens):
+                # Plain selectors are cheap as they are and not worth listing
+                raw.append(f"{name}: {title}: {expr}")
+    return missing, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dashboards', default=DASHBOARDS, help='glob of dashboard JSON files')
+    parser.add_argument('--prometheus-config', default=PROMETHEUS_CONFIG)
+    parser.add_argument('--rules-file', default=RULES_FILE, help='path relative to the Prometheus config')
+    parser.add_argument('--check', action='store_true', help='report queries without a rule and exit 1 if any')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.dashboards))
+    rules_path = os.path.join(os.path.dirname(os.path.abspath(args.prometheus_config)), args.rules_file)
+    existing = read_rules(rules_path)
+
+    if args.check:
+        missing, raw = check(paths, existing)
+        for line in raw:
+            print(f"➖ {line} (left raw: not recordable)")
+        for line in missing:
+            print(f"❌ {line}")
+        print(f"{len(missing)} dashboard queries without a recording rule" if missing
+              else f"✅ every recordable query in {len(paths)} dashboards has a rule; "
+                   f"{len(raw)} left raw as not recordable")
+        sys.exit(1 if missing else 0)
+
+    rules, users, mapping, problems = plan(paths, existing)
+    for line in problems:
+        print(f"⚠️  {line}")
+    write_rules(rules_path, rules, users)
+    print(f"📝 {len(rules)} recording rules -> {rules_path}")
+    if wire_rule_files(args.prometheus_config, args.rules_file):
+        print(f"🔌 added {args.rules_file} to rule_files in {args.prometheus_config}")
+    for path in paths:
+        if rewrite_dashboard(path, mapping):
+            print(f"✏️  rewrote {os.path.basename(path)}")
+
+
+if __name__ == '__main__':
+    main()